@@ -0,0 +1,87 @@
+import numpy as np
+
+# 生の格納値（整数）のままデータを保持し、RescaleSlope/Interceptは集計の中でだけfloat64で適用する
+
+
+def calibrated_range(raw, slope, intercept):
+    """生の格納値のmin/maxからCT値の(min, max)を求める"""
+    lo = float(np.min(raw)) * slope + intercept
+    hi = float(np.max(raw)) * slope + intercept
+    return (lo, hi) if lo <= hi else (hi, lo)
+
+
+def calibrated_mean_std(raw, slope, intercept):
+    """生の格納値をfloat64で集計し、CT値の平均・標準偏差を返す"""
+    if raw.size == 0:
+        return 0.0, 0.0
+    mean_raw = float(np.mean(raw, dtype=np.float64))
+    std_raw = float(np.std(raw, dtype=np.float64))
+    return mean_raw * slope + intercept, abs(slope) * std_raw
+
+
+def calibrated_profile(stack, slopes, intercepts):
+    """
+    (Z, h, w)（またはマスクで画素を選んだ (Z, k)）の生の格納値をスライスごとに集計し、
+    CT値の (平均, 標準偏差, min, max) の配列を返す。
+    集計はスライス以外の軸の1回のreductionで行い、slope/interceptはスライスごとの配列で適用する
+    """
+    slopes = np.asarray(slopes, dtype=np.float64)
+    intercepts = np.asarray(intercepts, dtype=np.float64)
+    axes = tuple(range(1, stack.ndim))
+    if int(np.prod(stack.shape[1:])) == 0:
+        zeros = np.zeros(stack.shape[0])
+        return zeros, zeros, zeros, zeros
+    mean = stack.mean(axis=axes, dtype=np.float64) * slopes + intercepts
+    std = stack.std(axis=axes, dtype=np.float64) * np.abs(slopes)
+    lo = stack.min(axis=axes).astype(np.float64) * slopes + intercepts
+    hi = stack.max(axis=axes).astype(np.float64) * slopes + intercepts
+    return mean, std, np.minimum(lo, hi), np.maximum(lo, hi)
+
+
+def raw_histogram(raw):
+    """格納値ごとの度数を数え、(格納値の配列, 度数の配列)を昇順で返す（16bit以下の整数データはbincountで求める）"""
+    if raw.size == 0:
+        return np.zeros(0, dtype=raw.dtype), np.zeros(0, dtype=np.int64)
+    if raw.dtype.kind in 'iu' and raw.dtype.itemsize <= 2:
+        lo = int(np.min(raw))
+        # bincountは添字をintpに変換するので、最初からintpで引き算して余分なコピーを作らない
+        counts = np.bincount(np.subtract(raw, lo, dtype=np.intp).ravel())
+        values = np.nonzero(counts)[0]
+        return values + lo, counts[values]
+    return np.unique(raw, return_counts=True)
+
+
+def calibrated_histogram(raw, slope, intercept):
+    """格納値ごとの度数を数え、(CT値の配列, 度数の配列)を返す（整数データはbincountで厳密に求める）"""
+    values, counts = raw_histogram(raw)
+    return values.astype(np.float64) * slope + intercept, counts
+
+
+def lut_index_dtype(dtype):
+    """LUTの添字として格納値を再解釈するための符号なし整数型（LUTが使えない型はNone）"""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu' and dtype.itemsize in (1, 2):
+        return np.dtype(f"u{dtype.itemsize}")
+    return None
+
+
+def window_lut(dtype, slope, intercept, base, width):
+    """
+    格納値の全パターン（16bitなら65536通り）に対する表示用uint8のLUTをfloat64で作る。
+    LUTは格納値を符号なし整数として再解釈した値（view）で引く。
+    """
+    dtype = np.dtype(dtype)
+    index_dtype = lut_index_dtype(dtype)
+    raw_values = np.arange(2 ** (8 * dtype.itemsize), dtype=np.int64).astype(index_dtype).view(dtype)
+    hu = raw_values.astype(np.float64) * slope + intercept
+    return (np.clip((hu - base) / width, 0, 1) * 255.0).astype(np.uint8)
+
+
+def apply_window(raw, slope, intercept, base, width):
+    """生の格納値を、CT値のウィンドウ [base, base+width] で表示用uint8に変換する"""
+    index_dtype = lut_index_dtype(raw.dtype)
+    if index_dtype is not None:
+        lut = window_lut(raw.dtype, slope, intercept, base, width)
+        return np.take(lut, raw.view(index_dtype))
+    hu = raw.astype(np.float64) * slope + intercept
+    return (np.clip((hu - base) / width, 0, 1) * 255.0).astype(np.uint8)
@@ -1,68 +1,374 @@
+import base64
 import os
 import numpy as np
-import pydicom
+from core.series_volume import LEGACY_BYTES_PER_VOXEL
+from core.calibration import calibrated_mean_std, calibrated_histogram, calibrated_profile
+from core.progressive_loader import ProgressiveSeries
+from core.preview_pyramid import preview_factor
+from core.roi_engine import (clip_rect, clip_rects, crop_mask, masked_values, crop_mean_std_batch, chunk_ranges,
+                             CuboidAccumulator, DEFAULT_CUBOID_PERCENTILES)
+from core.metadata_index import (MetadataIndex, DEFAULT_METADATA_PAGE_SIZE, parse_tag,
+                                 dataset_rows, children_rows)
+from pydicom.datadict import keyword_for_tag
 
 class DataManager:
-    def get_slice(self, idx):
+    # Python側API: 全シリーズの同じスライスのフレーム（data URL）。新しい要求で打ち切られたシリーズはNone
+    def get_slice(self, idx, quality='final'):
         idx = int(idx)
-        b64list = []
-        for original_images in self.original_images_list:
-            if idx < len(original_images):
-                b64list.append(self.get_png_b64(original_images[idx]))
-            else:
-                arr = np.zeros_like(original_images[0])
-                b64list.append(self.get_png_b64(arr))
-        return b64list
+        series_indices = range(len(self.original_images_list))
+        generations = [self.begin_frame_request(series_idx, idx, quality) for series_idx in series_indices]
+        # 描画（np.take）とエンコード（PIL）はGILを解放するので、シリーズごとにスレッドで並列に処理する
+        pool = getattr(self, '_render_pool', None)
+        if pool is None or len(series_indices) < 2:
+            return [self.get_frame_url(series_idx, idx, quality, generations[series_idx]) for series_idx in series_indices]
+        return list(pool.map(lambda series_idx: self.get_frame_url(series_idx, idx, quality, generations[series_idx]),
+                             series_indices))
 
-    def get_single_slice(self, series_idx, idx):
+    # Python側API: 1シリーズのフレーム（data URL）。quality='interactive'はドラッグ中の高速エンコード
+    # 処理中に同じシリーズの新しい要求が来た場合は描画を打ち切ってNoneを返す
+    def get_single_slice(self, series_idx, idx, quality='final'):
         series_idx = int(series_idx)
         idx = int(idx)
-        original_images = self.original_images_list[series_idx]
-        if idx < len(original_images):
-            return self.get_png_b64(original_images[idx])
+        generation = self.begin_frame_request(series_idx, idx, quality)
+        return self.get_frame_url(series_idx, idx, quality, generation)
+
+    def begin_frame_request(self, series_idx, idx, quality='final', mode=None):
+        """
+        表示要求の世代を進めて返す。同じシリーズの古い要求は世代が変わったことで途中で打ち切られる
+        （スライダーのドラッグ中に途中のスライスの描画・エンコードが溜まらないようにする）。
+        要求はスクロール方向の推定にも使い、続くスライスを先読みする
+        """
+        self.note_current_slice(series_idx, idx)
+        with self._frame_generation_lock:
+            generation = self._frame_generations.get(series_idx, 0) + 1
+            self._frame_generations[series_idx] = generation
+        self.note_frame_request(series_idx, idx, quality, mode, generation)
+        return generation
+
+    def _frame_request_superseded(self, series_idx, generation):
+        if generation is None or self._frame_generations.get(series_idx) == generation:
+            return False
+        self.dropped_frame_requests += 1
+        return True
+
+    def frame_key(self, series_idx, idx, quality='final', mode=None):
+        # フレームキャッシュのキー（フレームサーバのETagにも使う）
+        encoder = self._frame_encoders.get(quality, self._frame_encoders['final'])
+        return (series_idx, self.active_subfolders[series_idx], idx, mode or self.render_mode_key(), encoder.spec,
+                self.frame_scale(series_idx, quality))
+
+    def frame_scale(self, series_idx, quality):
+        # ドラッグ中（interactive）は縮小プレビュー（1/2または1/4）、それ以外は元の解像度（1）
+        if quality != 'interactive':
+            return 1
+        return preview_factor(self.original_images_list[series_idx].shape, self.preview_max_size)
+
+    def get_display_slice(self, series_idx, idx, scale=1):
+        # 表示用の (生の格納値, RescaleSlope, RescaleIntercept, CT値のmin/max)。scale>1なら縮小プレビューの格納値を返す
+        # min/maxは元の解像度の統計表の値を使う（平均で縮小すると極値が変わり、プレビューと最終表示の諧調がずれるため）
+        series = self.original_images_list[series_idx]
+        if scale == 1 or idx >= len(series):
+            raw, slope, intercept = self.get_raw_slice(series, idx)
         else:
-            arr = np.zeros_like(original_images[0])
-            return self.get_png_b64(arr)
+            raw = self._preview_pyramid.level((self.active_subfolders[series_idx], idx), scale, lambda: series[idx])
+            slope, intercept = series.calibration(idx)
+        stats = series.stats
+        ct_range = (stats.minimum[idx], stats.maximum[idx]) if idx < len(series) and stats.valid[idx] else None
+        return raw, slope, intercept, ct_range
+
+    def get_frame_bytes(self, series_idx, idx, quality='final', mode=None, generation=None):
+        """
+        エンコード済みフレームのバイト列とエンコーダを返す。同じシリーズ・フォルダ・スライス・描画設定・エンコーダならキャッシュから返す。
+        generation（begin_frame_requestの戻り値）を渡すと、より新しい要求が来た時点で打ち切って (None, None) を返す
+        """
+        encoder = self._frame_encoders.get(quality, self._frame_encoders['final'])
+        mode = mode or self.render_mode_key()
+        key = self.frame_key(series_idx, idx, quality, mode)
+        data = self._frame_cache.get(key)
+        if data is not None:
+            return data, encoder
+        # 表示要求（generationあり）の描画中は先読みを始めない
+        if generation is not None:
+            with self._frame_generation_lock:
+                self._foreground_renders += 1
+        try:
+            # デコード（遅延読み込み時）・変換・エンコードの各段階の前に、新しい要求が来ていないか確認する
+            if self._frame_request_superseded(series_idx, generation):
+                return None, None
+            raw, slope, intercept, ct_range = self.get_display_slice(series_idx, idx, key[-1])
+            if self._frame_request_superseded(series_idx, generation):
+                return None, None
+            # 自動モードは統計表の行のmin/maxを使い、描画のたびにスライス全体を走査しない
+            if mode[0] == 'auto' and ct_range is not None:
+                mode = ('auto',) + ct_range
+            arr = self.get_display_uint8(raw, slope, intercept, mode)
+            if self._frame_request_superseded(series_idx, generation):
+                return None, None
+            data = encoder.encode(arr)
+        finally:
+            if generation is not None:
+                with self._foreground_idle:
+                    self._foreground_renders -= 1
+                    if self._foreground_renders == 0:
+                        self._foreground_idle.notify_all()
+        self._frame_cache.put(key, data)
+        return data, encoder
+
+    def get_frame_url(self, series_idx, idx, quality='final', generation=None):
+        # js_api経由の受け渡し用にdata URLにする（フレームサーバを使わない場合）。打ち切られた場合はNone
+        data, encoder = self.get_frame_bytes(series_idx, idx, quality, generation=generation)
+        if data is None:
+            return None
+        return f"data:{encoder.mime};base64," + base64.b64encode(data).decode('ascii')
 
-    # Python側API: ROI統計計算
-    def get_roi_stats(self, series_idx, slice_idx, x, y, w, h):
+    def get_raw_slice(self, series, idx):
+        # (生の格納値, RescaleSlope, RescaleIntercept)を返す（範囲外のスライスはゼロ画像）
+        if idx < len(series):
+            return (series[idx],) + series.calibration(idx)
+        return np.zeros(series.shape, dtype=np.int16), 1.0, 0.0
+
+    # Python側API: ROI統計計算（shapeは 'rect' / 'circle' / 'ellipse' / 'polygon'、polygonの頂点はROIの左上が原点）
+    def get_roi_stats(self, series_idx, slice_idx, x, y, w, h, shape='rect', points=None):
         series_idx = int(series_idx)
         slice_idx = int(slice_idx)
         x = int(x)
         y = int(y)
         w = int(w)
         h = int(h)
-        # 正規化前の元データ（HU値）を使用
-        arr = self.original_images_list[series_idx][slice_idx]
-        roi = arr[y:y+h, x:x+w]
-        roi_flat = roi.flatten()  # 1次元配列に変換
-        mean = float(np.mean(roi_flat)) if roi_flat.size > 0 else 0.0
-        std = float(np.std(roi_flat)) if roi_flat.size > 0 else 0.0
+        # 正規化前の元データ（HU値）を使用: 生の格納値をfloat64で集計してからRescaleSlope/Interceptを適用
+        series = self.original_images_list[series_idx]
+        calibration = series.calibration(slice_idx)
+        if shape != 'rect':
+            # 矩形以外はキャッシュしたマスクで、外接矩形の範囲だけを集計する
+            mask = self._roi_masks.get(shape, w, h, points)
+            mean, std = calibrated_mean_std(masked_values(series[slice_idx], x, y, mask), *calibration)
+            return {'mean': round(mean, 8), 'std': round(std, 8)}
+        # 同じスライスへの問い合わせが続く場合は積分画像（4点の参照）で、そうでなければ直接集計する
+        integral = self._integral_images.lookup((self.active_subfolders[series_idx], slice_idx),
+                                               lambda: series[slice_idx])
+        if integral is not None:
+            mean, std = integral.calibrated_mean_std(x, y, w, h, *calibration)
+        else:
+            arr = series[slice_idx]
+            x0, y0, x1, y1 = clip_rect(arr.shape, x, y, w, h)
+            mean, std = calibrated_mean_std(arr[y0:y1, x0:x1], *calibration)
         return {'mean': round(mean, 8), 'std': round(std, 8)}
 
+    # Python側API: 複数ROIの統計をまとめて計算（JS↔Pythonの往復を1回にする）
+    def get_roi_stats_batch(self, items, shape='rect', points=None):
+        """
+        items: [[シリーズ, スライス, x, y, w, h], ...] のリスト、
+               または {'series': [...], 'slices': [...], 'rois': [[x, y, w, h], ...]} の格子（全組み合わせを計算）。
+        shape/pointsは全てのROIに共通の形状（同じ大きさのROIは1つのマスクを使い回す）。
+        戻り値は列ごとのリスト {'series', 'slice', 'x', 'y', 'w', 'h', 'mean', 'std', 'count'}（行の順番はitemsの順）
+        """
+        if isinstance(items, dict):
+            series_indices = items.get('series') or range(len(self.original_images_list))
+            items = [[series_idx, slice_idx] + list(roi) for series_idx in series_indices
+                     for slice_idx in items['slices'] for roi in items['rois']]
+        table = np.asarray(items, dtype=np.int64).reshape(-1, 6)
+        means = np.zeros(len(table))
+        stds = np.zeros(len(table))
+        counts = np.zeros(len(table), dtype=np.int64)
+        # (シリーズ, スライス) ごとにまとめ、同じスライスのROIは同じ大きさどうしを1回のreductionで直接集計する
+        groups, inverse = np.unique(table[:, :2], axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        for group, (series_idx, slice_idx) in enumerate(groups.tolist()):
+            rows = np.nonzero(inverse == group)[0]
+            series = self.original_images_list[series_idx]
+            calibration = series.calibration(slice_idx)
+            if shape == 'rect':
+                # 同じスライスへの問い合わせが続く場合か、ROIの合計面積が作成コストに見合う場合だけ積分画像を使う
+                boxes = clip_rects(series.shape, table[rows, 2:])
+                area = int(np.prod(boxes[:, 2:] - boxes[:, :2], axis=1).sum())
+                integral = self._integral_images.lookup((self.active_subfolders[series_idx], slice_idx),
+                                                       lambda: series[slice_idx],
+                                                       area_ratio=area / max(series.shape[0] * series.shape[1], 1))
+                if integral is not None:
+                    means[rows], stds[rows], counts[rows] = integral.calibrated_mean_std_batch(table[rows, 2:], *calibration)
+                    continue
+            mask_for = None if shape == 'rect' else (lambda w, h: self._roi_masks.get(shape, w, h, points))
+            means[rows], stds[rows], counts[rows] = crop_mean_std_batch(series[slice_idx], table[rows, 2:],
+                                                                        *calibration, mask_for=mask_for)
+        columns = {name: table[:, i].tolist() for i, name in enumerate(('series', 'slice', 'x', 'y', 'w', 'h'))}
+        columns['mean'] = [round(v, 8) for v in means.tolist()]
+        columns['std'] = [round(v, 8) for v in stds.tolist()]
+        columns['count'] = counts.tolist()
+        return columns
+
+    # Python側API: 1シリーズの全スライスのROI統計（Zプロファイル）
+    def get_roi_zprofile(self, series_idx, x, y, w, h, shape='rect', points=None):
+        """
+        ROIの平均・標準偏差・min・maxを全スライスについて計算する（スライスごとのPythonループは無い）。
+        戻り値は列ごとのリスト {'slice', 'file_name', 'mean', 'std', 'min', 'max'} とシリーズ・外接矩形の情報
+        """
+        series_idx = int(series_idx)
+        series = self.original_images_list[series_idx]
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        x0, y0, x1, y1 = clip_rect(series.shape, x, y, w, h)
+        try:
+            stack = series.roi_stack(x0, y0, x1, y1)
+            if shape != 'rect':
+                # (Z, h, w) からマスクの内側の画素だけを選んだ (Z, k) を集計する
+                stack = stack[:, crop_mask(self._roi_masks.get(shape, w, h, points), x, y, x0, y0, x1, y1)]
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        mean, std, lo, hi = calibrated_profile(stack, series.slopes, series.intercepts)
+        return {
+            'success': True,
+            'series': series_idx,
+            'folder': os.path.basename(self.active_subfolders[series_idx]),
+            'rect': [x0, y0, x1 - x0, y1 - y0],
+            'shape': shape,
+            'count': int(np.prod(stack.shape[1:])),
+            'slice': list(range(len(series))),
+            'file_name': list(series.file_names),
+            'mean': [round(v, 8) for v in mean.tolist()],
+            'std': [round(v, 8) for v in std.tolist()],
+            'min': [round(v, 8) for v in lo.tolist()],
+            'max': [round(v, 8) for v in hi.tolist()],
+        }
+
+    # Python側API: 直方体ROI（矩形 × スライス範囲）の統計
+    def get_cuboid_roi_stats(self, series_idx, x, y, w, h, slice_start, slice_end, shape='rect', points=None,
+                             percentiles=DEFAULT_CUBOID_PERCENTILES):
+        """
+        矩形ROIをslice_start〜slice_end（両端を含む）に伸ばした直方体のCT値の平均・標準偏差・min・max・パーセンタイル。
+        生データがcuboid_chunk_bytesを超える範囲はスライス方向のチャンクに分けて読み、メモリ使用量を抑える。
+        戻り値の'percentiles'は {'5': 値, '50': 値, ...}
+        """
+        series_idx = int(series_idx)
+        series = self.original_images_list[series_idx]
+        z0 = min(max(int(slice_start), 0), len(series))
+        z1 = min(max(int(slice_end) + 1, z0), len(series))
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        x0, y0, x1, y1 = clip_rect(series.shape, x, y, w, h)
+        chunks = chunk_ranges(z0, z1, (x1 - x0) * (y1 - y0) * series.dtype.itemsize, self.cuboid_chunk_bytes)
+        accumulator = CuboidAccumulator()
+        try:
+            mask = None
+            if shape != 'rect':
+                mask = crop_mask(self._roi_masks.get(shape, w, h, points), x, y, x0, y0, x1, y1)
+            for start, stop in chunks:
+                stack = series.roi_stack(x0, y0, x1, y1, start, stop)
+                accumulator.add(stack if mask is None else stack[:, mask],
+                                series.slopes[start:stop], series.intercepts[start:stop])
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        stats = accumulator.result(percentiles)
+        if stats is None:
+            return {'success': False, 'error': 'ROIの範囲に画素がありません'}
+        return {
+            'success': True,
+            'series': series_idx,
+            'folder': os.path.basename(self.active_subfolders[series_idx]),
+            'rect': [x0, y0, x1 - x0, y1 - y0],
+            'shape': shape,
+            'slices': [z0, z1 - 1],
+            'chunks': len(chunks),
+            'count': stats['count'],
+            'mean': round(stats['mean'], 8),
+            'std': round(stats['std'], 8),
+            'min': round(stats['min'], 8),
+            'max': round(stats['max'], 8),
+            'percentiles': {f"{q:g}": round(v, 8) for q, v in zip(percentiles, stats['percentiles'].tolist())},
+            # Falseなら値の種類が多すぎたため、パーセンタイルは固定ビンのヒストグラムからの近似値
+            'percentiles_exact': stats['exact'],
+        }
+
+    # Python側API: ROI内のCT値ヒストグラム（x, y, w, h を省略するとスライス全体。画像外にはみ出した部分は除く）
+    def get_hu_histogram(self, series_idx, slice_idx, x=0, y=0, w=None, h=None):
+        series = self.original_images_list[int(series_idx)]
+        slice_idx = int(slice_idx)
+        x, y = int(x), int(y)
+        w = series.shape[1] - x if w is None else int(w)
+        h = series.shape[0] - y if h is None else int(h)
+        # 負の座標をそのままスライスに使うと反対側の端から切り出されるので、画像内に収めてから切り出す
+        x0, y0, x1, y1 = clip_rect(series.shape, x, y, w, h)
+        if x0 == x1 or y0 == y1:
+            return {'hu': [], 'counts': []}
+        hu, counts = calibrated_histogram(series[slice_idx][y0:y1, x0:x1], *series.calibration(slice_idx))
+        return {'hu': hu.tolist(), 'counts': counts.tolist()}
+
+    def get_slice_path(self, series_idx, slice_idx):
+        # 表示中のスライスのファイルパス（索引から引くのでディスクアクセスしない）
+        file_name = self.file_names_list[series_idx][slice_idx]
+        path = self.file_path_index[series_idx].get(file_name)
+        if path is None:
+            path = os.path.join(self.active_subfolders[series_idx], file_name)
+        return path
+
     # Python側API: メタデータ取得
     def get_metadata(self, series_idx, slice_idx):
         series_idx = int(series_idx)
         slice_idx = int(slice_idx)
-        if series_idx < len(self.all_subfolders) and slice_idx < len(self.images_list[series_idx]):
+        if series_idx < len(self.all_subfolders) and slice_idx < len(self.original_images_list[series_idx]):
             try:
-                # 現在のファイル名からフォルダを特定
-                current_filename = self.file_names_list[series_idx][slice_idx]
-                current_folder = None
-                for folder in self.all_subfolders[series_idx]:
-                    test_images, _, test_files = self.load_single_folder(folder)
-                    if test_files and current_filename in test_files:
-                        current_folder = folder
-                        break
-                if current_folder is None:
-                    current_folder = self.all_subfolders[series_idx][0]  # フォールバック
-                
-                ds = pydicom.dcmread(os.path.join(current_folder, current_filename), force=True)
-                return str(ds)
+                # ピクセルデータを除いたヘッダとその文字列表現はヘッダキャッシュから返す
+                return self._header_cache.text(self.get_slice_path(series_idx, slice_idx))
             except Exception as e:
                 return f"メタデータの読み込みに失敗しました: {e}"
         return "メタデータがありません"
 
+    def _metadata_index(self, series_idx):
+        # シリーズの表示中フォルダごとに検索インデックスを作る（フォルダ切り替えで作り直す）
+        folder = self.active_subfolders[series_idx]
+        entry = self._metadata_indexes.get(series_idx)
+        if entry is None or entry[0] != folder:
+            paths = [self.get_slice_path(series_idx, i) for i in range(len(self.file_names_list[series_idx]))]
+            entry = (folder, MetadataIndex(paths, self._header_cache))
+            self._metadata_indexes[series_idx] = entry
+        return entry[1]
+
+    # Python側API: メタデータの行一覧（path指定でシーケンス/アイテムを展開、queryで全階層を検索）
+    def get_metadata_rows(self, series_idx, slice_idx, path='', query='', offset=0, limit=DEFAULT_METADATA_PAGE_SIZE):
+        series_idx = int(series_idx)
+        slice_idx = int(slice_idx)
+        offset = max(int(offset), 0)
+        limit = max(int(limit), 1)
+        if series_idx >= len(self.file_names_list) or not 0 <= slice_idx < len(self.file_names_list[series_idx]):
+            return {'success': False, 'error': 'メタデータがありません'}
+        try:
+            index = self._metadata_index(series_idx)
+            if query:
+                rows = index.search(slice_idx, query)
+            elif path:
+                rows = children_rows(index.dataset(slice_idx), path)
+            else:
+                rows = dataset_rows(index.dataset(slice_idx))
+        except Exception as e:
+            return {'success': False, 'error': f"メタデータの読み込みに失敗しました: {e}"}
+        return {'success': True, 'total': len(rows), 'offset': offset, 'rows': rows[offset:offset + limit]}
+
+    # Python側API: 指定タグの値ごとのスライス番号（例: KVPが異なるスライス）
+    def get_metadata_variation(self, series_idx, tag):
+        series_idx = int(series_idx)
+        parsed = parse_tag(tag)
+        if parsed is None:
+            return {'success': False, 'error': f"タグを解釈できません: {tag}"}
+        if series_idx >= len(self.file_names_list):
+            return {'success': False, 'error': 'メタデータがありません'}
+        groups = self._metadata_index(series_idx).variation(parsed)
+        return {
+            'success': True,
+            'tag': f"({parsed.group:04X},{parsed.element:04X})",
+            'keyword': keyword_for_tag(parsed),
+            'differs': len(groups) > 1,
+            'groups': groups,
+        }
+
+    # Python側API: スライス間で値が異なるタグの一覧
+    def get_varying_tags(self, series_idx):
+        series_idx = int(series_idx)
+        if series_idx >= len(self.file_names_list):
+            return {'success': False, 'error': 'メタデータがありません'}
+        tags = self._metadata_index(series_idx).varying_tags()
+        return {
+            'success': True,
+            'tags': [{'tag': f"({tag.group:04X},{tag.element:04X})", 'keyword': keyword_for_tag(tag), 'count': count}
+                     for tag, count in tags],
+        }
+
     # Python側API: ファイル名取得
     def get_filename(self, series_idx, slice_idx):
         series_idx = int(series_idx)
@@ -84,34 +390,88 @@ class DataManager:
         folder_idx = int(folder_idx)
         if series_idx < len(self.all_subfolders) and folder_idx < len(self.all_subfolders[series_idx]):
             new_folder = self.all_subfolders[series_idx][folder_idx]
-            images, original_images, file_names = self.load_single_folder(new_folder)
-            self.images_list[series_idx] = images
-            self.original_images_list[series_idx] = original_images
-            self.file_names_list[series_idx] = file_names
-            self.series_max_idx_list[series_idx] = len(images) - 1
+            series = self.load_single_folder(new_folder)
+            self.original_images_list[series_idx] = series
+            self.file_names_list[series_idx] = series.file_names
+            self.series_max_idx_list[series_idx] = len(series) - 1
+            self.active_subfolders[series_idx] = new_folder
+            self._frame_cache.invalidate(series_idx=series_idx)
+            self.file_path_index[series_idx] = self.build_file_path_index(new_folder, series.file_names)
+            self.note_current_slice(series_idx, 0)
+            if isinstance(series, ProgressiveSeries):
+                self._ensure_background_loading()
             # フォルダ切替時も諧調揃えONなら全画像再描画のためTrueを返す
             return {
                 'success': True,
-                'max_idx': len(images) - 1,
-                'match_contrast_enabled': self.match_contrast_enabled
+                'max_idx': len(series) - 1,
+                'match_contrast_enabled': self.match_contrast_enabled,
+                'image_size': [int(series.shape[1]), int(series.shape[0])]
             }
         return {'success': False}
     
     # Python側API: 現在のフォルダ名取得
     def get_current_folder_name(self, series_idx):
         series_idx = int(series_idx)
-        if series_idx < len(self.all_subfolders):
-            # 現在のフォルダを特定するために、最初のファイル名を比較
-            current_first_file = self.file_names_list[series_idx][0] if self.file_names_list[series_idx] else ""
-            for folder in self.all_subfolders[series_idx]:
-                test_images, _, test_files = self.load_single_folder(folder)
-                if test_files and test_files[0] == current_first_file:
-                    return os.path.basename(folder)
-            # 見つからない場合は最初のフォルダを返す
-            if self.all_subfolders[series_idx]:
-                return os.path.basename(self.all_subfolders[series_idx][0])
+        if series_idx < len(self.active_subfolders):
+            return os.path.basename(self.active_subfolders[series_idx])
         return "Unknown"
     
+    # Python側API: スライスキャッシュ（遅延読み込み）の統計取得
+    def get_slice_cache_stats(self):
+        return self._slice_cache.stats()
+
+    # Python側API: スライスごとの統計表（CT値のmin/max/平均と画素数、未計算のスライスはNone）
+    def get_slice_stats(self, series_idx):
+        series_idx = int(series_idx)
+        if series_idx >= len(self.original_images_list):
+            return {}
+        return self.original_images_list[series_idx].stats.to_dict()
+
+    # Python側API: ヘッダキャッシュ（メタデータ表示）の統計取得
+    def get_header_cache_stats(self):
+        return self._header_cache.stats()
+
+    # Python側API: ROI統計用の積分画像キャッシュの統計取得
+    def get_roi_cache_stats(self):
+        stats = self._integral_images.stats()
+        stats['masks'] = self._roi_masks.stats()
+        return stats
+
+    # Python側API: ドラッグ中プレビュー（縮小画像）キャッシュの統計取得
+    def get_preview_cache_stats(self):
+        return self._preview_pyramid.stats()
+
+    # Python側API: 描画済みフレームキャッシュの統計取得
+    def get_frame_cache_stats(self):
+        return dict(self._frame_cache.stats(), dropped_requests=self.dropped_frame_requests)
+
+    # Python側API: ボリュームディスクキャッシュの統計取得
+    def get_volume_cache_stats(self):
+        if self._volume_cache is None:
+            return {'enabled': False}
+        return dict(self._volume_cache.stats(), enabled=True)
+
+    # Python側API: メモリ使用量レポート（旧: float32+uint8のスライスリスト / 現: 生の格納値ボリューム）
+    def get_memory_report(self):
+        rows = []
+        for i, series in enumerate(self.original_images_list):
+            h, w = series.shape
+            voxels = len(series) * h * w
+            rows.append({
+                'series': i,
+                'slices': len(series),
+                'shape': [h, w],
+                'legacy_bytes': voxels * LEGACY_BYTES_PER_VOXEL,
+                'stored_bytes': series.nbytes,
+                'memmap': series.is_memmap,
+            })
+        return {
+            'series': rows,
+            'legacy_bytes': sum(r['legacy_bytes'] for r in rows),
+            'stored_bytes': sum(r['stored_bytes'] for r in rows),
+            'slice_cache_bytes': self._slice_cache.stats()['bytes'],
+        }
+
     # Python側API: フォルダタイプ取得
     def get_folder_type(self, series_idx):
         series_idx = int(series_idx)
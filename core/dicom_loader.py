@@ -1,24 +1,83 @@
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pydicom
+from core.parallel_decoder import ParallelDecoder, DEFAULT_DECODE_WORKERS, table_bits_stored
+from core.lazy_series import LazySeries
+from core.progressive_loader import ProgressiveSeries
+from core.series_volume import SeriesVolume, to_storage_dtype
+from core.scan_manifest import ScanManifest
+from core.slice_stats import SliceStats
+
+# ヘッダ読み込みはI/O待ちが主体なのでスレッドで並列化する
+HEADER_READ_WORKERS = 8
+
+
+def read_slice_header(path):
+    """ピクセルデータを読まずにヘッダのみ読み込み、ソート用の情報を返す"""
+    try:
+        ds = pydicom.dcmread(path, force=True, stop_before_pixels=True)
+    except Exception as e:
+        print(f"ヘッダ読み込み失敗: {path} {e}")
+        return None
+    try:
+        position = float(ds.ImagePositionPatient[2])
+    except Exception:
+        position = None
+    try:
+        instance = int(ds.InstanceNumber)
+    except Exception:
+        instance = None
+    return {
+        'path': path,
+        'position': position,
+        'instance': instance,
+        'rows': int(getattr(ds, 'Rows', 0) or 0),
+        'columns': int(getattr(ds, 'Columns', 0) or 0),
+        'bits_allocated': int(getattr(ds, 'BitsAllocated', 0) or 0),
+        'bits_stored': int(getattr(ds, 'BitsStored', 0) or 0),
+        'pixel_representation': int(getattr(ds, 'PixelRepresentation', 0) or 0),
+        'samples_per_pixel': int(getattr(ds, 'SamplesPerPixel', 1) or 1),
+        'slope': float(getattr(ds, 'RescaleSlope', 1.0) or 1.0),
+        'intercept': float(getattr(ds, 'RescaleIntercept', 0.0) or 0.0),
+    }
+
+
+def build_slice_table(dicom_files, workers=HEADER_READ_WORKERS):
+    """ヘッダのみを並列に読み込み、ImagePositionPatient/InstanceNumber順に並べたスライス表と
+    ヘッダを読めなかったファイルのパスの一覧を返す"""
+    if workers and workers > 1 and len(dicom_files) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            headers = list(executor.map(read_slice_header, dicom_files))
+    else:
+        headers = [read_slice_header(f) for f in dicom_files]
+    table = [h for h in headers if h is not None]
+    failed = [f for f, h in zip(dicom_files, headers) if h is None]
+
+    if table and all(h['position'] is not None for h in table):
+        table.sort(key=lambda h: h['position'])
+    elif table and all(h['instance'] is not None for h in table):
+        print("DICOMソート: ImagePositionPatientが無いためInstanceNumber順に並べます")
+        table.sort(key=lambda h: h['instance'])
+    else:
+        print("DICOMソート: 位置情報が無いためファイル名順に並べます")
+        table.sort(key=lambda h: h['path'])
+    return table, failed
+
 
 class DicomLoader:
     def load_all_folders(self, folders):
-        all_images = []
-        all_original_images = []
+        all_series = []
         all_file_names = []
         all_subfolders = []
         folder_types = []
+        active_subfolders = []
+        file_path_index = []
         
+        manifest = self._folder_manifest()
         for folder in folders:
-            subfolders = []
-            for item in os.listdir(folder):
-                item_path = os.path.join(folder, item)
-                if os.path.isdir(item_path):
-                    dicom_files = glob.glob(os.path.join(item_path, '*.dcm'))
-                    if dicom_files:
-                        subfolders.append(item_path)
+            # 更新時刻が変わっていないサブフォルダはマニフェストのファイル一覧を使い、再走査しない
+            subfolders = manifest.dicom_subfolders(folder)
             
             if len(subfolders) > 1:
                 folder_types.append('folder2')
@@ -29,43 +88,120 @@ class DicomLoader:
                 all_subfolders.append([folder])
                 current_subfolder = folder
             
-            images, original_images, file_names = self.load_single_folder(current_subfolder)
-            all_images.append(images)
-            all_original_images.append(original_images)
-            all_file_names.append(file_names)
+            series = self.load_single_folder(current_subfolder)
+            all_series.append(series)
+            all_file_names.append(series.file_names)
+            active_subfolders.append(current_subfolder)
+            file_path_index.append(self.build_file_path_index(current_subfolder, series.file_names))
         
+        manifest.save()
         self.all_subfolders = all_subfolders
         self.folder_types = folder_types
-        return all_images, all_original_images, all_file_names
+        # シリーズごとの表示中サブフォルダと {ファイル名: パス} の索引（フォルダを再読み込みせずに引く）
+        self.active_subfolders = active_subfolders
+        self.file_path_index = file_path_index
+        return all_series, all_file_names
     
+    def build_file_path_index(self, folder, file_names):
+        return {name: os.path.join(folder, name) for name in file_names}
+
+    def _folder_manifest(self):
+        # scan_manifestが無い場合は保存しないマニフェストを起動中だけ使う
+        if getattr(self, '_scan_manifest', None) is None:
+            self._scan_manifest = ScanManifest(None)
+        return self._scan_manifest
+
+    def _record_unreadable(self, folder, failed):
+        # ヘッダを読めずシリーズから除いたファイルをフォルダごとに保持する
+        if not hasattr(self, 'unreadable_files'):
+            self.unreadable_files = {}
+        if failed:
+            self.unreadable_files[folder] = failed
+            print(f"読み込めないファイルを{len(failed)}件除外しました: {folder}")
+        else:
+            self.unreadable_files.pop(folder, None)
+
     def load_single_folder(self, folder):
-        dicom_files = glob.glob(os.path.join(folder, '*.dcm'))
-        try:
-            dicom_files.sort(key=lambda x: pydicom.dcmread(x, force=True).ImagePositionPatient[2])
-        except Exception as e:
-            print(f"DICOMソートエラー: {e}")
-            dicom_files.sort()
+        dicom_files = self._folder_manifest().dicom_files(folder)
+        # ヘッダのみの並列パスでソートし、各ファイルは1回だけデコードする
+        if getattr(self, 'header_sort_enabled', True):
+            # ディスクキャッシュにデコード済みボリュームがあればヘッダ読み込みも含めて省略する
+            volume_cache = getattr(self, '_volume_cache', None)
+            if volume_cache is not None:
+                cached = volume_cache.load(folder, dicom_files)
+                if cached is not None:
+                    stats = SliceStats.from_dict(cached['stats'], len(cached['file_names'])) if cached['stats'] else None
+                    # 保存時に格納用の型へ揃え済みなので、memmapの値は走査しない
+                    series = SeriesVolume(cached['volume'], cached['slopes'],
+                                          cached['intercepts'], cached['file_names'], stats)
+                    # 統計表の無い古いキャッシュの場合のみボリュームを走査して作る
+                    series.compute_stats()
+                    return series
+            workers = getattr(self, 'header_workers', HEADER_READ_WORKERS)
+            table, failed = build_slice_table(dicom_files, workers)
+            self._record_unreadable(folder, failed)
+            if getattr(self, 'lazy_loading', False):
+                # 遅延読み込み: ここではデコードせず、要求されたスライスだけをLRUキャッシュ経由で読む
+                return LazySeries(table, self._slice_cache)
+            if getattr(self, 'progressive_loading', False):
+                # 段階的読み込み: 領域だけ確保し、スライスは表示時またはバックグラウンドで埋める
+                series = ProgressiveSeries.from_table(table, folder, dicom_files)
+                if series is not None:
+                    return series
+            return self._decode_slice_table(table, folder, dicom_files)
+        else:
+            try:
+                dicom_files.sort(key=lambda x: pydicom.dcmread(x, force=True).ImagePositionPatient[2])
+            except Exception as e:
+                print(f"DICOMソートエラー: {e}")
+                dicom_files.sort()
         
-        images = []
-        original_images = []
+        slices = []
+        slopes = []
+        intercepts = []
         file_names = []
         for f in dicom_files:
             try:
                 ds = pydicom.dcmread(f, force=True)
-                arr = ds.pixel_array
-                original_arr = arr.astype(np.float32) + ds.RescaleIntercept
-                original_images.append(original_arr)
-                arr = self.normalize(arr)
-                images.append(arr)
+                slices.append(ds.pixel_array)
+                slopes.append(float(getattr(ds, 'RescaleSlope', 1.0)))
+                intercepts.append(float(ds.RescaleIntercept))
                 file_names.append(os.path.basename(f))
             except Exception as e:
                 print(f"読み込み失敗: {f} {e}")
         
-        return images, original_images, file_names
+        return self._series_from_slices(slices, slopes, intercepts, file_names)
+
+    def _decode_slice_table(self, table, folder, dicom_files):
+        # ピクセルデコードはプロセスプールで並列化（decode_workers<=1ならシリアル）
+        decoder = ParallelDecoder(getattr(self, 'decode_workers', DEFAULT_DECODE_WORKERS))
+        decoded = decoder.decode(table)
+
+        valid = [i for i, arr in enumerate(decoded['slices']) if arr is not None]
+        file_names = [os.path.basename(table[i]['path']) for i in valid]
+        slopes = [decoded['slopes'][i] for i in valid]
+        intercepts = [decoded['intercepts'][i] for i in valid]
+
+        if decoded['volume'] is not None and len(valid) == len(table):
+            # デコード先のボリュームをそのまま（int16に揃えて）保持する
+            series = SeriesVolume(to_storage_dtype(decoded['volume'], table_bits_stored(table)), slopes, intercepts, file_names)
+            series.compute_stats()
+            # 全スライスを1つのボリュームにデコードできた場合のみディスクキャッシュに保存する
+            volume_cache = getattr(self, '_volume_cache', None)
+            if volume_cache is not None:
+                volume_cache.store(folder, dicom_files, series.volume, file_names, slopes, intercepts, series.stats)
+            return series
+
+        return self._series_from_slices([decoded['slices'][i] for i in valid], slopes, intercepts, file_names)
 
-    def normalize(self, arr):
-        arr = arr.astype(np.float32)
-        arr = (arr - arr.min()) / (arr.max() - arr.min() + 1e-8) * 255.0
-        return arr.astype(np.uint8)
+    def _series_from_slices(self, slices, slopes, intercepts, file_names):
+        # 同じサイズのスライスは1つの連続した (Z, H, W) 配列にまとめる
+        if slices and all(arr.shape == slices[0].shape for arr in slices):
+            volume = to_storage_dtype(np.stack(slices))
+        else:
+            volume = [to_storage_dtype(arr) for arr in slices]
+        series = SeriesVolume(volume, slopes, intercepts, file_names)
+        series.compute_stats()
+        return series
 
     
\ No newline at end of file
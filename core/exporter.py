@@ -65,3 +65,40 @@ class Exporter:
         except Exception as e:
             # エラーの詳細をメッセージに含める
             return {'success': False, 'message': f"ファイルの保存中にエラーが発生しました: {str(e)}"}
+
+    def export_roi_zprofile_to_excel(self, items):
+        """
+        items: [[シリーズ, x, y, w, h], ...]（末尾に形状と多角形の頂点を付けてもよい）。
+        シリーズごとにZプロファイル（全スライスのROI統計）を1シートに出力する
+        """
+        try:
+            now = datetime.datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
+            file_name = f"ROI-zprofile-{timestamp}.xlsx"
+            downloads_dir = os.path.join(os.path.expanduser('~'), 'Downloads')
+            file_path = os.path.join(downloads_dir, file_name)
+
+            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+                for series_idx, x, y, w, h, *shape in items:
+                    profile = self.get_roi_zprofile(series_idx, x, y, w, h, *shape)
+                    if not profile['success']:
+                        return {'success': False, 'message': profile['error']}
+                    df = pd.DataFrame({
+                        'Slice': [i + 1 for i in profile['slice']],
+                        'File': profile['file_name'],
+                        'Mean': profile['mean'],
+                        'Std Dev': profile['std'],
+                        'Min': profile['min'],
+                        'Max': profile['max'],
+                    })
+                    rx, ry, rw, rh = profile['rect']
+                    # 先頭の2行にフォルダ名とROIを書き、その下に表を出力する
+                    header = pd.DataFrame([[f"Folder{int(series_idx) + 1}", profile['folder']],
+                                           ['ROI', f"{profile['shape']} ({rx},{ry}) {rw}x{rh}"]])
+                    sheet_name = f"Folder{int(series_idx) + 1}"
+                    header.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+                    df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=3)
+
+            return {'success': True, 'filePath': file_path}
+        except Exception as e:
+            return {'success': False, 'message': f"ファイルの保存中にエラーが発生しました: {str(e)}"}
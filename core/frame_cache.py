@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+# 描画済みフレームキャッシュの既定メモリ上限（MB）
+DEFAULT_FRAME_CACHE_MB = 256
+
+
+class FrameCache:
+    """
+    エンコード済みフレーム（バイト列）のバイト数上限付きLRUキャッシュ。
+    キーは (シリーズ番号, フォルダ, スライス番号, 描画モード) で、描画モードにはウィンドウの値も含める。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_FRAME_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def __contains__(self, key):
+        # ヒット数・LRU順を変えずに有無だけを確認する（先読みの判定用）
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, frame):
+        size = len(frame)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._entries[key] = frame
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, series_idx=None, mode=None):
+        """条件に合うフレームを破棄する（series_idx: シリーズ番号、mode: 描画モード名。両方Noneなら全て）"""
+        with self._lock:
+            for key in [k for k in self._entries
+                        if (series_idx is None or k[0] == series_idx) and (mode is None or k[3][0] == mode)]:
+                self.current_bytes -= len(self._entries.pop(key))
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,115 @@
+import base64
+import io
+from PIL import Image, features
+
+# 表示・保存用エンコーダの既定値（操作中は速度優先、操作終了時と保存は可逆）
+DEFAULT_INTERACTIVE_ENCODER = 'jpeg:90'
+DEFAULT_FINAL_ENCODER = 'png:1'
+DEFAULT_DOWNLOAD_ENCODER = 'png'
+
+
+class FrameEncoder:
+    """PILで画像をエンコードする。name/mime/extensionはブラウザ表示とファイル保存に使う"""
+    name = None
+    mime = None
+    extension = None
+    pil_format = None
+
+    def __init__(self, **options):
+        self.options = options
+
+    @property
+    def spec(self):
+        # フレームキャッシュのキーにも使う設定文字列（例: 'png:1'）
+        values = ','.join(str(v) for v in self.options.values())
+        return f"{self.name}:{values}" if values else self.name
+
+    def available(self):
+        return True
+
+    def prepare(self, img):
+        return img
+
+    def encode_image(self, img):
+        buf = io.BytesIO()
+        self.prepare(img).save(buf, format=self.pil_format, **self.options)
+        return buf.getvalue()
+
+    def encode(self, arr):
+        """uint8配列をエンコードしたバイト列を返す"""
+        return self.encode_image(Image.fromarray(arr))
+
+    def data_url(self, arr):
+        return f"data:{self.mime};base64," + base64.b64encode(self.encode(arr)).decode('ascii')
+
+    def save(self, img, path):
+        with open(path, 'wb') as fp:
+            fp.write(self.encode_image(img))
+
+
+class PngEncoder(FrameEncoder):
+    """可逆PNG。compress_levelは0〜9（操作中は0〜1が高速）"""
+    name = 'png'
+    mime = 'image/png'
+    extension = 'png'
+    pil_format = 'PNG'
+
+    def __init__(self, compress_level=6):
+        super().__init__(compress_level=int(compress_level))
+
+
+class WebpEncoder(FrameEncoder):
+    """可逆WebP（methodは0が最速）"""
+    name = 'webp'
+    mime = 'image/webp'
+    extension = 'webp'
+    pil_format = 'WEBP'
+
+    def __init__(self, method=0):
+        super().__init__(lossless=True, method=int(method))
+
+    @property
+    def spec(self):
+        return f"{self.name}:{self.options['method']}"
+
+    def available(self):
+        return features.check('webp')
+
+
+class JpegEncoder(FrameEncoder):
+    """非可逆JPEG（スクラブ中の表示用、qualityは1〜95）"""
+    name = 'jpeg'
+    mime = 'image/jpeg'
+    extension = 'jpg'
+    pil_format = 'JPEG'
+
+    def __init__(self, quality=90):
+        super().__init__(quality=int(quality))
+
+    def prepare(self, img):
+        # JPEGはRGBA/パレットを保存できないのでRGB/グレースケールに揃える
+        return img if img.mode in ('L', 'RGB') else img.convert('RGB')
+
+
+class RawEncoder(FrameEncoder):
+    """無圧縮のuint8画素（<img>でそのまま表示できるようBMPのヘッダだけを付ける）"""
+    name = 'raw'
+    mime = 'image/bmp'
+    extension = 'bmp'
+    pil_format = 'BMP'
+
+
+ENCODERS = {cls.name: cls for cls in (PngEncoder, WebpEncoder, JpegEncoder, RawEncoder)}
+
+
+def make_encoder(spec):
+    """'png' / 'png:1' / 'webp' / 'webp:4' / 'jpeg:85' / 'raw' からエンコーダを作る"""
+    name, _, param = str(spec).strip().lower().partition(':')
+    if name == 'jpg':
+        name = 'jpeg'
+    if name not in ENCODERS:
+        raise ValueError(f"不明なエンコーダです: {spec}（{', '.join(ENCODERS)}）")
+    encoder = ENCODERS[name](param) if param and name != 'raw' else ENCODERS[name]()
+    if not encoder.available():
+        raise ValueError(f"このPillowでは {name} を利用できません")
+    return encoder
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import deque
+
+# 先読みするフレーム数の上限（0なら先読みしない）
+DEFAULT_PREFETCH_FRAMES = 8
+# スクロール速度の推定に使う直近の要求数
+PREFETCH_HISTORY = 6
+# この秒数の間に到達するスライスまで先読みする（速くスクロールしているほど先まで読む）
+PREFETCH_LOOKAHEAD_SECONDS = 0.5
+# これより間隔の空いた要求は別の操作とみなして速度の推定に使わない（秒）
+PREFETCH_HISTORY_SECONDS = 1.0
+
+
+class FramePrefetcher:
+    """
+    スライダー操作の要求列からシリーズごとのスクロール方向と速度を推定し、
+    次に表示されそうなフレームをバックグラウンドで描画してフレームキャッシュに入れる。
+    表示要求の描画中は先読みを始めず、新しい要求が来たら古い先読み計画は捨てる。
+    """
+
+    def note_frame_request(self, series_idx, idx, quality, mode, generation):
+        # 表示要求を記録して先読み計画を立て直す（begin_frame_requestから呼ぶ）
+        if self.prefetch_frames <= 0 or self._frame_cache.max_bytes <= 0:
+            return
+        now = time.monotonic()
+        with self._prefetch_lock:
+            history = self._request_history.setdefault(series_idx, deque(maxlen=PREFETCH_HISTORY))
+            if history and now - history[-1][0] > PREFETCH_HISTORY_SECONDS:
+                history.clear()
+            history.append((now, idx))
+            self._prefetch_plans[series_idx] = deque(
+                (i, quality, mode, generation) for i in self._prefetch_targets(series_idx, history))
+        self._ensure_prefetcher()
+        self._prefetch_event.set()
+
+    def _prefetch_targets(self, series_idx, history):
+        """直近の要求から (方向, 速度) を求め、先読みするスライス番号を近い順に返す"""
+        last = history[-1][1]
+        num_slices = len(self.original_images_list[series_idx])
+        direction = 0
+        count = 1
+        if len(history) >= 2:
+            (t0, i0), (t1, i1) = history[0], history[-1]
+            step = i1 - history[-2][1]
+            direction = (step > 0) - (step < 0) or (i1 > i0) - (i1 < i0)
+            if t1 > t0:
+                speed = abs(i1 - i0) / (t1 - t0)
+                count = int(round(speed * PREFETCH_LOOKAHEAD_SECONDS))
+        count = max(1, min(self.prefetch_frames, count))
+        if direction == 0:
+            # 止まっている（またはクリックで飛んだ）場合は前後1枚ずつ
+            candidates = [last + 1, last - 1]
+        else:
+            candidates = [last + direction * k for k in range(1, count + 1)]
+        return [i for i in candidates if 0 <= i < num_slices]
+
+    def _ensure_prefetcher(self):
+        with self._prefetch_lock:
+            if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+                return
+            self._prefetch_thread = threading.Thread(target=self._prefetch_worker, daemon=True)
+            self._prefetch_thread.start()
+
+    def _next_prefetch_job(self):
+        # 各シリーズの計画から1枚ずつ順番に取り出す
+        with self._prefetch_lock:
+            for series_idx in list(self._prefetch_plans):
+                plan = self._prefetch_plans[series_idx]
+                if plan:
+                    self._prefetch_plans.move_to_end(series_idx)
+                    return (series_idx,) + plan.popleft()
+                del self._prefetch_plans[series_idx]
+        return None
+
+    def _prefetch_worker(self):
+        while True:
+            self._prefetch_event.wait()
+            self._prefetch_event.clear()
+            while True:
+                job = self._next_prefetch_job()
+                if job is None:
+                    break
+                series_idx, idx, quality, mode, generation = job
+                # 表示要求の描画中は、描画が全て終わって通知されるまで待つ（先読みで表示を遅らせない）
+                with self._foreground_idle:
+                    self._foreground_idle.wait_for(lambda: self._foreground_renders == 0)
+                # 計画を立てた後に新しい要求が来ていれば、この計画は古い（新しい計画が入っている）
+                if self._frame_generations.get(series_idx) != generation:
+                    continue
+                if series_idx >= len(self.original_images_list):
+                    continue
+                key = self.frame_key(series_idx, idx, quality, mode)
+                if key in self._frame_cache:
+                    continue
+                try:
+                    self.get_frame_bytes(series_idx, idx, quality, mode)
+                    self.prefetched_frames += 1
+                except Exception as e:
+                    print(f"先読み失敗: シリーズ{series_idx} スライス{idx} {e}")
+
+    # Python側API: 先読みの統計
+    def get_prefetch_stats(self):
+        with self._prefetch_lock:
+            pending = sum(len(plan) for plan in self._prefetch_plans.values())
+        return {'max_frames': self.prefetch_frames, 'prefetched': self.prefetched_frames, 'pending': pending}
@@ -0,0 +1,108 @@
+import hashlib
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FrameRequestHandler(BaseHTTPRequestHandler):
+    """GET /frame/<series>/<slice>?window=...&q=...&t=... でエンコード済みフレームをバイナリのまま返す"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip('/').split('/')
+        server = self.server
+        if not secrets.compare_digest(query.get('t', [''])[0], server.token):
+            self.send_error(403)
+            return
+        if len(parts) != 3 or parts[0] != 'frame':
+            self.send_error(404)
+            return
+        try:
+            series_idx = int(parts[1])
+            slice_idx = int(parts[2])
+        except ValueError:
+            self.send_error(400)
+            return
+        api = server.api
+        if not 0 <= series_idx < len(api.original_images_list) or slice_idx < 0:
+            self.send_error(404)
+            return
+        quality = query.get('q', ['final'])[0]
+        try:
+            mode = api.render_mode_for(query.get('window', [''])[0])
+        except ValueError as e:
+            # HTTPの理由句はlatin-1しか送れないので、内容はログに出す
+            print(f"フレーム要求エラー: {e}")
+            self.send_error(400)
+            return
+        # 同じシリーズの新しい要求が来たら、このリクエストの描画は打ち切る
+        generation = api.begin_frame_request(series_idx, slice_idx, quality, mode)
+
+        # URLに含まれない入力（フォルダ・エンコーダ設定・諧調揃えの基準値）もETagに含め、変わっていなければ304を返す
+        key = api.frame_key(series_idx, slice_idx, quality, mode)
+        etag = '"' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20] + '"'
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'private, no-cache')
+            self.end_headers()
+            return
+        try:
+            data, encoder = api.get_frame_bytes(series_idx, slice_idx, quality, mode, generation)
+        except Exception as e:
+            print(f"フレーム配信失敗: {self.path} {e}")
+            self.send_error(500)
+            return
+        if data is None:
+            # 新しい要求に置き換えられた（画面側は新しいURLの画像を待っている）
+            self.send_response(204)
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', encoder.mime)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'private, no-cache')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # アクセスログは出さない（スライダー操作ごとに大量に出るため）
+        pass
+
+
+class FrameServer:
+    """
+    ローカルホストの空きポートでフレームを配信するHTTPサーバ。
+    base64化とjs_api経由の受け渡しを省き、<img>のsrcにURLを直接指定できるようにする。
+    他のプロセスから読まれないよう、起動ごとのトークンをクエリに要求する。
+    """
+
+    def __init__(self, api, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), FrameRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = api
+        self.httpd.token = secrets.token_urlsafe(16)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token(self):
+        return self.httpd.token
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"フレームサーバ起動: {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+import pydicom
+
+# ヘッダキャッシュの既定保持数（スライス数）
+DEFAULT_HEADER_CACHE_ENTRIES = 512
+# これより大きい要素（プライベートタグの大きなバイナリ等）は読み込みを遅延する
+HEADER_DEFER_SIZE = '16 KB'
+
+
+class HeaderCache:
+    """
+    スライスごとのヘッダ（ピクセルデータを除くDataset）と、その文字列表現を保持するLRUキャッシュ。
+    文字列表現は初回要求時に作り、以降は同じものを返す。
+    """
+
+    def __init__(self, max_entries=DEFAULT_HEADER_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # ファイル読み込みはロックの外で行う
+        ds = pydicom.dcmread(path, force=True, stop_before_pixels=True, defer_size=HEADER_DEFER_SIZE)
+        entry = {'dataset': ds, 'text': None}
+        with self._lock:
+            # 他のスレッドが先に読み込んでいればそちらを使う
+            entry = self._entries.setdefault(path, entry)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get(self, path):
+        """ピクセルデータを除くDatasetを返す"""
+        return self._entry(path)['dataset']
+
+    def text(self, path):
+        """str(Dataset)をスライスごとにメモ化して返す"""
+        entry = self._entry(path)
+        if entry['text'] is None:
+            entry['text'] = str(entry['dataset'])
+        return entry['text']
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -2,46 +2,93 @@ import base64
 import io
 import os
 from PIL import Image
-import numpy as np
 from datetime import datetime
+from core.calibration import apply_window, calibrated_range
+from core.render_engine import WINDOW_PRESETS, window_from_center_width
 
 class ImageProcessor:
     def get_min_ct_window(self):
         # 各画像のmin, max, 幅を計算し、最小幅の画像のmin, maxを基準にする
+        # スライスごとのmin/maxは読み込み時に統計表（SliceStats）へ計算済みなので、各シリーズの最小幅を比べるだけでよい
         min_base = None
         min_range = None
         min_width = None
         for series in self.original_images_list:
-            for arr in series:
-                arr_min = np.min(arr)
-                arr_max = np.max(arr)
-                width = arr_max - arr_min
-                if min_width is None or width < min_width:
-                    min_width = width
-                    min_base = arr_min
-                    min_range = width
+            best = series.stats.window()
+            if best is None:
+                continue
+            width, _, arr_min = best
+            if min_width is None or width < min_width:
+                min_width = width
+                min_base = arr_min
+                min_range = width
         # min_base: 最小幅画像のmin, min_range: その幅
         # 幅が0の場合は1にする（ゼロ除算防止）
         if min_range == 0:
             min_range = 1
         return min_base, min_range
 
-    def get_png_b64(self, arr):
-        # arrは必ず生CT値（float, pixel_array+RescaleIntercept）であること
-        arr_min = float(np.min(arr))
-        arr_max = float(np.max(arr))
-        arr_width = arr_max - arr_min
+    def render_mode_key(self):
+        # 描画結果を決める設定（フレームキャッシュのキーに使う）。画素データを読まずに求められるものだけを使う
+        window = getattr(self, 'window_setting', None)
+        if window is not None:
+            return ('window', window['center'], window['width'])
         if getattr(self, 'match_contrast_enabled', False):
-            base, ct_range = self.get_min_ct_window()
-            arr_disp = np.clip((arr - base) / ct_range, 0, 1)
-            arr_disp_uint8 = (arr_disp * 255.0).astype(np.uint8)
-            print(f"[諧調揃えON] 基準min: {base}, 基準max: {base+ct_range}, 幅: {ct_range} | スライスmin: {arr_min}, max: {arr_max}, 幅: {arr_width} | 正規化後min: {arr_disp.min()}, max: {arr_disp.max()}")
-            arr = arr_disp_uint8
+            return ('match',) + tuple(self.get_min_ct_window())
+        return ('auto',)
+
+    def render_mode_for(self, window_param):
+        """
+        URLのwindow指定から描画モードを求める。
+        ''（現在の設定）/ 'auto' / 'match' / プリセット名 / 'レベル,幅'。解釈できなければValueError
+        """
+        window_param = (window_param or '').strip()
+        if not window_param:
+            return self.render_mode_key()
+        if window_param == 'auto':
+            return ('auto',)
+        if window_param == 'match':
+            return ('match',) + tuple(self.get_min_ct_window())
+        if window_param in WINDOW_PRESETS:
+            _, center, width = WINDOW_PRESETS[window_param]
+            return ('window', center, width)
+        try:
+            center, width = (float(v) for v in window_param.split(','))
+        except ValueError:
+            raise ValueError(f"不明なウィンドウ指定です: {window_param}")
+        if width < 1:
+            raise ValueError('ウィンドウ幅は1以上を指定してください')
+        return ('window', center, width)
+
+    def get_display_uint8(self, arr, slope=1.0, intercept=0.0, mode=None):
+        # arrは生の格納値（pixel_array）。ウィンドウはCT値で決め、変換はfloat64で作ったLUTで行う
+        # modeはrender_mode_key()と同じ形式（('auto', min, max)ならそのCT値の範囲を使う）。省略時は現在の設定を使う
+        # スライス全体のmin/maxの走査は、自動モードで範囲が渡されなかった場合（と統計表が空の諧調揃え）だけ行う
+        mode = mode or self.render_mode_key()
+        if mode[0] == 'window':
+            # プリセットまたはウィンドウレベル/幅の指定がある場合はそれを優先する
+            base, ct_range = window_from_center_width(mode[1], mode[2])
+        elif mode[0] == 'match':
+            base, ct_range = mode[1], mode[2]
+            if base is None:
+                # 統計表がまだ1行も無い（遅延読み込みの起動直後など）場合はこのスライスの範囲を使う
+                arr_min, arr_max = calibrated_range(arr, slope, intercept)
+                base, ct_range = arr_min, (arr_max - arr_min) or 1
         else:
-            arr_norm = (arr - arr_min) / (arr_width + 1e-8)
-            arr_uint8 = (arr_norm * 255.0).astype(np.uint8)
-            print(f"[諧調揃えOFF] スライスmin: {arr_min}, max: {arr_max}, 幅: {arr_width} | 正規化後min: {arr_norm.min()}, max: {arr_norm.max()}")
-            arr = arr_uint8
+            if len(mode) == 3:
+                # 統計表（SliceStats）の行のmin/max。縮小プレビューも元の解像度のスライスの範囲で変換する（最終表示と諧調を揃える）
+                arr_min, arr_max = mode[1], mode[2]
+            else:
+                arr_min, arr_max = calibrated_range(arr, slope, intercept)
+            arr_width = arr_max - arr_min
+            base, ct_range = arr_min, arr_width + 1e-8
+        renderer = getattr(self, '_window_renderer', None)
+        if renderer is None:
+            return apply_window(arr, slope, intercept, base, ct_range)
+        return renderer.render(arr, slope, intercept, base, ct_range)
+
+    def get_png_b64(self, arr, slope=1.0, intercept=0.0):
+        arr = self.get_display_uint8(arr, slope, intercept)
         img = Image.fromarray(arr)
         buf = io.BytesIO()
         img.save(buf, format='PNG')
@@ -58,45 +105,20 @@ class ImageProcessor:
             from datetime import datetime
             import os
             
-            print("[DEBUG] ダウンロード処理開始")
-            
             # 現在表示されている画像のbase64データを取得
             display_images = []
             slice_names = []
             
-            print(f"[DEBUG] original_images_listの長さ: {len(self.original_images_list)}")
-            print(f"[DEBUG] 受け取ったcurrent_slices: {current_slices}")
-            
             for i, original_images in enumerate(self.original_images_list):
-                print(f"[DEBUG] シリーズ {i} の処理開始")
-                
                 # 現在のスライスインデックスを取得
                 current_slice_idx = current_slices[i] if i < len(current_slices) else 0
                 
-                print(f"[DEBUG] 現在のスライスインデックス: {current_slice_idx}")
-                
-                # 生CT値を取得
+                # 生の格納値とRescaleSlope/Interceptを取得
                 arr = original_images[current_slice_idx]
-                print(f"[DEBUG] 配列の形状: {arr.shape}, 型: {arr.dtype}")
+                slope, intercept = original_images.calibration(current_slice_idx)
                 
                 # 諧調調整を適用して表示用画素値に変換
-                arr_min = float(np.min(arr))
-                arr_max = float(np.max(arr))
-                arr_width = arr_max - arr_min
-                
-                print(f"[DEBUG] CT値範囲: min={arr_min}, max={arr_max}, width={arr_width}")
-                
-                if getattr(self, 'match_contrast_enabled', False):
-                    base, ct_range = self.get_min_ct_window()
-                    arr_disp = np.clip((arr - base) / ct_range, 0, 1)
-                    arr_disp_uint8 = (arr_disp * 255.0).astype(np.uint8)
-                    print(f"[DEBUG] 諧調揃えON: base={base}, ct_range={ct_range}")
-                else:
-                    arr_norm = (arr - arr_min) / (arr_width + 1e-8)
-                    arr_disp_uint8 = (arr_norm * 255.0).astype(np.uint8)
-                    print(f"[DEBUG] 諧調揃えOFF")
-                
-                print(f"[DEBUG] 表示用画素値範囲: min={arr_disp_uint8.min()}, max={arr_disp_uint8.max()}")
+                arr_disp_uint8 = self.get_display_uint8(arr, slope, intercept)
                 
                 # PNGに変換
                 img = Image.fromarray(arr_disp_uint8)
@@ -105,21 +127,15 @@ class ImageProcessor:
                 # スライス名を生成
                 slice_name = f"series{i+1}_slice{current_slice_idx+1}"
                 slice_names.append(slice_name)
-                print(f"[DEBUG] スライス名: {slice_name}")
-            
-            print(f"[DEBUG] 表示画像数: {len(display_images)}")
             
             # 複数画像を横に並べて結合
             if len(display_images) == 1:
                 combined_image = display_images[0]
-                print("[DEBUG] 単一画像のため結合なし")
             else:
                 # 画像の高さを統一（最大の高さに合わせる）
                 max_height = max(img.height for img in display_images)
                 total_width = sum(img.width for img in display_images) + (len(display_images) - 1) * 10  # 10px間隔
                 
-                print(f"[DEBUG] 結合画像サイズ: {total_width}x{max_height}")
-                
                 # 新しい画像を作成
                 combined_image = Image.new('L', (total_width, max_height), 255)
                 
@@ -130,8 +146,6 @@ class ImageProcessor:
                     y_offset = (max_height - img.height) // 2
                     combined_image.paste(img, (x_offset, y_offset))
                     x_offset += img.width + 10  # 10px間隔
-                
-                print("[DEBUG] 画像結合完了")
             
             # 個々の画像を保存
             individual_files = []
@@ -139,20 +153,17 @@ class ImageProcessor:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             for i, img in enumerate(display_images):
-                individual_filename = f"{slice_names[i]}-{timestamp}.png"
+                individual_filename = f"{slice_names[i]}-{timestamp}.{self._download_encoder.extension}"
                 individual_file_path = os.path.join(downloads_dir, individual_filename)
-                img.save(individual_file_path, format='PNG')
+                self._download_encoder.save(img, individual_file_path)
                 individual_files.append(individual_filename)
-                print(f"[DEBUG] 個別画像保存完了: {individual_file_path}")
             
             # 結合画像のファイル名を生成
-            combined_filename = f"{'-'.join(slice_names)}-{timestamp}.png"
+            combined_filename = f"{'-'.join(slice_names)}-{timestamp}.{self._download_encoder.extension}"
             combined_file_path = os.path.join(downloads_dir, combined_filename)
             
-            # 結合画像をPNGとして保存
-            combined_image.save(combined_file_path, format='PNG')
-            
-            print(f"[DEBUG] 結合画像保存完了: {combined_file_path}")
+            # 結合画像を保存（形式は保存用エンコーダ、既定はPNG）
+            self._download_encoder.save(combined_image, combined_file_path)
             
             return {
                 'success': True,
@@ -162,7 +173,7 @@ class ImageProcessor:
             }
             
         except Exception as e:
-            print(f"[DEBUG] エラー発生: {str(e)}")
+            print(f"画像保存失敗: {e}")
             import traceback
             traceback.print_exc()
             return {
@@ -180,46 +191,20 @@ class ImageProcessor:
             from datetime import datetime
             import os
             
-            print("[DEBUG] ROI含むダウンロード処理開始")
-            
             # 現在表示されている画像のbase64データを取得
             display_images = []
             slice_names = []
             
-            print(f"[DEBUG] original_images_listの長さ: {len(self.original_images_list)}")
-            print(f"[DEBUG] ROI座標リスト: {roi_coords_list}")
-            print(f"[DEBUG] 受け取ったcurrent_slices: {current_slices}")
-            
             for i, original_images in enumerate(self.original_images_list):
-                print(f"[DEBUG] シリーズ {i} の処理開始")
-                
                 # 現在のスライスインデックスを取得
                 current_slice_idx = current_slices[i] if i < len(current_slices) else 0
                 
-                print(f"[DEBUG] 現在のスライスインデックス: {current_slice_idx}")
-                
-                # 生CT値を取得
+                # 生の格納値とRescaleSlope/Interceptを取得
                 arr = original_images[current_slice_idx]
-                print(f"[DEBUG] 配列の形状: {arr.shape}, 型: {arr.dtype}")
+                slope, intercept = original_images.calibration(current_slice_idx)
                 
                 # 諧調調整を適用して表示用画素値に変換
-                arr_min = float(np.min(arr))
-                arr_max = float(np.max(arr))
-                arr_width = arr_max - arr_min
-                
-                print(f"[DEBUG] CT値範囲: min={arr_min}, max={arr_max}, width={arr_width}")
-                
-                if getattr(self, 'match_contrast_enabled', False):
-                    base, ct_range = self.get_min_ct_window()
-                    arr_disp = np.clip((arr - base) / ct_range, 0, 1)
-                    arr_disp_uint8 = (arr_disp * 255.0).astype(np.uint8)
-                    print(f"[DEBUG] 諧調揃えON: base={base}, ct_range={ct_range}")
-                else:
-                    arr_norm = (arr - arr_min) / (arr_width + 1e-8)
-                    arr_disp_uint8 = (arr_norm * 255.0).astype(np.uint8)
-                    print(f"[DEBUG] 諧調揃えOFF")
-                
-                print(f"[DEBUG] 表示用画素値範囲: min={arr_disp_uint8.min()}, max={arr_disp_uint8.max()}")
+                arr_disp_uint8 = self.get_display_uint8(arr, slope, intercept)
                 
                 # PNGに変換
                 img = Image.fromarray(arr_disp_uint8)
@@ -227,7 +212,6 @@ class ImageProcessor:
                 # ROIを描画
                 if i < len(roi_coords_list) and roi_coords_list[i] is not None:
                     roi_coords = roi_coords_list[i]
-                    print(f"[DEBUG] ROI座標: {roi_coords}")
                     
                     # ROIサイズを取得（JavaScriptから送信された値を使用）
                     roi_width = roi_coords.get('width', 10)
@@ -256,9 +240,19 @@ class ImageProcessor:
                     else:
                         color_tuple = (255, 0, 0)  # デフォルトは赤
                     
-                    # 指定された色で枠線を描画
-                    draw.rectangle([x, y, x + w, y + h], outline=color_tuple, width=2)
-                    print(f"[DEBUG] ROI描画完了: ({x}, {y}, {w}, {h}), 色: {color_tuple}")
+                    # 指定された色・形状で枠線を描画
+                    roi_shape = roi_coords.get('shape', 'rect')
+                    if roi_shape == 'circle':
+                        d = min(w, h)
+                        cx, cy = x + (w - d) / 2, y + (h - d) / 2
+                        draw.ellipse([cx, cy, cx + d, cy + d], outline=color_tuple, width=2)
+                    elif roi_shape == 'ellipse':
+                        draw.ellipse([x, y, x + w, y + h], outline=color_tuple, width=2)
+                    elif roi_shape == 'polygon' and roi_coords.get('points'):
+                        vertices = [(x + px, y + py) for px, py in roi_coords['points']]
+                        draw.line(vertices + vertices[:1], fill=color_tuple, width=2)
+                    else:
+                        draw.rectangle([x, y, x + w, y + h], outline=color_tuple, width=2)
                     
                     # RGB画像をそのまま使用
                     img = img_rgb
@@ -268,21 +262,15 @@ class ImageProcessor:
                 # スライス名を生成
                 slice_name = f"series{i+1}_slice{current_slice_idx+1}"
                 slice_names.append(slice_name)
-                print(f"[DEBUG] スライス名: {slice_name}")
-            
-            print(f"[DEBUG] 表示画像数: {len(display_images)}")
             
             # 複数画像を横に並べて結合
             if len(display_images) == 1:
                 combined_image = display_images[0]
-                print("[DEBUG] 単一画像のため結合なし")
             else:
                 # 画像の高さを統一（最大の高さに合わせる）
                 max_height = max(img.height for img in display_images)
                 total_width = sum(img.width for img in display_images) + (len(display_images) - 1) * 10  # 10px間隔
                 
-                print(f"[DEBUG] 結合画像サイズ: {total_width}x{max_height}")
-                
                 # 新しい画像を作成（RGBまたはグレースケール）
                 # ROIがある場合はRGB、ない場合はグレースケール
                 has_roi = any(i < len(roi_coords_list) and roi_coords_list[i] is not None for i in range(len(display_images)))
@@ -298,8 +286,6 @@ class ImageProcessor:
                     y_offset = (max_height - img.height) // 2
                     combined_image.paste(img, (x_offset, y_offset))
                     x_offset += img.width + 10  # 10px間隔
-                
-                print("[DEBUG] 画像結合完了")
             
             # 個々の画像を保存
             individual_files = []
@@ -307,20 +293,17 @@ class ImageProcessor:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             for i, img in enumerate(display_images):
-                individual_filename = f"{slice_names[i]}-ROI-{timestamp}.png"
+                individual_filename = f"{slice_names[i]}-ROI-{timestamp}.{self._download_encoder.extension}"
                 individual_file_path = os.path.join(downloads_dir, individual_filename)
-                img.save(individual_file_path, format='PNG')
+                self._download_encoder.save(img, individual_file_path)
                 individual_files.append(individual_filename)
-                print(f"[DEBUG] ROI含む個別画像保存完了: {individual_file_path}")
             
             # 結合画像のファイル名を生成
-            combined_filename = f"{'-'.join(slice_names)}-ROI-{timestamp}.png"
+            combined_filename = f"{'-'.join(slice_names)}-ROI-{timestamp}.{self._download_encoder.extension}"
             combined_file_path = os.path.join(downloads_dir, combined_filename)
             
-            # 結合画像をPNGとして保存
-            combined_image.save(combined_file_path, format='PNG')
-            
-            print(f"[DEBUG] ROI含む結合画像保存完了: {combined_file_path}")
+            # 結合画像を保存（形式は保存用エンコーダ、既定はPNG）
+            self._download_encoder.save(combined_image, combined_file_path)
             
             return {
                 'success': True,
@@ -330,7 +313,7 @@ class ImageProcessor:
             }
             
         except Exception as e:
-            print(f"[DEBUG] エラー発生: {str(e)}")
+            print(f"画像保存失敗: {e}")
             import traceback
             traceback.print_exc()
             return {
@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pydicom
+from core.series_volume import SeriesVolume, to_storage_dtype
+
+# スライスキャッシュの既定メモリ上限（MB）
+DEFAULT_SLICE_CACHE_MB = 1024
+
+
+class SliceCache:
+    """バイト数上限付きのLRUスライスキャッシュ（全シリーズで共有）"""
+
+    def __init__(self, max_bytes=DEFAULT_SLICE_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return arr
+
+    def put(self, key, arr):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = arr
+            self.current_bytes += arr.nbytes
+            # 上限を超えたら古いものから追い出す（直近に入れた1枚は必ず残す）
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class LazySeries(SeriesVolume):
+    """
+    ソート済みスライス表から必要なスライスだけをデコードするシリーズ。
+    SeriesVolume と同じように添字アクセスでき、生の格納値をLRUキャッシュに保持する。
+    """
+
+    def __init__(self, table, cache):
+        super().__init__(
+            None,
+            [h.get('slope', 1.0) for h in table],
+            [h.get('intercept', 0.0) for h in table],
+            [os.path.basename(h['path']) for h in table],
+        )
+        self.paths = [h['path'] for h in table]
+        self.cache = cache
+        first = table[0] if table else {}
+        self._shape = (first.get('rows') or 512, first.get('columns') or 512)
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self.paths)
+        if idx < 0 or idx >= len(self.paths):
+            raise IndexError('slice index out of range')
+        path = self.paths[idx]
+        arr = self.cache.get(path)
+        if arr is None:
+            arr = self._decode(path)
+            self.cache.put(path, arr)
+            # 遅延読み込みでは統計表はデコードしたスライスから順に埋まる
+            if not self.stats.valid[idx]:
+                self.stats.update(idx, arr, *self.calibration(idx))
+        return arr
+
+    def _decode(self, path):
+        try:
+            ds = pydicom.dcmread(path, force=True)
+            return to_storage_dtype(ds.pixel_array, int(getattr(ds, 'BitsStored', 0) or 0))
+        except Exception as e:
+            print(f"読み込み失敗: {path} {e}")
+            return np.zeros(self._shape, dtype=np.int16)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def nbytes(self):
+        # デコード済みスライスは共有のスライスキャッシュ側で計上する
+        return 0
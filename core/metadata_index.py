@@ -0,0 +1,178 @@
+import threading
+from pydicom.datadict import tag_for_keyword
+from pydicom.tag import Tag
+
+# メタデータ一覧の1ページあたりの既定行数
+DEFAULT_METADATA_PAGE_SIZE = 200
+# 検索用インデックスに保持する値の最大文字数
+MAX_VALUE_CHARS = 256
+
+
+def parse_tag(text):
+    """'KVP' / '00180060' / '(0018,0060)' / '0018,0060' のいずれかをTagに変換する（不明ならNone）"""
+    text = str(text).strip()
+    if not text:
+        return None
+    tag = tag_for_keyword(text)
+    if tag is not None:
+        return Tag(tag)
+    digits = text.strip('()').replace(',', '').replace(' ', '')
+    if len(digits) == 8:
+        try:
+            return Tag(int(digits, 16))
+        except ValueError:
+            return None
+    return None
+
+
+def element_row(elem, path):
+    """DataElementを表示用の1行（dict）にする。シーケンスは中身を展開せず項目数だけを返す"""
+    is_sequence = elem.VR == 'SQ'
+    try:
+        value = f"{len(elem.value)} item(s)" if is_sequence else str(elem.repval)
+    except Exception as e:
+        value = f"<読み込み失敗: {e}>"
+    return {
+        'path': path,
+        'tag': f"({elem.tag.group:04X},{elem.tag.element:04X})",
+        'keyword': elem.keyword,
+        'name': elem.name,
+        'vr': elem.VR,
+        'value': value[:MAX_VALUE_CHARS],
+        'depth': path.count('/'),
+        'children': len(elem.value) if is_sequence else 0,
+    }
+
+
+def _elements(ds, prefix):
+    # 最上位ではfile_metaの要素も先頭に含める
+    if not prefix and getattr(ds, 'file_meta', None) is not None:
+        yield from ds.file_meta
+    yield from ds
+
+
+def dataset_rows(ds, prefix=''):
+    """Datasetの直下の要素を行のリストにする"""
+    return [element_row(elem, f"{prefix}{int(elem.tag):08X}") for elem in _elements(ds, prefix)]
+
+
+def item_rows(elem, path):
+    """シーケンスの各アイテムを1行ずつ返す（アイテムの中身は展開時に返す）"""
+    return [{
+        'path': f"{path}/{i}",
+        'tag': '',
+        'keyword': 'Item',
+        'name': f"Item {i + 1}",
+        'vr': '',
+        'value': '',
+        'depth': path.count('/') + 1,
+        'children': len(item),
+    } for i, item in enumerate(elem.value)]
+
+
+def resolve_path(ds, path):
+    """'TTTTTTTT/アイテム番号/TTTTTTTT...' を辿って DataElement または Dataset（アイテム）を返す"""
+    node = ds
+    for i, part in enumerate(path.split('/')):
+        if i % 2 == 0:
+            tag = Tag(int(part, 16))
+            source = ds.file_meta if i == 0 and tag.group == 0x0002 and hasattr(ds, 'file_meta') else node
+            node = source[tag]
+        else:
+            node = node.value[int(part)]
+    return node
+
+
+def children_rows(ds, path):
+    """展開されたシーケンス（アイテム一覧）またはアイテム（要素一覧）の子の行を返す"""
+    node = resolve_path(ds, path)
+    if hasattr(node, 'VR'):
+        return item_rows(node, path)
+    return dataset_rows(node, path + '/')
+
+
+def flatten_rows(ds, prefix=''):
+    """検索用に全階層の要素を行にする"""
+    rows = []
+    for elem in _elements(ds, prefix):
+        row = element_row(elem, f"{prefix}{int(elem.tag):08X}")
+        rows.append(row)
+        if row['children']:
+            for i, item in enumerate(elem.value):
+                rows.extend(flatten_rows(item, f"{row['path']}/{i}/"))
+    return rows
+
+
+class MetadataIndex:
+    """
+    1シリーズ分のメタデータ検索インデックス。
+    スライスごとの全階層の行（検索用の小文字文字列付き）を初回要求時に作って保持し、
+    スライス間の値の比較（例: KVPが異なるスライス）は全スライスの最上位要素から求める。
+    """
+
+    def __init__(self, paths, header_cache):
+        self.paths = list(paths)
+        self.header_cache = header_cache
+        self._rows = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def dataset(self, slice_idx):
+        return self.header_cache.get(self.paths[slice_idx])
+
+    def slice_rows(self, slice_idx):
+        with self._lock:
+            rows = self._rows.get(slice_idx)
+        if rows is None:
+            rows = flatten_rows(self.dataset(slice_idx))
+            for row in rows:
+                row['_haystack'] = f"{row['tag']} {row['keyword']} {row['name']} {row['value']}".lower()
+            with self._lock:
+                self._rows[slice_idx] = rows
+        return rows
+
+    def search(self, slice_idx, query):
+        query = query.lower()
+        return [{k: v for k, v in row.items() if k != '_haystack'}
+                for row in self.slice_rows(slice_idx) if query in row['_haystack']]
+
+    def slice_values(self, slice_idx):
+        """最上位要素の {Tag: 値の文字列}（シーケンスは除く）"""
+        with self._lock:
+            values = self._values.get(slice_idx)
+        if values is None:
+            ds = self.dataset(slice_idx)
+            values = {}
+            for elem in ds:
+                if elem.VR != 'SQ':
+                    try:
+                        values[elem.tag] = str(elem.value)
+                    except Exception:
+                        values[elem.tag] = None
+            with self._lock:
+                self._values[slice_idx] = values
+        return values
+
+    def variation(self, tag):
+        """全スライスでの値ごとのスライス番号 [{'value', 'slices'}]（出現順）"""
+        groups = {}
+        for i in range(len(self.paths)):
+            try:
+                value = self.slice_values(i).get(tag)
+            except Exception as e:
+                print(f"ヘッダ読み込み失敗: {self.paths[i]} {e}")
+                value = None
+            groups.setdefault(value, []).append(i)
+        return [{'value': value, 'slices': slices} for value, slices in groups.items()]
+
+    def varying_tags(self):
+        """全スライスで値が揃っていない最上位要素の [(Tag, 値の種類数)]（一部のスライスにしか無い要素も含む）"""
+        loaded = []
+        for i in range(len(self.paths)):
+            try:
+                loaded.append(self.slice_values(i))
+            except Exception as e:
+                print(f"ヘッダ読み込み失敗: {self.paths[i]} {e}")
+        tags = set().union(*loaded) if loaded else set()
+        counts = [(tag, len({values.get(tag) for values in loaded})) for tag in sorted(tags)]
+        return [(tag, count) for tag, count in counts if count > 1]
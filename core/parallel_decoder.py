@@ -0,0 +1,190 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pydicom
+
+# デコードワーカー数の既定値（None/0/1 の場合はシリアルデコード）
+DEFAULT_DECODE_WORKERS = os.cpu_count() or 1
+# これより少ない枚数ではプロセス起動コストの方が大きいのでシリアルで処理する
+MIN_PARALLEL_SLICES = 16
+
+# ワーカープロセス側で保持する共有出力バッファ
+_worker_shm = None
+_worker_volume = None
+
+
+def _init_worker(shm_name, shape, dtype):
+    global _worker_shm, _worker_volume
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_volume = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+
+
+class LayoutMismatch(ValueError):
+    """デコードしたスライスのサイズまたは型がヘッダから決めた領域と一致しない"""
+
+
+def check_layout(arr, shape, dtype):
+    # 型の違う配列を代入すると値が黙って変換される（負値の折り返しなど）ので、一致しなければ書き込まない
+    if arr.shape != shape:
+        raise LayoutMismatch(f"画像サイズが一致しません: {arr.shape} != {shape}")
+    if arr.dtype != dtype:
+        raise LayoutMismatch(f"画素の型が一致しません: {arr.dtype} != {dtype}")
+
+
+def decode_into(path, out, dtype=None):
+    """1ファイルをデコードしてoutに書き込み、(slope, intercept)を返す（dtypeはpixel_arrayに期待する型、既定はoutの型）"""
+    ds = pydicom.dcmread(path, force=True)
+    arr = ds.pixel_array
+    check_layout(arr, out.shape, np.dtype(dtype) if dtype is not None else out.dtype)
+    out[...] = arr
+    slope = float(getattr(ds, 'RescaleSlope', 1.0))
+    intercept = float(getattr(ds, 'RescaleIntercept', 0.0))
+    return slope, intercept
+
+
+def _decode_task(task):
+    # ピクセルは共有バッファに直接書き込み、戻り値は校正値のみ（配列はpickleしない）
+    index, path = task
+    try:
+        slope, intercept = decode_into(path, _worker_volume[index])
+        return index, slope, intercept, None, False
+    except LayoutMismatch as e:
+        return index, None, None, str(e), True
+    except Exception as e:
+        return index, None, None, str(e), False
+
+
+def decode_slice(path):
+    """1ファイルをデコードして (配列, エラー文字列) を返す（段階的読み込みのプロセスプール用）"""
+    try:
+        return pydicom.dcmread(path, force=True).pixel_array, None
+    except Exception as e:
+        return None, str(e)
+
+
+def pixel_dtype(header):
+    """ヘッダのBitsAllocated/PixelRepresentationからpixel_arrayのdtypeを決める"""
+    bits = header.get('bits_allocated')
+    if bits not in (8, 16, 32) or header.get('samples_per_pixel', 1) != 1:
+        return None
+    kind = 'i' if header.get('pixel_representation') == 1 else 'u'
+    return np.dtype(f"{kind}{bits // 8}")
+
+
+def table_bits_stored(table):
+    """全スライスのBitsStoredの最大値（1枚でも不明なら0）"""
+    bits = [h.get('bits_stored') or 0 for h in table]
+    return 0 if not bits or 0 in bits else max(bits)
+
+
+def volume_layout(table):
+    """全スライスのサイズとdtypeが揃っていれば ((Z, H, W), dtype) を、揃っていなければ (None, None) を返す"""
+    if not table:
+        return None, None
+    first = table[0]
+    dtype = pixel_dtype(first)
+    for h in table:
+        if (h.get('rows'), h.get('columns')) != (first.get('rows'), first.get('columns')) or pixel_dtype(h) != dtype:
+            return None, None
+    if dtype is None or not first.get('rows') or not first.get('columns'):
+        return None, None
+    return (len(table), first['rows'], first['columns']), dtype
+
+
+class ParallelDecoder:
+    def __init__(self, workers=DEFAULT_DECODE_WORKERS):
+        self.workers = workers
+
+    def decode(self, table):
+        """
+        ソート済みスライス表の順にピクセルをデコードする。
+        戻り値: {'volume': (Z, H, W)配列 または None, 'slices': [2D配列 または None],
+                 'slopes': [...], 'intercepts': [...]}
+        """
+        shape, dtype = volume_layout(table)
+        if shape is None:
+            return self._decode_serial_list(table)
+        try:
+            if self.workers and self.workers > 1 and len(table) >= MIN_PARALLEL_SLICES:
+                try:
+                    return self._decode_parallel(table, shape, dtype)
+                except LayoutMismatch:
+                    raise
+                except Exception as e:
+                    print(f"並列デコード失敗のためシリアルで再実行します: {e}")
+            return self._decode_serial_volume(table, shape, dtype)
+        except LayoutMismatch as e:
+            # ヘッダと実際の画素のサイズ・型が違うスライスがあれば、サイズ・型の混在したシリーズと同じくスライスごとに保持する
+            print(f"ボリュームにまとめられないためスライスごとに読み込みます: {e}")
+            return self._decode_serial_list(table)
+
+    def _decode_parallel(self, table, shape, dtype):
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        try:
+            shared = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            workers = min(self.workers, len(table))
+            slopes = [None] * len(table)
+            intercepts = [None] * len(table)
+            valid = [False] * len(table)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shm.name, shape, dtype.str)) as executor:
+                tasks = [(i, h['path']) for i, h in enumerate(table)]
+                chunksize = max(1, len(tasks) // (workers * 4))
+                mismatch = None
+                for index, slope, intercept, error, layout_error in executor.map(_decode_task, tasks, chunksize=chunksize):
+                    if layout_error:
+                        mismatch = f"{table[index]['path']} {error}"
+                        continue
+                    if error is not None:
+                        print(f"読み込み失敗: {table[index]['path']} {error}")
+                        continue
+                    slopes[index] = slope
+                    intercepts[index] = intercept
+                    valid[index] = True
+            # 共有メモリは解放するため、親プロセス側の配列へ1回だけコピーする
+            volume = np.array(shared, copy=True) if mismatch is None else None
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+        if mismatch is not None:
+            raise LayoutMismatch(mismatch)
+        return self._result(volume, valid, slopes, intercepts)
+
+    def _decode_serial_volume(self, table, shape, dtype):
+        volume = np.empty(shape, dtype=dtype)
+        slopes = [None] * len(table)
+        intercepts = [None] * len(table)
+        valid = [False] * len(table)
+        for i, h in enumerate(table):
+            try:
+                slopes[i], intercepts[i] = decode_into(h['path'], volume[i])
+                valid[i] = True
+            except LayoutMismatch:
+                raise
+            except Exception as e:
+                print(f"読み込み失敗: {h['path']} {e}")
+        return self._result(volume, valid, slopes, intercepts)
+
+    def _decode_serial_list(self, table):
+        slices = []
+        slopes = []
+        intercepts = []
+        for h in table:
+            try:
+                ds = pydicom.dcmread(h['path'], force=True)
+                slices.append(ds.pixel_array)
+                slopes.append(float(getattr(ds, 'RescaleSlope', 1.0)))
+                intercepts.append(float(getattr(ds, 'RescaleIntercept', 0.0)))
+            except Exception as e:
+                print(f"読み込み失敗: {h['path']} {e}")
+                slices.append(None)
+                slopes.append(None)
+                intercepts.append(None)
+        return {'volume': None, 'slices': slices, 'slopes': slopes, 'intercepts': intercepts}
+
+    def _result(self, volume, valid, slopes, intercepts):
+        slices = [volume[i] if ok else None for i, ok in enumerate(valid)]
+        return {'volume': volume, 'slices': slices, 'slopes': slopes, 'intercepts': intercepts}
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ドラッグ中のプレビューの長辺の上限（px）。0ならプレビューを使わず常に元の解像度で描画する
+DEFAULT_PREVIEW_MAX_SIZE = 256
+# 保持する縮小レベル（1/2, 1/4）
+PREVIEW_FACTORS = (2, 4)
+# 縮小画像キャッシュの既定メモリ上限（MB）
+DEFAULT_PREVIEW_CACHE_MB = 128
+
+
+def block_average(arr, factor):
+    """factor×factorのブロック平均で縮小する（割り切れない端は切り捨て）。格納値の型のまま返す"""
+    h = arr.shape[0] // factor * factor
+    w = arr.shape[1] // factor * factor
+    # ブロック内の同じ位置の画素を間引いた配列どうしを足す（reshape + meanより速い）
+    integer = np.issubdtype(arr.dtype, np.integer)
+    total = np.zeros((h // factor, w // factor), dtype=np.int64 if integer and arr.itemsize > 2 else
+                     np.int32 if integer else np.float64)
+    for dy in range(factor):
+        for dx in range(factor):
+            total += arr[dy:h:factor, dx:w:factor]
+    count = factor * factor
+    if integer:
+        # 四捨五入（負の値も0から遠い側に丸める）
+        return np.where(total >= 0, (total + count // 2) // count, -((-total + count // 2) // count)).astype(arr.dtype)
+    return (total / count).astype(arr.dtype)
+
+
+def preview_factor(shape, max_size):
+    """長辺がmax_size以下になる最小の縮小率（1 / 2 / 4）"""
+    if max_size <= 0 or max(shape) <= max_size:
+        return 1
+    for factor in PREVIEW_FACTORS:
+        if max(shape) / factor <= max_size:
+            return factor
+    return PREVIEW_FACTORS[-1]
+
+
+class PreviewPyramid:
+    """
+    スライスごとの縮小画像（生の格納値の1/2, 1/4）のバイト数上限付きLRUキャッシュ。
+    1/4は1/2からブロック平均で作るので、元の解像度のスライスを読むのは最初の1回だけで済む。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_PREVIEW_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._levels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def level(self, key, factor, load_slice):
+        """keyのスライスの1/factor画像。キャッシュに無ければload_slice()で元の解像度を読んで作る"""
+        if factor == 1:
+            return load_slice()
+        with self._lock:
+            arr = self._levels.get((key, factor))
+            if arr is not None:
+                self._levels.move_to_end((key, factor))
+                self.hits += 1
+                return arr
+            self.misses += 1
+        source = load_slice() if factor == 2 else self.level(key, factor // 2, load_slice)
+        arr = block_average(source, 2)
+        self._put((key, factor), arr)
+        return arr
+
+    def _put(self, key, arr):
+        if arr.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._levels.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._levels[key] = arr
+            self.current_bytes += arr.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._levels.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._levels), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
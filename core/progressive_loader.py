@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from core.parallel_decoder import (decode_into, decode_slice, check_layout, table_bits_stored, volume_layout,
+                                   LayoutMismatch, MIN_PARALLEL_SLICES)
+from core.series_volume import SeriesVolume, fits_int16
+
+# 進捗をUIへ送る最小間隔（秒）
+PROGRESS_PUSH_INTERVAL = 0.2
+# バックグラウンド読み込みで1回にデコードプールへ渡す枚数（ワーカー1つあたり）
+BACKGROUND_BATCH_PER_WORKER = 2
+
+
+class ProgressiveSeries(SeriesVolume):
+    """
+    ボリュームの領域だけを先に確保し、スライスを後から（バックグラウンドで）埋めていくシリーズ。
+    未読み込みのスライスにアクセスした場合はその場でデコードする。
+    """
+
+    def __init__(self, table, shape, dtype, folder, dicom_files):
+        # dtypeはヘッダから決めたpixel_arrayの型。16bit符号なしでも有効ビット数が15以下ならint16で保持する
+        self.pixel_dtype = np.dtype(dtype)
+        storage_dtype = self.pixel_dtype
+        if storage_dtype == np.uint16 and fits_int16(storage_dtype, table_bits_stored(table)):
+            storage_dtype = np.dtype(np.int16)
+        super().__init__(
+            np.empty(shape, dtype=storage_dtype),
+            [h.get('slope', 1.0) for h in table],
+            [h.get('intercept', 0.0) for h in table],
+            [os.path.basename(h['path']) for h in table],
+        )
+        self.paths = [h['path'] for h in table]
+        self.folder = folder
+        self.dicom_files = dicom_files
+        self.loaded = np.zeros(len(table), dtype=bool)
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_table(cls, table, folder, dicom_files):
+        """スライスのサイズ・型が揃っている場合のみ作成する（揃っていなければNone）"""
+        shape, dtype = volume_layout(table)
+        if shape is None:
+            return None
+        return cls(table, shape, dtype, folder, dicom_files)
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not self.loaded[idx]:
+            self.load_slice(idx)
+        return self.volume[idx]
+
+    @property
+    def complete(self):
+        return bool(self.loaded.all())
+
+    def load_slice(self, idx):
+        with self._lock:
+            if self.loaded[idx]:
+                return
+            try:
+                decode_into(self.paths[idx], self.volume[idx], self.pixel_dtype)
+            except Exception as e:
+                self._mark_failed(idx, e)
+            self._mark_loaded(idx)
+
+    def store_slice(self, idx, arr, error=None):
+        # デコードプールで読んだスライスを書き込む（その間に表示要求で読み込み済みになっていれば何もしない）
+        with self._lock:
+            if self.loaded[idx]:
+                return
+            if error is None:
+                try:
+                    check_layout(arr, self.volume[idx].shape, self.pixel_dtype)
+                except LayoutMismatch as e:
+                    error = e
+            if error is None:
+                self.volume[idx] = arr
+            else:
+                self._mark_failed(idx, error)
+            self._mark_loaded(idx)
+
+    def _mark_failed(self, idx, error):
+        print(f"読み込み失敗: {self.paths[idx]} {error}")
+        self.volume[idx] = 0
+        self.failed += 1
+
+    def _mark_loaded(self, idx):
+        self.stats.update(idx, self.volume[idx], *self.calibration(idx))
+        self.loaded[idx] = True
+
+    def roi_stack(self, x0, y0, x1, y1, z0=0, z1=None):
+        # 範囲内の未読み込みのスライスはここで読み込んでからまとめる
+        z1 = len(self) if z1 is None else z1
+        for idx in np.flatnonzero(~self.loaded[z0:z1]) + z0:
+            self.load_slice(idx)
+        return super().roi_stack(x0, y0, x1, y1, z0, z1)
+
+    def next_unloaded(self, center):
+        """centerから外側に向かって最も近い未読み込みスライスの番号（無ければNone）"""
+        nearest = self.nearest_unloaded(center, 1)
+        return nearest[0] if nearest else None
+
+    def nearest_unloaded(self, center, count):
+        """centerに近い順に未読み込みスライスの番号を最大count個"""
+        pending = np.flatnonzero(~self.loaded)
+        order = np.argsort(np.abs(pending - int(center)), kind='stable')[:count]
+        return pending[order].tolist()
+
+    def loaded_ranges(self):
+        """読み込み済みスライスの連続範囲 [[start, end], ...]"""
+        flags = np.concatenate(([False], self.loaded, [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(flags))
+        return [[int(a), int(b) - 1] for a, b in zip(edges[::2], edges[1::2])]
+
+
+class ProgressiveLoader:
+    # ウィンドウ表示後、表示中スライスの周辺から外側へ向かって残りのスライスをバックグラウンドで読み込む
+    def start_background_loading(self, window=None):
+        self._window = window
+        for i, series in enumerate(self.original_images_list):
+            if isinstance(series, ProgressiveSeries):
+                self._push_load_progress(i, series)
+        self._ensure_background_loading()
+
+    def note_current_slice(self, series_idx, slice_idx):
+        # スライダー位置を記録し、バックグラウンド読み込みの起点にする
+        self._current_slices[int(series_idx)] = int(slice_idx)
+
+    def _ensure_background_loading(self):
+        with self._loading_lock:
+            if self._loading_thread is not None and self._loading_thread.is_alive():
+                return
+            self._loading_thread = threading.Thread(target=self._background_loading_worker, daemon=True)
+            self._loading_thread.start()
+
+    def _background_decode_pool(self):
+        # 残りのスライスが十分多く、decode_workers>1ならデコード用のプロセスプールを使う（--workers）
+        workers = getattr(self, 'decode_workers', 1) or 1
+        remaining = sum(int((~s.loaded).sum()) for s in self.original_images_list if isinstance(s, ProgressiveSeries))
+        if workers <= 1 or remaining < MIN_PARALLEL_SLICES:
+            return None, 1
+        try:
+            return ProcessPoolExecutor(max_workers=workers), workers
+        except Exception as e:
+            print(f"デコードプールを起動できないため1枚ずつ読み込みます: {e}")
+            return None, 1
+
+    def _background_loading_worker(self):
+        pool, workers = self._background_decode_pool()
+        try:
+            self._background_loading_loop(pool, workers)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _background_loading_loop(self, pool, workers):
+        last_push = {}
+        while True:
+            pending = [(i, s) for i, s in enumerate(self.original_images_list)
+                       if isinstance(s, ProgressiveSeries) and not s.complete]
+            if not pending:
+                with self._loading_lock:
+                    # ループ終了直前にフォルダ切り替えで追加されたシリーズが無いか再確認する
+                    if not any(isinstance(s, ProgressiveSeries) and not s.complete for s in self.original_images_list):
+                        self._loading_thread = None
+                        return
+                continue
+            # 各シリーズの表示位置に近い未読み込みスライスから順に、ワーカー数に応じた枚数ずつ読み込む
+            per_series = max(1, workers * BACKGROUND_BATCH_PER_WORKER // len(pending))
+            batch = [(series, idx) for i, series in pending
+                     for idx in series.nearest_unloaded(self._current_slices.get(i, 0), per_series)]
+            if pool is None:
+                for series, idx in batch:
+                    series.load_slice(idx)
+            else:
+                futures = [(series, idx, pool.submit(decode_slice, series.paths[idx])) for series, idx in batch]
+                for series, idx, future in futures:
+                    try:
+                        series.store_slice(idx, *future.result())
+                    except Exception as e:
+                        series.store_slice(idx, None, e)
+            for i, series in pending:
+                now = time.monotonic()
+                if series.complete:
+                    self._on_series_loaded(series)
+                    self._push_load_progress(i, series)
+                elif now - last_push.get(i, 0) >= PROGRESS_PUSH_INTERVAL:
+                    last_push[i] = now
+                    self._push_load_progress(i, series)
+
+    def _on_series_loaded(self, series):
+        print(f"バックグラウンド読み込み完了: {series.folder}")
+        volume_cache = getattr(self, '_volume_cache', None)
+        if volume_cache is not None and series.failed == 0:
+            volume_cache.store(series.folder, series.dicom_files, series.volume, series.file_names,
+                               series.slopes, series.intercepts, series.stats)
+
+    def _push_load_progress(self, series_idx, series):
+        window = getattr(self, '_window', None)
+        # フォルダ切り替え済みの古いシリーズの進捗は送らない
+        if window is None or series_idx >= len(self.original_images_list) or self.original_images_list[series_idx] is not series:
+            return
+        progress = self._series_load_progress(series)
+        try:
+            window.evaluate_js(f"updateLoadProgress({series_idx}, {json.dumps(progress)})")
+        except Exception as e:
+            print(f"進捗通知失敗: {e}")
+
+    def _series_load_progress(self, series):
+        total = len(series)
+        if isinstance(series, ProgressiveSeries):
+            return {'loaded': int(series.loaded.sum()), 'total': total, 'ranges': series.loaded_ranges()}
+        return {'loaded': total, 'total': total, 'ranges': [[0, total - 1]] if total else []}
+
+    # Python側API: 各シリーズの読み込み進捗
+    def get_load_progress(self):
+        return [self._series_load_progress(series) for series in self.original_images_list]
@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from core.calibration import lut_index_dtype, window_lut, apply_window
+
+# CTのウィンドウプリセット: 名前 -> (表示名, ウィンドウレベル(中心), ウィンドウ幅)
+WINDOW_PRESETS = OrderedDict([
+    ('lung', ('肺野', -600.0, 1500.0)),
+    ('mediastinum', ('縦隔', 40.0, 400.0)),
+    ('bone', ('骨', 400.0, 1800.0)),
+    ('brain', ('脳', 40.0, 80.0)),
+])
+# 保持するLUTの数（16bitのLUTは1つ64KB）
+DEFAULT_LUT_CACHE_ENTRIES = 64
+# 全体スライダー1回分のフレームを並列に描画・エンコードするスレッド数（1以下なら順番に処理）
+DEFAULT_RENDER_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def window_from_center_width(center, width):
+    """ウィンドウレベル/幅を、CT値の (下限, 幅) に変換する"""
+    width = max(float(width), 1.0)
+    return float(center) - width / 2.0, width
+
+
+class WindowRenderer:
+    """
+    生の格納値を表示用uint8に変換する描画エンジン。
+    ウィンドウ設定（格納値の型, slope, intercept, 下限, 幅）ごとに格納値の全パターン分のLUTを1回だけ作り、
+    LRUで保持して、各フレームは np.take 1回で変換する。
+    """
+
+    def __init__(self, max_entries=DEFAULT_LUT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._luts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lut(self, dtype, slope, intercept, base, width):
+        key = (np.dtype(dtype).str, float(slope), float(intercept), float(base), float(width))
+        with self._lock:
+            lut = self._luts.get(key)
+            if lut is not None:
+                self._luts.move_to_end(key)
+                self.hits += 1
+                return lut
+            self.misses += 1
+        lut = window_lut(dtype, slope, intercept, base, width)
+        with self._lock:
+            self._luts[key] = lut
+            while len(self._luts) > self.max_entries:
+                self._luts.popitem(last=False)
+        return lut
+
+    def render(self, raw, slope, intercept, base, width):
+        """CT値のウィンドウ [base, base+width] で表示用uint8に変換する"""
+        index_dtype = lut_index_dtype(raw.dtype)
+        if index_dtype is None:
+            # 8/16bit整数以外（浮動小数点など）はLUTを使わずに計算する
+            return apply_window(raw, slope, intercept, base, width)
+        return np.take(self.lut(raw.dtype, slope, intercept, base, width), raw.view(index_dtype))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._luts), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
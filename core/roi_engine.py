@@ -0,0 +1,500 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from core.calibration import raw_histogram
+
+# 積分画像キャッシュの既定メモリ上限（MB）。512x512のスライス1枚で約4MB
+DEFAULT_ROI_CACHE_MB = 256
+# 同じスライスへのROI問い合わせがこの回数に達したら積分画像を作る
+# （スライダー操作では1スライス1回の問い合わせが多く、積分画像を作るより直接集計する方が速いため）
+INTEGRAL_BUILD_AFTER = 2
+# 1回の問い合わせで集計するROIの合計面積がスライスの画素数のこの倍数以上なら、初回でも積分画像を作る
+# （512x512のint16で積分画像の作成はスライス全体の直接集計の約5〜15倍かかった）
+INTEGRAL_BUILD_AREA_FACTOR = 8
+# 問い合わせ回数を覚えておくスライス数
+QUERY_HISTORY_ENTRIES = 1024
+# 直方体ROIの集計で一度に読む生の格納値の既定上限（MB）。これを超える範囲はスライス方向のチャンクに分けて順に読む
+# （度数を数える間はチャンクの約4倍（intpの添字）の作業メモリを使う）
+DEFAULT_CUBOID_CHUNK_MB = 16
+# 直方体ROIの度数表に保持する値の種類数の上限（全slope/interceptの組の合計）。
+# 超えたら（浮動小数点のデータや、組の数が多い場合）固定ビン数のヒストグラムに切り替える
+CUBOID_MAX_HISTOGRAM_VALUES = 1 << 20
+# 切り替え後のヒストグラムのビン数（偶数）。パーセンタイルの誤差はビン幅以内で、画素数・平均・標準偏差・min・maxは厳密なまま
+CUBOID_HISTOGRAM_BINS = 1 << 16
+# 直方体ROIの統計で返すパーセンタイルの既定値
+DEFAULT_CUBOID_PERCENTILES = (5, 25, 50, 75, 95)
+# ROIの形状（矩形以外は外接矩形内のマスクで画素を選ぶ）
+ROI_SHAPES = ('rect', 'circle', 'ellipse', 'polygon')
+# キャッシュするROIマスクの数
+MASK_CACHE_ENTRIES = 256
+
+
+def clip_rect(shape, x, y, w, h):
+    """ROIの矩形を画像内に収めた (x0, y0, x1, y1)。負の座標は0にする"""
+    height, width = shape[:2]
+    x0 = min(max(x, 0), width)
+    y0 = min(max(y, 0), height)
+    x1 = min(max(x + w, x0), width)
+    y1 = min(max(y + h, y0), height)
+    return x0, y0, x1, y1
+
+
+def clip_rects(shape, rects):
+    """clip_rectの配列版。rectsは (k, 4) の [x, y, w, h]、戻り値は (k, 4) の [x0, y0, x1, y1]"""
+    height, width = shape[:2]
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    x0 = np.clip(rects[:, 0], 0, width)
+    y0 = np.clip(rects[:, 1], 0, height)
+    x1 = np.clip(rects[:, 0] + rects[:, 2], x0, width)
+    y1 = np.clip(rects[:, 1] + rects[:, 3], y0, height)
+    return np.stack([x0, y0, x1, y1], axis=1)
+
+
+def rasterize_roi_mask(shape, w, h, points=None):
+    """
+    w×hの外接矩形内のROIのマスク（bool, (h, w)）。画素中心 (i+0.5, j+0.5) が図形の内側にある画素をTrueにする。
+    circleは外接矩形の短辺を直径とする中央の円、ellipseは外接矩形に内接する楕円、
+    polygonは外接矩形の左上を原点とする頂点 [[x, y], ...] の多角形（偶奇規則）
+    """
+    if shape not in ROI_SHAPES:
+        raise ValueError(f'未対応のROI形状です: {shape}')
+    if shape == 'rect':
+        return np.ones((h, w), dtype=bool)
+    px = np.arange(w) + 0.5
+    py = (np.arange(h) + 0.5)[:, None]
+    if shape in ('circle', 'ellipse'):
+        rx, ry = w / 2.0, h / 2.0
+        if shape == 'circle':
+            rx = ry = min(w, h) / 2.0
+        if rx == 0 or ry == 0:
+            return np.zeros((h, w), dtype=bool)
+        return ((px - w / 2.0) / rx) ** 2 + ((py - h / 2.0) / ry) ** 2 <= 1.0
+    vertices = np.asarray(points if points is not None else [], dtype=np.float64).reshape(-1, 2)
+    if len(vertices) < 3:
+        raise ValueError('多角形ROIには3点以上の頂点が必要です')
+    inside = np.zeros((h, w), dtype=bool)
+    for (xa, ya), (xb, yb) in zip(vertices.tolist(), np.roll(vertices, -1, axis=0).tolist()):
+        if ya == yb:
+            continue
+        # 辺が画素中心の高さをまたぐ行では、交点より左の画素の内外を反転する
+        crosses = (ya > py) != (yb > py)
+        x_cross = xa + (py - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (px < x_cross)
+    return inside
+
+
+def gather_crops(arr, boxes):
+    """同じ大きさの矩形 (k, 4) [x0, y0, x1, y1] を、fancy indexing 1回で (k, h, w) の配列に切り出す"""
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    h = int(boxes[0, 3] - boxes[0, 1])
+    w = int(boxes[0, 2] - boxes[0, 0])
+    rows = (boxes[:, 1, None] + np.arange(h))[:, :, None]
+    cols = (boxes[:, 0, None] + np.arange(w))[:, None, :]
+    return arr[rows, cols]
+
+
+def crop_mean_std_batch(arr, rects, slope, intercept, mask_for=None):
+    """
+    複数のROI (k, 4) [x, y, w, h] のCT値の (平均の配列, 標準偏差の配列, 画素数の配列) を直接集計で求める。
+    画像内に収めた大きさが同じROIどうしを (n, h, w) に切り出し、まとめて1回のreductionで集計する。
+    mask_forは (w, h) からROIのマスクを返す関数（Noneなら矩形）
+    """
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    boxes = clip_rects(arr.shape, rects)
+    means = np.zeros(len(rects))
+    stds = np.zeros(len(rects))
+    counts = np.zeros(len(rects), dtype=np.int64)
+    # 切り出す大きさが同じ行をまとめる（マスクを使う場合はマスクの切り出し位置とROIの大きさも揃える）
+    keys = boxes[:, 2:] - boxes[:, :2]
+    if mask_for is not None:
+        keys = np.concatenate([keys, boxes[:, :2] - rects[:, :2], rects[:, 2:]], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    for group, key in enumerate(groups.tolist()):
+        crop_w, crop_h = key[:2]
+        if crop_w == 0 or crop_h == 0:
+            continue
+        rows = np.nonzero(inverse == group)[0]
+        stack = gather_crops(arr, boxes[rows])
+        if mask_for is not None:
+            dx, dy, w, h = key[2:]
+            stack = stack[:, mask_for(w, h)[dy:dy + crop_h, dx:dx + crop_w]]
+            if stack.shape[1] == 0:
+                continue
+        axes = tuple(range(1, stack.ndim))
+        means[rows] = stack.mean(axis=axes, dtype=np.float64) * slope + intercept
+        stds[rows] = stack.std(axis=axes, dtype=np.float64) * abs(slope)
+        counts[rows] = int(np.prod(stack.shape[1:]))
+    return means, stds, counts
+
+
+def crop_mask(mask, x, y, x0, y0, x1, y1):
+    """(x, y) に置いたマスクのうち、画像内に収めた矩形 [x0:x1, y0:y1]（clip_rectの結果）に重なる部分"""
+    return mask[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def masked_values(arr, x, y, mask):
+    """ROIの外接矩形だけを切り出し、マスクの内側の画素を1次元配列で返す（画像外にはみ出した部分は除く）"""
+    x0, y0, x1, y1 = clip_rect(arr.shape, x, y, mask.shape[1], mask.shape[0])
+    return arr[y0:y1, x0:x1][crop_mask(mask, x, y, x0, y0, x1, y1)]
+
+
+class RoiMaskCache:
+    """
+    (形状, w, h, 頂点) ごとのROIマスクのLRUキャッシュ。
+    マスクは位置に依存しないので、同じ形・大きさのROIはスライスや位置が変わっても1つのマスクを使い回す。
+    """
+
+    def __init__(self, max_entries=MASK_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape, w, h, points=None):
+        w, h = int(w), int(h)
+        vertices = None
+        if shape == 'polygon' and points is not None:
+            vertices = tuple(map(tuple, np.asarray(points, dtype=np.float64).reshape(-1, 2).tolist()))
+        key = (shape, w, h, vertices)
+        with self._lock:
+            mask = self._entries.get(key)
+            if mask is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return mask
+            self.misses += 1
+        mask = rasterize_roi_mask(shape, w, h, vertices)
+        # キャッシュしたマスクを呼び出し側で書き換えないよう読み取り専用にする
+        mask.flags.writeable = False
+        with self._lock:
+            self._entries[key] = mask
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return mask
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def _integral(arr):
+    # 先頭に0の行・列を付けた累積和（矩形の和は4点の加減算で求まる）
+    out = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1), dtype=arr.dtype)
+    np.cumsum(arr, axis=0, out=out[1:, 1:])
+    np.cumsum(out[1:, 1:], axis=1, out=out[1:, 1:])
+    return out
+
+
+class IntegralImage:
+    """
+    スライス1枚分の積分画像（xとx²の累積和）。任意の矩形の平均・標準偏差を4点の参照で求める。
+    16bit以下の整数データはint64で保持して和を厳密に求め、分散も整数演算で計算する（桁落ちしない）。
+    それ以外の型はfloat64で保持する。
+    """
+
+    def __init__(self, raw):
+        self.shape = raw.shape
+        self.exact = raw.dtype.kind in 'iu' and raw.dtype.itemsize <= 2
+        dtype = np.int64 if self.exact else np.float64
+        values = raw.astype(dtype)
+        self.sum = _integral(values)
+        self.sum_sq = _integral(values * values)
+
+    @property
+    def nbytes(self):
+        return self.sum.nbytes + self.sum_sq.nbytes
+
+    def rect_sums(self, x, y, w, h):
+        """矩形内の (画素数, xの和, x²の和)"""
+        x0, y0, x1, y1 = clip_rect(self.shape, x, y, w, h)
+        n = (x1 - x0) * (y1 - y0)
+        s1 = self.sum[y1, x1] - self.sum[y0, x1] - self.sum[y1, x0] + self.sum[y0, x0]
+        s2 = self.sum_sq[y1, x1] - self.sum_sq[y0, x1] - self.sum_sq[y1, x0] + self.sum_sq[y0, x0]
+        return n, s1, s2
+
+    def rect_sums_batch(self, rects):
+        """複数の矩形 (k, 4) の (画素数, xの和, x²の和) を配列で返す（4隅をまとめてfancy indexingで引く）"""
+        x0, y0, x1, y1 = clip_rects(self.shape, rects).T
+        n = (x1 - x0) * (y1 - y0)
+        s1 = self.sum[y1, x1] - self.sum[y0, x1] - self.sum[y1, x0] + self.sum[y0, x0]
+        s2 = self.sum_sq[y1, x1] - self.sum_sq[y0, x1] - self.sum_sq[y1, x0] + self.sum_sq[y0, x0]
+        return n, s1, s2
+
+    def calibrated_mean_std_batch(self, rects, slope, intercept):
+        """複数の矩形のCT値の (平均の配列, 標準偏差の配列, 画素数の配列)"""
+        n, s1, s2 = self.rect_sums_batch(rects)
+        means = np.zeros(len(n))
+        stds = np.zeros(len(n))
+        for i, (count, total, total_sq) in enumerate(zip(n.tolist(), s1.tolist(), s2.tolist())):
+            if count == 0:
+                continue
+            if self.exact:
+                # int64の配列のままだと n*Σx² が桁あふれし得るので、最後の分散だけPythonの整数で計算する
+                variance = (count * total_sq - total * total) / (count * count)
+            else:
+                variance = max(total_sq / count - (total / count) ** 2, 0.0)
+            means[i] = (total / count) * slope + intercept
+            stds[i] = abs(slope) * math.sqrt(variance)
+        return means, stds, n
+
+    def mean_std(self, x, y, w, h):
+        """矩形内の格納値の平均・標準偏差（np.mean / np.std と同じく母標準偏差）"""
+        n, s1, s2 = self.rect_sums(x, y, w, h)
+        if n == 0:
+            return 0.0, 0.0
+        if self.exact:
+            # Pythonの整数で n*Σx² - (Σx)² を厳密に求めてから割る
+            s1 = int(s1)
+            variance = (n * int(s2) - s1 * s1) / (n * n)
+        else:
+            variance = max(float(s2) / n - (float(s1) / n) ** 2, 0.0)
+        return s1 / n, math.sqrt(variance)
+
+    def calibrated_mean_std(self, x, y, w, h, slope, intercept):
+        """矩形内のCT値の平均・標準偏差（画素が無ければcalibrated_mean_stdと同じく0, 0）"""
+        if self.rect_sums(x, y, w, h)[0] == 0:
+            return 0.0, 0.0
+        mean_raw, std_raw = self.mean_std(x, y, w, h)
+        return mean_raw * slope + intercept, abs(slope) * std_raw
+
+
+class IntegralImageCache:
+    """
+    (フォルダ, スライス番号) ごとの積分画像のバイト数上限付きLRUキャッシュ。
+    同じスライスへの問い合わせが build_after 回に達した時点（ROIのドラッグなど）か、
+    1回に集計するROIの合計面積が作成コストに見合う場合に作る。ROIの個数では判断しない。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_ROI_CACHE_MB * 1024 * 1024, build_after=INTEGRAL_BUILD_AFTER):
+        self.max_bytes = max_bytes
+        self.build_after = build_after
+        self.current_bytes = 0
+        self.hits = 0
+        self.builds = 0
+        self.direct = 0
+        self._entries = OrderedDict()
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, load_slice, area_ratio=0.0):
+        """
+        積分画像を返す。まだ作らない（直接集計した方が速い）場合はNone。
+        area_ratioは今回集計するROIの合計面積とスライスの画素数の比
+        """
+        with self._lock:
+            integral = self._entries.get(key)
+            if integral is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return integral
+            count = self._queries.pop(key, 0) + 1
+            self._queries[key] = count
+            while len(self._queries) > QUERY_HISTORY_ENTRIES:
+                self._queries.popitem(last=False)
+            if count < self.build_after and area_ratio < INTEGRAL_BUILD_AREA_FACTOR:
+                self.direct += 1
+                return None
+        integral = IntegralImage(load_slice())
+        with self._lock:
+            self.builds += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            if integral.nbytes <= self.max_bytes:
+                self._entries[key] = integral
+                self.current_bytes += integral.nbytes
+                while self.current_bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted.nbytes
+        return integral
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'builds': self.builds, 'direct': self.direct}
+
+
+def chunk_ranges(start, stop, slice_bytes, max_bytes):
+    """スライス範囲 [start, stop) を、1チャンクの生データがmax_bytes以下になるよう [(z0, z1), ...] に分ける"""
+    step = max(1, int(max_bytes // max(slice_bytes, 1)))
+    return [(z, min(z + step, stop)) for z in range(start, stop, step)]
+
+
+class CuboidAccumulator:
+    """
+    直方体ROI（矩形 × スライス範囲）の統計をチャンクごとに積み上げる。
+    格納値ごとの度数をslope/interceptの組ごとに保持するので、全チャンクを読んだ後に
+    平均・標準偏差・パーセンタイルを厳密に求められる（保持するのは値の種類数分だけで、画素数には比例しない）。
+    値の種類数がmax_valuesを超えたら、CT値の固定ビン数のヒストグラムと厳密なモーメントに切り替える
+    （範囲外の値が来たらビンを2つずつまとめて範囲を倍に広げるので、メモリはビン数で上限が決まる）。
+    """
+
+    def __init__(self, max_values=CUBOID_MAX_HISTOGRAM_VALUES, bins=CUBOID_HISTOGRAM_BINS):
+        self.max_values = max_values
+        self.num_bins = bins
+        # (slope, intercept) -> (格納値の配列, 度数の配列)
+        self._histograms = {}
+        self._size = 0
+        # 固定ビンに切り替えた後のビンの度数・下端・幅と、(画素数, 平均, 偏差平方和, min, max)
+        self._bins = None
+        self._lo = 0.0
+        self._width = 0.0
+        self._moments = None
+
+    @property
+    def exact(self):
+        """パーセンタイルを度数表から厳密に求められるか（固定ビンに切り替えた後はFalse）"""
+        return self._bins is None
+
+    def add(self, stack, slopes, intercepts):
+        """(Z, h, w) の生の格納値と、スライスごとのslope/interceptの配列を加える"""
+        if stack.size == 0:
+            return
+        calibrations = np.stack([np.asarray(slopes, dtype=np.float64), np.asarray(intercepts, dtype=np.float64)], axis=1)
+        groups, inverse = np.unique(calibrations, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        for group, (slope, intercept) in enumerate(groups.tolist()):
+            # 通常はチャンク内の全スライスが同じslope/interceptなので、チャンク全体を1回で数える
+            part = stack if len(groups) == 1 else stack[np.nonzero(inverse == group)[0]]
+            if self._bins is not None:
+                self._add_binned(*self._calibrated_values(part, slope, intercept))
+                continue
+            values, counts = raw_histogram(part)
+            if self._size + len(values) <= self.max_values:
+                self._merge((slope, intercept), values, counts)
+                continue
+            # 合成すると上限を超える場合は、合成する前に固定ビンへ切り替える（大きな度数表を作らない）
+            self._switch_to_bins()
+            self._add_binned(values.astype(np.float64) * slope + intercept, counts)
+
+    def _calibrated_values(self, part, slope, intercept):
+        # 固定ビンへ加える (CT値, 度数)。16bit以下の整数はbincountで度数にまとめ、それ以外は画素ごとのCT値のまま渡す
+        if part.dtype.kind in 'iu' and part.dtype.itemsize <= 2:
+            values, counts = raw_histogram(part)
+            return values.astype(np.float64) * slope + intercept, counts
+        hu = part.astype(np.float64).ravel()
+        hu *= slope
+        hu += intercept
+        return hu, None
+
+    def _merge(self, key, values, counts):
+        old = self._histograms.get(key)
+        if old is not None:
+            self._size -= len(old[0])
+            values, inverse = np.unique(np.concatenate([old[0], values]), return_inverse=True)
+            counts = np.bincount(inverse.ravel(), weights=np.concatenate([old[1], counts]),
+                                 minlength=len(values)).astype(np.int64)
+        self._histograms[key] = (values, counts)
+        self._size += len(values)
+
+    def _calibrated_table(self):
+        # 全組の度数表をCT値の昇順に並べた (CT値の配列, 度数の配列)
+        values = np.concatenate([v.astype(np.float64) * slope + intercept
+                                 for (slope, intercept), (v, _) in self._histograms.items()])
+        counts = np.concatenate([c for _, c in self._histograms.values()])
+        order = np.argsort(values, kind='stable')
+        return values[order], counts[order]
+
+    def _switch_to_bins(self):
+        table = self._calibrated_table() if self._histograms else None
+        self._histograms = {}
+        self._size = 0
+        self._bins = np.zeros(self.num_bins, dtype=np.int64)
+        if table is not None:
+            self._add_binned(*table)
+
+    def _add_binned(self, hu, counts=None):
+        # countsがNoneならhuは画素ごとの値（度数1）。huはビン番号の計算に再利用して書き換える
+        total = hu.size if counts is None else int(counts.sum())
+        if total == 0:
+            return
+        # モーメントはチャンクごとの平均・偏差平方和を合成する（大きな値の二乗和の桁落ちを避ける）
+        mean = float(hu.mean()) if counts is None else float(np.dot(hu, counts)) / total
+        deviation = hu - mean
+        m2 = float(np.dot(deviation, deviation)) if counts is None else float(np.dot(deviation * deviation, counts))
+        del deviation
+        lo, hi = float(hu.min()), float(hu.max())
+        if self._moments is None:
+            # 最初に加える値の範囲をビンの範囲にする
+            self._lo = lo
+            self._width = (hi - lo) / self.num_bins or 1.0
+        else:
+            n0, mean0, m20, lo0, hi0 = self._moments
+            n = n0 + total
+            delta = mean - mean0
+            mean, m2 = mean0 + delta * total / n, m20 + m2 + delta * delta * n0 * total / n
+            total, lo, hi = n, min(lo0, lo), max(hi0, hi)
+        self._moments = (total, mean, m2, lo, hi)
+        self._expand_bins(lo, hi)
+        hu -= self._lo
+        hu /= self._width
+        index = hu.astype(np.intp)
+        del hu
+        np.minimum(index, self.num_bins - 1, out=index)
+        self._bins += np.bincount(index, weights=counts, minlength=self.num_bins).astype(np.int64)
+
+    def _expand_bins(self, lo, hi):
+        # 範囲に入らない値があれば、隣り合うビンをまとめて幅を倍にし、足りない側へ範囲を広げる
+        half = self.num_bins // 2
+        while lo < self._lo or hi > self._lo + self._width * self.num_bins:
+            merged = self._bins.reshape(half, 2).sum(axis=1)
+            self._bins = np.zeros(self.num_bins, dtype=np.int64)
+            if lo < self._lo:
+                self._bins[half:] = merged
+                self._lo -= self._width * self.num_bins
+            else:
+                self._bins[:half] = merged
+            self._width *= 2
+
+    def _binned_result(self, percentiles):
+        total, mean, m2, lo, hi = self._moments
+        # 順位 q/100*(N-1) を含むビンの中で、ビン内の順位に比例した位置の値を使う（誤差はビン幅以内）
+        cumulative = np.cumsum(self._bins)
+        ranks = np.asarray(percentiles, dtype=np.float64) / 100.0 * (total - 1)
+        bins = np.searchsorted(cumulative, ranks, side='right')
+        before = np.where(bins > 0, cumulative[bins - 1], 0)
+        position = bins + (ranks - before + 0.5) / self._bins[bins]
+        return {
+            'count': total,
+            'mean': mean,
+            'std': math.sqrt(m2 / total),
+            'min': lo,
+            'max': hi,
+            # 先頭と末尾の順位は厳密なmin/maxにする
+            'percentiles': np.where(ranks <= 0, lo, np.where(ranks >= total - 1, hi,
+                                                             np.clip(self._lo + self._width * position, lo, hi))),
+            'exact': False,
+        }
+
+    def result(self, percentiles=DEFAULT_CUBOID_PERCENTILES):
+        """
+        CT値の {'count', 'mean', 'std', 'min', 'max', 'percentiles', 'exact'}（画素が無ければNone）。
+        'exact'がFalseならパーセンタイルは固定ビンのヒストグラムからの近似値
+        """
+        if self._bins is not None:
+            return self._binned_result(percentiles)
+        if not self._histograms:
+            return None
+        values, counts = self._calibrated_table()
+        total = int(counts.sum())
+        mean = float(np.dot(values, counts)) / total
+        std = math.sqrt(float(np.dot((values - mean) ** 2, counts)) / total)
+        # 順位 q/100*(N-1) の前後の値を線形補間する（np.percentileの既定と同じ定義）
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(percentiles, dtype=np.float64) / 100.0 * (total - 1)
+        lower = np.floor(ranks)
+        below = values[np.searchsorted(cumulative, lower, side='right')]
+        above = values[np.searchsorted(cumulative, np.ceil(ranks), side='right')]
+        return {
+            'count': total,
+            'mean': mean,
+            'std': std,
+            'min': float(values[0]),
+            'max': float(values[-1]),
+            'percentiles': below + (above - below) * (ranks - lower),
+            'exact': True,
+        }
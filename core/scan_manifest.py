@@ -0,0 +1,122 @@
+import fnmatch
+import json
+import os
+import threading
+import time
+
+# ディレクトリ走査結果（マニフェスト）の既定保存先
+DEFAULT_SCAN_MANIFEST_PATH = os.path.join(os.path.expanduser('~'), '.ct-analyzer', 'scan_manifest.json')
+MANIFEST_VERSION = 1
+# 更新時刻の分解能が粗いファイルシステム（FAT/NAS等）向けに、直近に更新されたディレクトリは次回も再走査する
+MTIME_SETTLE_SECONDS = 2.0
+
+
+class ScanManifest:
+    """
+    フォルダごとのサブフォルダ一覧と *.dcm ファイル一覧（サイズ・更新時刻付き）を保持するインデックス。
+    ディレクトリの更新時刻が前回と同じなら走査を省略し、変わったディレクトリだけを os.scandir で再走査する。
+    path=None の場合はディスクに保存しない（起動中のみ有効）。
+    """
+
+    def __init__(self, path=DEFAULT_SCAN_MANIFEST_PATH):
+        self.path = path
+        self.scanned = 0
+        self.reused = 0
+        self._dirs = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+            if data.get('version') == MANIFEST_VERSION:
+                self._dirs = data.get('dirs', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"スキャンマニフェスト破損のため作り直します: {self.path} {e}")
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = {'version': MANIFEST_VERSION, 'dirs': self._dirs}
+            tmp_path = self.path + '.tmp'
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as fp:
+                    json.dump(data, fp, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                print(f"スキャンマニフェスト保存失敗: {e}")
+
+    def scan(self, folder):
+        """フォルダの {'subdirs': [名前], 'dicom_files': [{'name', 'size', 'mtime_ns'}]} を返す"""
+        key = os.path.abspath(folder)
+        try:
+            mtime_ns = os.stat(key).st_mtime_ns
+        except OSError:
+            with self._lock:
+                if self._dirs.pop(key, None) is not None:
+                    self._dirty = True
+            raise
+        with self._lock:
+            entry = self._dirs.get(key)
+            if entry is not None and entry.get('mtime_ns') == mtime_ns:
+                self.reused += 1
+                return entry
+        entry = self._scan_dir(key)
+        # 走査直前に更新されたディレクトリは、同じ更新時刻のまま中身が変わる可能性があるので信用しない
+        settled = time.time() - mtime_ns / 1e9 >= MTIME_SETTLE_SECONDS
+        entry['mtime_ns'] = mtime_ns if settled else None
+        with self._lock:
+            self._dirs[key] = entry
+            self._dirty = True
+            self.scanned += 1
+        return entry
+
+    def _scan_dir(self, folder):
+        subdirs = []
+        dicom_files = []
+        with os.scandir(folder) as it:
+            for item in it:
+                try:
+                    if item.is_dir():
+                        subdirs.append(item.name)
+                    elif fnmatch.fnmatch(item.name, '*.dcm') and item.is_file():
+                        st = item.stat()
+                        dicom_files.append({'name': item.name, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+                except OSError as e:
+                    print(f"スキャン失敗: {item.path} {e}")
+        return {'subdirs': subdirs, 'dicom_files': dicom_files}
+
+    def dicom_files(self, folder):
+        """フォルダ直下の *.dcm ファイルのパス一覧（glob('*.dcm') 相当）"""
+        try:
+            entry = self.scan(folder)
+        except OSError as e:
+            print(f"スキャン失敗: {folder} {e}")
+            return []
+        return [os.path.join(folder, f['name']) for f in entry['dicom_files']]
+
+    def dicom_subfolders(self, folder):
+        """*.dcm ファイルを含むサブフォルダのパス一覧"""
+        subfolders = []
+        for name in self.scan(folder)['subdirs']:
+            item_path = os.path.join(folder, name)
+            if self.dicom_files(item_path):
+                subfolders.append(item_path)
+        return subfolders
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'entries': len(self._dirs),
+                'scanned': self.scanned,
+                'reused': self.reused,
+            }
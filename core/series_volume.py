@@ -0,0 +1,97 @@
+import numpy as np
+from core.slice_stats import SliceStats
+
+# 旧実装のボクセルあたりバイト数（float32のHU値 + 正規化uint8）
+LEGACY_BYTES_PER_VOXEL = 4 + 1
+
+
+def fits_int16(dtype, bits_stored):
+    """BitsStored（0なら不明）から、値を走査せずにint16へ収まると分かるか（符号付きは16bit以下、符号なしは15bit以下）"""
+    dtype = np.dtype(dtype)
+    if dtype.kind not in 'iu' or not bits_stored:
+        return False
+    return bits_stored <= (16 if dtype.kind == 'i' else 15)
+
+
+def to_storage_dtype(volume, bits_stored=0):
+    """
+    生の格納値を、値域が収まる場合はint16に揃える（収まらない場合はそのまま）。
+    BitsStoredから収まると分かる場合はmin/maxを走査しない
+    """
+    if isinstance(volume, list) or volume.dtype == np.int16:
+        return volume
+    if volume.dtype.kind in 'iu' and volume.dtype.itemsize >= 2 and volume.size:
+        if fits_int16(volume.dtype, bits_stored):
+            return volume.astype(np.int16)
+        if volume.min() >= np.iinfo(np.int16).min and volume.max() <= np.iinfo(np.int16).max:
+            return volume.astype(np.int16)
+    return volume
+
+
+class SeriesVolume:
+    """
+    1シリーズ分の生の格納値を (Z, H, W) の連続配列で保持する。
+    RescaleSlope/Interceptはスライスごとに保持し、描画・ROI計算の集計の中でだけ適用する（core.calibration）。
+    添字アクセスはコピーの無いビュー（生の格納値）を返す。
+    """
+
+    def __init__(self, volume, slopes, intercepts, file_names, stats=None):
+        # サイズの異なるスライスが混在する場合のみvolumeは2D配列のリストになる
+        self.volume = volume
+        self.slopes = np.asarray(slopes, dtype=np.float64)
+        self.intercepts = np.asarray(intercepts, dtype=np.float64)
+        self.file_names = list(file_names)
+        # スライスごとのmin/max/平均/画素数（未計算の行は valid=False）
+        self.stats = stats if stats is not None else SliceStats(len(self.file_names))
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, idx):
+        return self.volume[int(idx)]
+
+    @property
+    def shape(self):
+        return self[0].shape if len(self) > 0 else (512, 512)
+
+    @property
+    def dtype(self):
+        return self[0].dtype if len(self) > 0 else np.dtype(np.int16)
+
+    @property
+    def nbytes(self):
+        if isinstance(self.volume, list):
+            return sum(arr.nbytes for arr in self.volume)
+        return self.volume.nbytes
+
+    @property
+    def is_memmap(self):
+        return isinstance(self.volume, np.memmap)
+
+    def compute_stats(self):
+        # 未計算のスライスの統計をまとめて計算する（読み込み済みボリューム用）
+        for i in np.flatnonzero(~self.stats.valid):
+            self.stats.update(i, self.volume[i], *self.calibration(i))
+
+    def roi_stack(self, x0, y0, x1, y1, z0=0, z1=None):
+        """
+        スライスz0〜z1-1（省略時は全スライス）の矩形 [y0:y1, x0:x1] を (Z, h, w) の配列で返す
+        （連続配列のボリュームならコピーの無いビュー）
+        """
+        z1 = len(self) if z1 is None else z1
+        if isinstance(self.volume, np.ndarray):
+            return self.volume[z0:z1, y0:y1, x0:x1]
+        slices = [self[i][y0:y1, x0:x1] for i in range(z0, z1)]
+        if not slices:
+            return np.zeros((0, y1 - y0, x1 - x0), dtype=self.dtype)
+        if len({arr.shape for arr in slices}) > 1:
+            raise ValueError('スライスのサイズが揃っていないため、全スライスの矩形をまとめられません')
+        return np.stack(slices)
+
+    def calibration(self, idx):
+        idx = int(idx)
+        return float(self.slopes[idx]), float(self.intercepts[idx])
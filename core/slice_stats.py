@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+from core.calibration import calibrated_range, calibrated_mean_std
+
+
+class SliceStats:
+    """
+    1シリーズ分のスライスごとの統計表（CT値のmin/max/平均と画素数）。
+    スライスをデコードした時点で1行ずつ埋め、諧調揃えの基準ウィンドウ（幅が最小のスライスのmin/幅）も
+    同時に更新するので、ウィンドウの参照はシリーズ数に比例する時間で済む。
+    """
+
+    def __init__(self, num_slices):
+        self.minimum = np.full(num_slices, np.nan)
+        self.maximum = np.full(num_slices, np.nan)
+        self.mean = np.full(num_slices, np.nan)
+        self.count = np.zeros(num_slices, dtype=np.int64)
+        self.valid = np.zeros(num_slices, dtype=bool)
+        # (幅, スライス番号, min)。同じ幅なら番号の小さいスライスを優先する（旧実装の走査順と同じ結果）
+        self._best = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.valid)
+
+    def update(self, idx, raw, slope, intercept):
+        """生の格納値のスライス1枚分の統計を計算して表に書き込む"""
+        lo, hi = calibrated_range(raw, slope, intercept) if raw.size else (0.0, 0.0)
+        mean, _ = calibrated_mean_std(raw, slope, intercept)
+        self.set_row(idx, lo, hi, mean, raw.size)
+
+    def set_row(self, idx, lo, hi, mean, count):
+        idx = int(idx)
+        with self._lock:
+            self.minimum[idx] = lo
+            self.maximum[idx] = hi
+            self.mean[idx] = mean
+            self.count[idx] = count
+            self.valid[idx] = True
+            candidate = (hi - lo, idx, lo)
+            if self._best is None or candidate[:2] < self._best[:2]:
+                self._best = candidate
+
+    def window(self):
+        """計算済みのスライスのうち幅が最小のものの (幅, スライス番号, min)。1枚も無ければNone"""
+        return self._best
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'min': [float(v) if ok else None for v, ok in zip(self.minimum, self.valid)],
+                'max': [float(v) if ok else None for v, ok in zip(self.maximum, self.valid)],
+                'mean': [float(v) if ok else None for v, ok in zip(self.mean, self.valid)],
+                'count': [int(v) for v in self.count],
+            }
+
+    @classmethod
+    def from_dict(cls, data, num_slices):
+        """to_dict() の結果から復元する（スライス数が合わなければNone）"""
+        try:
+            if len(data['min']) != num_slices:
+                return None
+            stats = cls(num_slices)
+            for i, (lo, hi, mean, count) in enumerate(zip(data['min'], data['max'], data['mean'], data['count'])):
+                if lo is not None:
+                    stats.set_row(i, lo, hi, mean, count)
+            return stats
+        except (KeyError, TypeError, ValueError):
+            return None
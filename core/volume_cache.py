@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# デコード済みボリュームのディスクキャッシュ既定値
+DEFAULT_VOLUME_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.ct-analyzer', 'volume_cache')
+DEFAULT_VOLUME_CACHE_GB = 10
+
+
+class VolumeCache:
+    """
+    デコード済みボリュームを .npy（生配列）+ .json（サイドカー）としてディスクに保存するキャッシュ。
+    キーはフォルダの絶対パスと各ファイルのサイズ・更新時刻から作るため、ファイルが変われば自動的に無効になる。
+    読み込みは np.memmap（open_memmap）で行うので再オープンはほぼ一瞬でコピーも発生しない。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_VOLUME_CACHE_DIR, max_bytes=DEFAULT_VOLUME_CACHE_GB * 1024 ** 3):
+        cache_dir = os.path.expanduser(cache_dir)
+        # 相対パスは起動時のカレントディレクトリ（リポジトリ内など）にキャッシュを書いてしまうので受け付けない
+        if not os.path.isabs(cache_dir):
+            raise ValueError(f'ボリュームキャッシュの保存先は絶対パスで指定してください: {cache_dir}')
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def folder_key(self, folder, dicom_files):
+        h = hashlib.sha1()
+        h.update(os.path.abspath(folder).encode('utf-8'))
+        for f in sorted(dicom_files):
+            st = os.stat(f)
+            h.update(f"\0{os.path.basename(f)}\0{st.st_size}\0{st.st_mtime_ns}".encode('utf-8'))
+        return h.hexdigest()
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, key + '.npy'), os.path.join(self.cache_dir, key + '.json')
+
+    def load(self, folder, dicom_files):
+        """キャッシュがあれば {'volume': memmap, 'file_names', 'slopes', 'intercepts'} を返す。無ければNone"""
+        try:
+            key = self.folder_key(folder, dicom_files)
+        except OSError as e:
+            print(f"ボリュームキャッシュ: ファイル情報の取得に失敗しました: {e}")
+            return None
+        npy_path, json_path = self._paths(key)
+        if not (os.path.exists(npy_path) and os.path.exists(json_path)):
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as fp:
+                meta = json.load(fp)
+            volume = np.lib.format.open_memmap(npy_path, mode='r')
+            if list(volume.shape) != meta['shape'] or len(meta['file_names']) != volume.shape[0]:
+                raise ValueError('サイドカーと配列の形状が一致しません')
+            # 保存するのは格納用の型（to_storage_dtype済み）のボリュームなので、読み込み時に型を変換・走査しない
+            if np.dtype(meta['dtype']) != volume.dtype:
+                raise ValueError('サイドカーと配列の型が一致しません')
+            # 最終利用時刻としてサイドカーの更新時刻を使う（LRU追い出し用）
+            os.utime(json_path, None)
+        except Exception as e:
+            print(f"ボリュームキャッシュ破損のため削除します: {npy_path} {e}")
+            self._remove(key)
+            return None
+        print(f"ボリュームキャッシュ使用: {folder}")
+        return {
+            'volume': volume,
+            'file_names': meta['file_names'],
+            'slopes': meta['slopes'],
+            'intercepts': meta['intercepts'],
+            'stats': meta.get('stats'),
+        }
+
+    def store(self, folder, dicom_files, volume, file_names, slopes, intercepts, stats=None):
+        if volume.nbytes > self.max_bytes:
+            return
+        try:
+            key = self.folder_key(folder, dicom_files)
+            npy_path, json_path = self._paths(key)
+            meta = {
+                'folder': os.path.abspath(folder),
+                'shape': list(volume.shape),
+                'dtype': volume.dtype.str,
+                'file_names': list(file_names),
+                'slopes': [float(v) for v in slopes],
+                'intercepts': [float(v) for v in intercepts],
+                'created': time.time(),
+            }
+            if stats is not None:
+                # スライスごとの統計表も保存し、再オープン時にボリューム全体を読まずに済むようにする
+                meta['stats'] = stats.to_dict()
+            with self._lock:
+                # 同じフォルダの古い（ファイル更新前の）エントリは無効なので削除する
+                self._remove_folder_entries(meta['folder'], keep=key)
+                tmp_npy = npy_path + '.tmp'
+                with open(tmp_npy, 'wb') as fp:
+                    np.save(fp, np.ascontiguousarray(volume))
+                os.replace(tmp_npy, npy_path)
+                tmp_json = json_path + '.tmp'
+                with open(tmp_json, 'w', encoding='utf-8') as fp:
+                    json.dump(meta, fp, ensure_ascii=False)
+                os.replace(tmp_json, json_path)
+                self._evict(keep=key)
+        except Exception as e:
+            print(f"ボリュームキャッシュ保存失敗: {folder} {e}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            npy_path, json_path = self._paths(key)
+            try:
+                size = os.path.getsize(npy_path)
+                last_used = os.path.getmtime(json_path)
+            except OSError:
+                size, last_used = 0, 0
+            entries.append((last_used, size, key))
+        return entries
+
+    def _remove_folder_entries(self, folder, keep):
+        for _, _, key in self._entries():
+            if key == keep:
+                continue
+            try:
+                with open(self._paths(key)[1], 'r', encoding='utf-8') as fp:
+                    if json.load(fp).get('folder') != folder:
+                        continue
+            except Exception:
+                pass
+            self._remove(key)
+
+    def _evict(self, keep):
+        # 合計サイズが上限を超えたら最終利用が古いものから削除する
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
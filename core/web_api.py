@@ -1,31 +1,115 @@
-from core.dicom_loader import DicomLoader
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from core.dicom_loader import DicomLoader, HEADER_READ_WORKERS
 from core.image_processor import ImageProcessor
 from core.data_manager import DataManager
-from core.exporter import Exporter
 from gui.web_controller import WebController
+from core.exporter import Exporter
+from core.progressive_loader import ProgressiveLoader
+from core.frame_prefetcher import FramePrefetcher, DEFAULT_PREFETCH_FRAMES
+from core.parallel_decoder import DEFAULT_DECODE_WORKERS
+from core.lazy_series import SliceCache, DEFAULT_SLICE_CACHE_MB
+from core.volume_cache import VolumeCache, DEFAULT_VOLUME_CACHE_GB
+from core.scan_manifest import ScanManifest
+from core.header_cache import HeaderCache
+from core.render_engine import WindowRenderer, DEFAULT_RENDER_WORKERS
+from core.frame_cache import FrameCache, DEFAULT_FRAME_CACHE_MB
+from core.frame_server import FrameServer
+from core.preview_pyramid import PreviewPyramid, DEFAULT_PREVIEW_MAX_SIZE, DEFAULT_PREVIEW_CACHE_MB
+from core.roi_engine import IntegralImageCache, RoiMaskCache, DEFAULT_ROI_CACHE_MB, DEFAULT_CUBOID_CHUNK_MB
+from core.frame_encoder import (make_encoder, DEFAULT_INTERACTIVE_ENCODER, DEFAULT_FINAL_ENCODER,
+                                DEFAULT_DOWNLOAD_ENCODER)
 
 
-class DicomWebApi(DicomLoader, ImageProcessor, DataManager, WebController, Exporter):
-    def __init__(self, dicom_folders):
+class DicomWebApi(DicomLoader, ImageProcessor, DataManager, WebController, Exporter, ProgressiveLoader,
+                  FramePrefetcher):
+    def __init__(self, dicom_folders, decode_workers=DEFAULT_DECODE_WORKERS, lazy_loading=False,
+                 slice_cache_mb=DEFAULT_SLICE_CACHE_MB, volume_cache_dir=None,
+                 volume_cache_gb=DEFAULT_VOLUME_CACHE_GB, progressive_loading=False,
+                 scan_manifest_path=None, frame_cache_mb=DEFAULT_FRAME_CACHE_MB,
+                 interactive_encoder=DEFAULT_INTERACTIVE_ENCODER, final_encoder=DEFAULT_FINAL_ENCODER,
+                 download_encoder=DEFAULT_DOWNLOAD_ENCODER, frame_server=False,
+                 render_workers=DEFAULT_RENDER_WORKERS, prefetch_frames=DEFAULT_PREFETCH_FRAMES,
+                 preview_max_size=DEFAULT_PREVIEW_MAX_SIZE, preview_cache_mb=DEFAULT_PREVIEW_CACHE_MB,
+                 roi_cache_mb=DEFAULT_ROI_CACHE_MB, cuboid_chunk_mb=DEFAULT_CUBOID_CHUNK_MB, defer_series=False,
+                 header_sort_enabled=True, header_workers=HEADER_READ_WORKERS):
+        # このオブジェクトはpywebviewのjs_apiとして公開され、pywebviewは公開属性を辿るので、
+        # キャッシュ・スレッドプール・エンコーダなど内部のオブジェクトはすべてアンダースコア付きで保持する
         self.dicom_folders = dicom_folders
-        self.images_list, self.original_images_list, self.file_names_list = self.load_all_folders(dicom_folders)
-        self.series_count = len(self.images_list)
-        self.series_max_idx_list = [len(images) - 1 for images in self.images_list]
-        self.global_max_idx = min(self.series_max_idx_list) if self.series_count > 0 else 0
+        # ピクセルデコードの並列ワーカー数（1以下ならシリアル）
+        self.decode_workers = decode_workers
+        # 遅延読み込み: スライスは要求時にデコードし、メモリ上限付きLRUキャッシュに保持する
+        self.lazy_loading = lazy_loading
+        # ヘッダのみの並列読み込みでソートする（Falseなら従来どおり全ファイルを読んでソート）と、その並列数
+        self.header_sort_enabled = header_sort_enabled
+        self.header_workers = header_workers
+        # ヘッダを読めずシリーズから除いたファイル（{フォルダ: [パス]}）
+        self.unreadable_files = {}
+        self._slice_cache = SliceCache(int(slice_cache_mb * 1024 * 1024))
+        # デコード済みボリュームのディスクキャッシュ（volume_cache_dir=Noneなら無効）
+        self._volume_cache = VolumeCache(volume_cache_dir, int(volume_cache_gb * 1024 ** 3)) if volume_cache_dir else None
+        # メタデータ表示用のヘッダキャッシュ（ピクセルデータを除くDatasetと文字列表現を保持）
+        self._header_cache = HeaderCache()
+        self._metadata_indexes = {}
+        # フォルダ走査結果のインデックス（scan_manifest_path=Noneなら保存せず起動中のみ使う）
+        self._scan_manifest = ScanManifest(scan_manifest_path)
+        # 段階的読み込み: 起動時は表示スライスだけを読み、残りはウィンドウ表示後にバックグラウンドで読む
+        self.progressive_loading = progressive_loading
+        self._current_slices = {}
+        self._loading_lock = threading.Lock()
+        self._loading_thread = None
+        self._window = None
+        # シリーズごとの表示要求の世代（古い要求の描画を打ち切る）
+        self._frame_generations = {}
+        self._frame_generation_lock = threading.Lock()
+        self.dropped_frame_requests = 0
+        # 描画中の表示要求の数。0に戻ったら先読みスレッドに通知する
+        self._foreground_renders = 0
+        self._foreground_idle = threading.Condition(self._frame_generation_lock)
+        # スクロール方向・速度からの先読み（prefetch_frames=0なら無効）
+        self.prefetch_frames = prefetch_frames
+        self.prefetched_frames = 0
+        self._request_history = {}
+        self._prefetch_plans = OrderedDict()
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_event = threading.Event()
+        self._prefetch_thread = None
+        # 各シリーズは生の格納値の (Z, H, W) ボリューム（SeriesVolume / LazySeries / ProgressiveSeries）
+        # defer_series=Trueなら読み込みはload_series()まで遅らせる（ウィンドウを先に表示するため）
+        self._set_series([], [])
+        if not defer_series:
+            self.load_series()
+        # 諧調揃え状態
         self.match_contrast_enabled = False
-from core.dicom_loader import DicomLoader
-from core.image_processor import ImageProcessor
-from core.data_manager import DataManager
-from gui.web_controller import WebController
-from core.exporter import Exporter
+        # 表示用uint8への変換（ウィンドウ設定ごとのLUTを保持）と、プリセット/手動のウィンドウ指定（Noneなら自動）
+        self._window_renderer = WindowRenderer()
+        self.window_setting = None
+        # 全シリーズのフレームを並列に描画・エンコードするスレッドプール（render_workers<=1なら順番に処理）
+        self._render_pool = ThreadPoolExecutor(max_workers=render_workers) if render_workers and render_workers > 1 else None
+        # エンコード済みフレームのLRUキャッシュ（スクラブで同じスライスを再描画しない）
+        self._frame_cache = FrameCache(int(frame_cache_mb * 1024 * 1024))
+        # ドラッグ中は縮小プレビュー（1/2, 1/4のブロック平均）を送り、離したら元の解像度で描き直す（preview_max_size=0なら無効）
+        self.preview_max_size = preview_max_size
+        self._preview_pyramid = PreviewPyramid(int(preview_cache_mb * 1024 * 1024))
+        # ROI統計用の積分画像（xとx²の累積和）のキャッシュ
+        self._integral_images = IntegralImageCache(int(roi_cache_mb * 1024 * 1024))
+        # 円・楕円・多角形ROIのマスク（形状と大きさごとに1回だけ作る）
+        self._roi_masks = RoiMaskCache()
+        # 直方体ROIの統計で一度に読む生データの上限（超える範囲はスライス方向に分割して読む）
+        self.cuboid_chunk_bytes = int(cuboid_chunk_mb * 1024 * 1024)
+        # フレームのエンコーダ（ドラッグ中は高速な非可逆、離したら可逆）と画像保存用エンコーダ
+        self._frame_encoders = {'interactive': make_encoder(interactive_encoder), 'final': make_encoder(final_encoder)}
+        self._download_encoder = make_encoder(download_encoder)
+        # フレームをHTTPで配信するローカルサーバ（frame_server=Falseならjs_api経由のdata URLで受け渡す）
+        self._frame_server = FrameServer(self).start() if frame_server else None
 
+    def load_series(self):
+        """全フォルダのヘッダを走査して表示スライスを読み込む"""
+        self._set_series(*self.load_all_folders(self.dicom_folders))
 
-class DicomWebApi(DicomLoader, ImageProcessor, DataManager, WebController, Exporter):
-    def __init__(self, dicom_folders):
-        self.dicom_folders = dicom_folders
-        self.images_list, self.original_images_list, self.file_names_list = self.load_all_folders(dicom_folders)
-        self.series_count = len(self.images_list)
-        self.series_max_idx_list = [len(images) - 1 for images in self.images_list]
+    def _set_series(self, series_list, file_names_list):
+        self.original_images_list, self.file_names_list = series_list, file_names_list
+        self.series_count = len(self.original_images_list)
+        self.series_max_idx_list = [len(series) - 1 for series in self.original_images_list]
         self.global_max_idx = min(self.series_max_idx_list) if self.series_count > 0 else 0
-        # 諧調揃え状態
-        self.match_contrast_enabled = False
\ No newline at end of file
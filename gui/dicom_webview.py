@@ -8,6 +8,7 @@ from PIL import Image
 import webview
 import pandas as pd
 import datetime # datetimeモジュールを追加
+from concurrent.futures import ThreadPoolExecutor
 
 
 HTML_TEMPLATE = r'''
@@ -1070,8 +1071,14 @@ class DicomWebApi:
     
     def load_single_folder(self, folder):
         dicom_files = glob.glob(os.path.join(folder, '*.dcm'))
+        # ヘッダのみ（ピクセル無し）を並列に読んでソートし、デコードは1ファイル1回にする
+        def read_sort_key(path):
+            ds = pydicom.dcmread(path, force=True, stop_before_pixels=True)
+            return float(ds.ImagePositionPatient[2])
         try:
-            dicom_files.sort(key=lambda x: pydicom.dcmread(x, force=True).ImagePositionPatient[2])
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                keys = list(executor.map(read_sort_key, dicom_files))
+            dicom_files = [f for _, f in sorted(zip(keys, dicom_files), key=lambda kf: kf[0])]
         except Exception as e:
             print(f"DICOMソートエラー: {e}")
             dicom_files.sort()
@@ -1083,7 +1090,8 @@ class DicomWebApi:
             try:
                 ds = pydicom.dcmread(f, force=True)
                 arr = ds.pixel_array
-                original_arr = arr.astype(np.float32) + ds.RescaleIntercept
+                # RescaleSlopeも適用する（スロープが1でない装置でもCT値が正しくなるように）
+                original_arr = arr.astype(np.float32) * float(getattr(ds, 'RescaleSlope', 1.0)) + ds.RescaleIntercept
                 original_images.append(original_arr)
                 arr = self.normalize(arr)
                 images.append(arr)
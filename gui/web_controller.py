@@ -1,37 +1,37 @@
+import html
 import os
+from core.render_engine import WINDOW_PRESETS
+from core.frame_encoder import make_encoder
+
+# シリーズ読み込み中（ヘッダ走査と表示スライスのデコード中）に先に表示する画面
+LOADING_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head>
+<body style="font-family: sans-serif; display: flex; align-items: center; justify-content: center; height: 100vh; margin: 0; color: #444;">
+<div id="loading-message">DICOMフォルダを読み込み中...</div>
+</body></html>"""
+
 
 class WebController:
     def get_init_html(self, html_template):
         # b64list = [self.get_png_b64(images[0]) for images in self.images_list]
-        b64list = [self.get_png_b64(original_images[0]) for original_images in self.original_images_list]
+        b64list = [self.get_frame_url(i, 0) for i in range(len(self.original_images_list))]
         # 画像サイズ取得（最初の画像のshapeを使う）
-        img_shapes = [images[0].shape if len(images) > 0 else (512, 512) for images in self.images_list]
+        img_shapes = [series.shape for series in self.original_images_list]
         # フォルダ名を取得（現在表示中のフォルダ1の名前）
-        folder_names = []
-        for i in range(len(self.dicom_folders)):
-            if i < len(self.all_subfolders) and self.all_subfolders[i]:
-                # 現在のフォルダ1を特定
-                current_first_file = self.file_names_list[i][0] if self.file_names_list[i] else ""
-                for folder in self.all_subfolders[i]:
-                    test_images, _, test_files = self.load_single_folder(folder)
-                    if test_files and test_files[0] == current_first_file:
-                        folder_names.append(os.path.basename(folder))
-                        break
-                else:
-                    folder_names.append(os.path.basename(self.dicom_folders[i]))
-            else:
-                folder_names.append(os.path.basename(self.dicom_folders[i]))
+        folder_names = [os.path.basename(folder) for folder in self.active_subfolders]
         
         series_blocks = '\n        '.join([
             f'<div class="series-block" style="position:relative;">'
             + (f'<div style="margin-bottom: 8px; font-weight: bold; cursor: pointer; padding: 4px; border-radius: 4px; background: #f0f0f0;" onclick="showFolderSelector({i})">{folder_names[i]} ▼</div>'
                f'<div id="folder-selector-{i}" style="display: none; position: absolute; top: 30px; left: 0; background: white; border: 1px solid #ccc; border-radius: 4px; padding: 8px; z-index: 1000; max-height: 200px; overflow-y: auto;"></div>' if self.folder_types[i] == 'folder2' else f'<div style="margin-bottom: 8px; font-weight: bold;">{folder_names[i]}</div>')
             + f'<div class="dicom-square">'
-            + f'<img class="dicom-img" id="dicom-img-{i}" src="data:image/png;base64,{b64}" />'
+            + f'<img class="dicom-img" id="dicom-img-{i}" src="{b64}" />'
             + f'<canvas class="roi-canvas" id="roi-canvas-{i}"></canvas>'
             + f'</div>'
             + f'<div class="info-panel" id="info-panel-{i}"></div>'
             + f'<input type="range" class="slider" id="slider-{i}" min="0" max="{self.series_max_idx_list[i]}" value="0" />'
+            + f'<div class="load-progress" id="load-progress-{i}" style="display: none;"></div>'
+            + f'<div class="load-progress-label" id="load-progress-label-{i}" style="display: none;"></div>'
             + f'<div style="display: flex; gap: 5px; margin-top: 5px; align-items: center;">'
             + f'<div style="font-size: 12px; color: #222; background: #f4f4f4; border-radius: 4px; padding: 4px 8px; display: flex; align-items: center;">'
             + f'<span id="filename-{i}" style="display: inline-block; vertical-align: middle;">{self.file_names_list[i][0] if len(self.file_names_list[i]) > 0 else ""}</span>'
@@ -55,11 +55,80 @@ class WebController:
             series_count=self.series_count,
             series_max_idx_list=self.series_max_idx_list,
             col_num=col_num,
-            series_folder_base_names=series_folder_base_names
+            series_folder_base_names=series_folder_base_names,
+            # 元の解像度の画像サイズ [幅, 高さ]（縮小プレビュー表示中もROI座標はこのサイズで扱う）
+            series_image_sizes=[[int(series.shape[1]), int(series.shape[0])] for series in self.original_images_list],
+            # フレームサーバのURLとトークン（空ならjs_api経由のdata URLを使う）
+            frame_server_base=self._frame_server.base_url if self._frame_server else '',
+            frame_server_token=self._frame_server.token if self._frame_server else ''
         )
         
         return html_content
+
+    # ウィンドウ表示後（webview.startのスレッド）にシリーズを読み込み、読み込み中画面を本画面に差し替える
+    def show_series_window(self, window, html_template):
+        try:
+            self.load_series()
+        except Exception as e:
+            print(f"シリーズ読み込み失敗: {e}")
+            window.load_html(LOADING_HTML.replace('DICOMフォルダを読み込み中...', f'読み込みに失敗しました: {html.escape(str(e))}'))
+            return
+        window.load_html(self.get_init_html(html_template))
+        # 残りのスライスをバックグラウンドで読み込み、進捗をevaluate_jsでUIへ送る
+        self.start_background_loading(window)
     # JSから呼び出すAPI: 諧調揃え状態のON/OFF切替
     def set_match_contrast_enabled(self, enabled):
+        if self.match_contrast_enabled != bool(enabled):
+            # 諧調揃えの切替で基準ウィンドウが変わるため、諧調揃えで描画したフレームを破棄する
+            self._frame_cache.invalidate(mode='match')
         self.match_contrast_enabled = bool(enabled)
         return {'success': True, 'enabled': self.match_contrast_enabled}
+
+    # JSから呼び出すAPI: フレームのエンコーダ設定（quality: 'interactive' / 'final' / 'download'）
+    def get_frame_encoders(self):
+        encoders = dict(self._frame_encoders, download=self._download_encoder)
+        return {quality: encoder.spec for quality, encoder in encoders.items()}
+
+    # JSから呼び出すAPI: エンコーダを変更（spec: 'png:1', 'webp', 'jpeg:90', 'raw' など）
+    def set_frame_encoder(self, quality, spec):
+        if quality not in ('interactive', 'final', 'download'):
+            return {'success': False, 'error': f"不明な用途です: {quality}"}
+        try:
+            encoder = make_encoder(spec)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        if quality == 'download':
+            self._download_encoder = encoder
+        else:
+            self._frame_encoders[quality] = encoder
+        return {'success': True, 'encoders': self.get_frame_encoders()}
+
+    # JSから呼び出すAPI: ウィンドウプリセット一覧
+    def get_window_presets(self):
+        return [{'name': name, 'label': label, 'center': center, 'width': width}
+                for name, (label, center, width) in WINDOW_PRESETS.items()]
+
+    # JSから呼び出すAPI: プリセットでウィンドウを指定（肺野・縦隔・骨・脳）
+    def set_window_preset(self, name):
+        if name not in WINDOW_PRESETS:
+            return {'success': False, 'error': f"不明なプリセットです: {name}"}
+        _, center, width = WINDOW_PRESETS[name]
+        self.window_setting = {'name': name, 'center': center, 'width': width}
+        return {'success': True, 'window': self.window_setting}
+
+    # JSから呼び出すAPI: ウィンドウレベル/幅を直接指定
+    def set_window(self, center, width):
+        try:
+            center = float(center)
+            width = float(width)
+        except (TypeError, ValueError):
+            return {'success': False, 'error': 'ウィンドウレベル/幅が数値ではありません'}
+        if width < 1:
+            return {'success': False, 'error': 'ウィンドウ幅は1以上を指定してください'}
+        self.window_setting = {'name': 'manual', 'center': center, 'width': width}
+        return {'success': True, 'window': self.window_setting}
+
+    # JSから呼び出すAPI: ウィンドウ指定を解除（スライスごとのmin/max、または諧調揃え）
+    def reset_window(self):
+        self.window_setting = None
+        return {'success': True, 'window': None, 'match_contrast_enabled': self.match_contrast_enabled}
@@ -4,6 +4,11 @@ let currentSlices = Array(seriesCount).fill(0);
 const imgs = [], sliders = [], labels = [], canvases = [], infoPanels = [], filenames = [];
 // フォルダ1のベース名リスト
 const seriesFolderBaseNames = {series_folder_base_names};
+// 元の解像度の画像サイズ [幅, 高さ]（ドラッグ中の縮小プレビューでもROI座標はこのサイズで扱う）
+const seriesImageSizes = {series_image_sizes};
+// フレームサーバのURLとトークン（空ならjs_api経由のdata URLで受け取る）
+const frameServerBase = '{frame_server_base}';
+const frameServerToken = '{frame_server_token}';
 
 // CSS変数を設定
 const colNum = Math.min(seriesCount, 4) > 1 ? Math.min(seriesCount, 4) : 1;
@@ -26,6 +31,18 @@ let roiCoords = Array(seriesCount).fill(null);
 // ROIサイズ管理（getCurrentStats関数で使用するため先に定義）
 let roiW = 10, roiH = 10;
 
+// ROI形状管理（円は外接矩形の短辺が直径、多角形の頂点はROIの左上を原点とする画素座標）
+const ROI_SHAPE_LABELS = {rect: '矩形', circle: '円', ellipse: '楕円', polygon: '多角形'};
+let roiShape = 'rect';
+let roiPolygon = null;
+// 作成中の多角形（{series: シリーズ, points: [[x, y], ...]}、画像の画素座標）
+let polygonDraft = null;
+
+// Python側APIに渡す形状の引数（shape, points）
+function roiShapeArgs() {
+    return [roiShape, roiShape === 'polygon' ? roiPolygon : null];
+}
+
 for (let i = 0; i < seriesCount; i++) {
     imgs.push(document.getElementById('dicom-img-' + i));
     sliders.push(document.getElementById('slider-' + i));
@@ -211,7 +228,7 @@ function getCurrentStats() {
                 coord = '(' + roiCoords[i].x + ',' + roiCoords[i].y + ')';
             }
             // ROIサイズ
-            let roiSize = roiW + 'x' + roiH;
+            let roiSize = roiW + 'x' + roiH + (roiShape !== 'rect' ? '(' + ROI_SHAPE_LABELS[roiShape] + ')' : '');
             info = folderName + '/' + fileName + '/ROIの基準座標:' + coord + '/ROIsize:' + roiSize;
         }
         row.push({mean: mean, std: std, info: info});
@@ -312,12 +329,26 @@ document.getElementById('indep-mode-btn').addEventListener('click', function() {
 });
 
 // ROIリセットボタン
-document.getElementById('reset-roi-btn').addEventListener('click', function() {
+function resetROIs() {
     roiCoords = Array(seriesCount).fill(null);
+    polygonDraft = null;
     redrawAllROIs();
     for (let i = 0; i < seriesCount; i++) {
         infoPanels[i].innerHTML = '';
     }
+}
+document.getElementById('reset-roi-btn').addEventListener('click', resetROIs);
+
+// ROI形状の切り替え（多角形は頂点を指定するまでROIを消す）
+document.getElementById('roi-shape').addEventListener('change', function() {
+    roiShape = this.value;
+    polygonDraft = null;
+    if (roiShape === 'polygon' && !roiPolygon) {
+        resetROIs();
+        return;
+    }
+    redrawAllROIs();
+    updateAllStats();
 });
 
 // 諧調揃えボタン状態
@@ -372,6 +403,42 @@ function updateMatchContrastButtons() {
     }
 }
 
+// ウィンドウ（プリセット・WL/WW指定）
+const windowPresetSelect = document.getElementById('window-preset');
+const windowCenterInput = document.getElementById('window-center');
+const windowWidthInput = document.getElementById('window-width');
+
+function applyWindowResult(result) {
+    if (!result.success) {
+        alert(result.error);
+        return;
+    }
+    if (result.window) {
+        windowCenterInput.value = result.window.center;
+        windowWidthInput.value = result.window.width;
+    }
+    redrawAllImages();
+}
+
+windowPresetSelect.addEventListener('change', async function() {
+    const name = windowPresetSelect.value;
+    if (name === 'auto') {
+        applyWindowResult(await window.pywebview.api.reset_window());
+    } else if (name === 'manual') {
+        applyWindowResult(await window.pywebview.api.set_window(windowCenterInput.value, windowWidthInput.value));
+    } else {
+        applyWindowResult(await window.pywebview.api.set_window_preset(name));
+    }
+});
+
+// WL/WWを入力したら手動指定に切り替える
+[windowCenterInput, windowWidthInput].forEach(function(input) {
+    input.addEventListener('change', async function() {
+        windowPresetSelect.value = 'manual';
+        applyWindowResult(await window.pywebview.api.set_window(windowCenterInput.value, windowWidthInput.value));
+    });
+});
+
     // 表示画像ダウンロード機能
     const downloadDisplayBtn = document.getElementById('download-display-btn');
     downloadDisplayBtn.addEventListener('click', async function() {
@@ -430,7 +497,9 @@ function updateMatchContrastButtons() {
                             y: roiCoords[i].y,
                             color: roiColor,
                             width: roiW,
-                            height: roiH
+                            height: roiH,
+                            shape: roiShape,
+                            points: roiPolygon
                         });
                     } else {
                         roiCoordsList.push(null);
@@ -483,6 +552,37 @@ roiColorPicker.addEventListener('change', function() {
     redrawAllROIs();
 });
 
+// 段階的読み込みの進捗表示（Python側からevaluate_jsで呼ばれる）
+function updateLoadProgress(seriesIdx, progress) {
+    const bar = document.getElementById('load-progress-' + seriesIdx);
+    const label = document.getElementById('load-progress-label-' + seriesIdx);
+    if (!bar || !label) return;
+    if (progress.loaded >= progress.total) {
+        bar.style.display = 'none';
+        label.style.display = 'none';
+        return;
+    }
+    // 読み込み済み範囲を青、未読み込みを灰色のグラデーションで表示
+    const stops = [];
+    progress.ranges.forEach(function(range) {
+        const start = (range[0] / progress.total * 100).toFixed(2);
+        const end = ((range[1] + 1) / progress.total * 100).toFixed(2);
+        stops.push('#e0e0e0 ' + start + '%', '#1976d2 ' + start + '%', '#1976d2 ' + end + '%', '#e0e0e0 ' + end + '%');
+    });
+    bar.style.background = stops.length ? 'linear-gradient(to right, ' + stops.join(', ') + ')' : '#e0e0e0';
+    bar.style.display = 'block';
+    label.style.display = 'block';
+    label.textContent = '読み込み中: ' + progress.loaded + '/' + progress.total;
+}
+
+// 読み込み中画面から差し替えた直後に送られた進捗は取りこぼすことがあるので、APIの準備ができたら取り直す
+window.addEventListener('pywebviewready', async function() {
+    const progressList = await window.pywebview.api.get_load_progress();
+    progressList.forEach(function(progress, seriesIdx) {
+        updateLoadProgress(seriesIdx, progress);
+    });
+});
+
 // フォルダ選択機能
 async function showFolderSelector(seriesIdx) {
     const folderType = await window.pywebview.api.get_folder_type(seriesIdx);
@@ -516,8 +616,9 @@ async function showFolderSelector(seriesIdx) {
 async function selectFolder(seriesIdx, folderIdx) {
     const result = await window.pywebview.api.switch_folder(seriesIdx, folderIdx);
     if (result.success) {
-        const b64 = await window.pywebview.api.get_single_slice(seriesIdx, 0);
-        imgs[seriesIdx].src = 'data:image/png;base64,' + b64;
+        ++folderEpochs[seriesIdx];
+        seriesImageSizes[seriesIdx] = result.image_size;
+        await requestFrame(seriesIdx, 0, 'final');
         sliders[seriesIdx].value = 0;
         sliders[seriesIdx].max = result.max_idx;
         currentSlices[seriesIdx] = 0;
@@ -569,28 +670,76 @@ function redrawAllROIs() {
 
 function drawROI(idx) {
     const canvas = canvases[idx];
-    const img = imgs[idx];
     const ctx = canvas.getContext('2d');
     ctx.clearRect(0, 0, canvas.width, canvas.height);
-    if (!roiCoords[idx]) return;
-
-    const scaleX = canvas.width / img.naturalWidth;
-    const scaleY = canvas.height / img.naturalHeight;
-    const x = roiCoords[idx].x * scaleX;
-    const y = roiCoords[idx].y * scaleY;
-    const w = roiW * scaleX;
-    const h = roiH * scaleY;
+
+    const scaleX = canvas.width / seriesImageSizes[idx][0];
+    const scaleY = canvas.height / seriesImageSizes[idx][1];
     ctx.strokeStyle = roiColor;
+    ctx.fillStyle = roiColor;
     ctx.lineWidth = 2;
     ctx.setLineDash([4,2]);
-    ctx.globalAlpha = 0.7;
-    ctx.strokeRect(x, y, w, h);
-    ctx.globalAlpha = 0.2;
-    ctx.fillStyle = roiColor;
-    ctx.fillRect(x, y, w, h);
+    if (roiCoords[idx]) {
+        const x = roiCoords[idx].x * scaleX;
+        const y = roiCoords[idx].y * scaleY;
+        const w = roiW * scaleX;
+        const h = roiH * scaleY;
+        ctx.beginPath();
+        if (roiShape === 'circle') {
+            const d = Math.min(roiW, roiH);
+            ctx.ellipse(x + w / 2, y + h / 2, d * scaleX / 2, d * scaleY / 2, 0, 0, 2 * Math.PI);
+        } else if (roiShape === 'ellipse') {
+            ctx.ellipse(x + w / 2, y + h / 2, w / 2, h / 2, 0, 0, 2 * Math.PI);
+        } else if (roiShape === 'polygon' && roiPolygon) {
+            roiPolygon.forEach(p => ctx.lineTo(x + p[0] * scaleX, y + p[1] * scaleY));
+            ctx.closePath();
+        } else {
+            ctx.rect(x, y, w, h);
+        }
+        ctx.globalAlpha = 0.7;
+        ctx.stroke();
+        ctx.globalAlpha = 0.2;
+        ctx.fill();
+    }
+    // 作成中の多角形は折れ線と頂点を描く
+    if (polygonDraft && polygonDraft.series === idx) {
+        ctx.globalAlpha = 0.9;
+        ctx.beginPath();
+        polygonDraft.points.forEach(p => ctx.lineTo(p[0] * scaleX, p[1] * scaleY));
+        ctx.stroke();
+        polygonDraft.points.forEach(p => ctx.fillRect(p[0] * scaleX - 2, p[1] * scaleY - 2, 4, 4));
+    }
     ctx.globalAlpha = 1.0;
 }
 
+// 多角形ROIの頂点を追加する（最初の頂点の近くをクリックすると閉じてROIにする）
+function addPolygonPoint(i, x, y) {
+    if (!polygonDraft || polygonDraft.series !== i) polygonDraft = {series: i, points: []};
+    const points = polygonDraft.points;
+    if (points.length >= 3 && Math.abs(x - points[0][0]) <= 3 && Math.abs(y - points[0][1]) <= 3) {
+        const xs = points.map(p => p[0]), ys = points.map(p => p[1]);
+        const x0 = Math.min(...xs), y0 = Math.min(...ys);
+        roiPolygon = points.map(p => [p[0] - x0, p[1] - y0]);
+        roiW = Math.max(1, Math.max(...xs) - x0);
+        roiH = Math.max(1, Math.max(...ys) - y0);
+        document.getElementById('roi-width').value = roiW;
+        document.getElementById('roi-height').value = roiH;
+        polygonDraft = null;
+        if (syncMode) {
+            for (let j = 0; j < seriesCount; j++) roiCoords[j] = {x: x0, y: y0};
+            redrawAllROIs();
+            updateAllStats();
+        } else {
+            roiCoords[i] = {x: x0, y: y0};
+            drawROI(i);
+            updateStats(i);
+        }
+        return;
+    }
+    points.push([x, y]);
+    drawROI(i);
+}
+
 // canvasイベント
 for (let i = 0; i < seriesCount; i++) {
     const canvas = canvases[i];
@@ -607,12 +756,18 @@ for (let i = 0; i < seriesCount; i++) {
     canvas.style.pointerEvents = 'auto';
     canvas.addEventListener('mousedown', function(e) {
         const rect = canvas.getBoundingClientRect();
-        const scaleX = img.naturalWidth / rect.width;
-        const scaleY = img.naturalHeight / rect.height;
+        const [imageWidth, imageHeight] = seriesImageSizes[i];
+        const scaleX = imageWidth / rect.width;
+        const scaleY = imageHeight / rect.height;
         let x = Math.round((e.clientX - rect.left) * scaleX);
         let y = Math.round((e.clientY - rect.top) * scaleY);
 
-        if (x < 0 || y < 0 || x + roiW > img.naturalWidth || y + roiH > img.naturalHeight) {
+        if (roiShape === 'polygon') {
+            if (x < 0 || y < 0 || x > imageWidth || y > imageHeight) return;
+            addPolygonPoint(i, x, y);
+            return;
+        }
+        if (x < 0 || y < 0 || x + roiW > imageWidth || y + roiH > imageHeight) {
             showErrorPopup(canvas, e.clientX - rect.left, e.clientY - rect.top, 'ROIが画像範囲外です');
             return;
         }
@@ -648,80 +803,236 @@ for (let i = 0; i < seriesCount; i++) {
     }
 }
 
-// ROI統計更新
+// ROI統計更新（1シリーズでも全シリーズと同じくget_roi_stats_batchで取得する）
 async function updateStats(idx) {
-    if (!roiCoords[idx]) return;
-    const x = roiCoords[idx].x, y = roiCoords[idx].y;
-    const stats = await window.pywebview.api.get_roi_stats(idx, currentSlices[idx], x, y, roiW, roiH);
-    const img = imgs[idx];
-    infoPanels[idx].innerHTML = '画像サイズ: ' + img.naturalWidth + 'x' + img.naturalHeight + '<br>ROI: [' +
+    await updateSeriesStats([idx]);
+}
+
+// 指定したシリーズのROI統計を1回の呼び出しでまとめて取得する（結果は列ごとの配列）
+async function updateSeriesStats(indices) {
+    const items = indices.filter(i => roiCoords[i])
+        .map(i => [i, currentSlices[i], roiCoords[i].x, roiCoords[i].y, roiW, roiH]);
+    if (items.length === 0) return;
+    const stats = await window.pywebview.api.get_roi_stats_batch(items, ...roiShapeArgs());
+    for (let k = 0; k < stats.series.length; k++) {
+        renderStatsPanel(stats.series[k], stats.x[k], stats.y[k], stats.mean[k], stats.std[k]);
+    }
+    if (zprofiles.length) drawZProfile();
+}
+
+function renderStatsPanel(idx, x, y, mean, std) {
+    infoPanels[idx].innerHTML = '画像サイズ: ' + seriesImageSizes[idx][0] + 'x' + seriesImageSizes[idx][1] + '<br>ROI: [' +
         '<input type="number" id="roi-x-' + idx + '" value="' + x + '" style="width: 50px; text-align: center;" onchange="updateROIFromInput(' + idx + ')">,' +
         '<input type="number" id="roi-y-' + idx + '" value="' + y + '" style="width: 50px; text-align: center;" onchange="updateROIFromInput(' + idx + ')">] ' + roiW + 'x' + roiH +
-        '<br>平均: ' + stats.mean + '<br>標準偏差: ' + stats.std;
+        (roiShape !== 'rect' ? ' ' + ROI_SHAPE_LABELS[roiShape] : '') +
+        '<br>平均: ' + mean + '<br>標準偏差: ' + std;
 }
 
-// メタデータ表示
+// メタデータ表示（Python側で構造化・検索した行をページ単位で受け取る）
+const METADATA_PAGE_SIZE = 200;
+
 async function showMetadata(idx) {
     try {
-        const metadata = await window.pywebview.api.get_metadata(idx, currentSlices[idx]);
+        const sliceIdx = currentSlices[idx];
         const popup = document.createElement('div');
-        popup.style.cssText = 'position: fixed; top: 50%; left: 50%; transform: translate(-50%, -50%); background: white; border: 2px solid #ccc; border-radius: 8px; padding: 20px; max-width: 90vw; max-height: 90vh; overflow: hidden; z-index: 1000; box-shadow: 0 4px 20px rgba(0,0,0,0.3); display: flex; flex-direction: column;';
+        popup.style.cssText = 'position: fixed; top: 50%; left: 50%; transform: translate(-50%, -50%); background: white; border: 2px solid #ccc; border-radius: 8px; padding: 20px; width: 70vw; max-width: 90vw; max-height: 90vh; overflow: hidden; z-index: 1000; box-shadow: 0 4px 20px rgba(0,0,0,0.3); display: flex; flex-direction: column;';
 
         const headerHtml = `
             <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; flex-shrink: 0;">
                 <h3 style="margin: 0;">DICOMメタデータ</h3>
                 <div style="display: flex; gap: 8px;">
+                    <button id="metadata-varying" title="スライス間で値が異なるタグ" style="background: #1976d2; color: white; border: none; border-radius: 4px; padding: 4px 8px; cursor: pointer;"><i class="fa-solid fa-layer-group"></i> スライス間の差分</button>
                     <button onclick="this.parentElement.parentElement.parentElement.remove()" style="background: #f44336; color: white; border: none; border-radius: 4px; padding: 4px 8px; cursor: pointer;"><i class="fa-solid fa-xmark"></i></button>
                 </div>
             </div>
             <div style="margin-bottom: 10px; flex-shrink: 0;">
-                <input type="text" id="metadata-search" placeholder="メタデータを検索..." style="width: 100%; padding: 6px; border: 1px solid #ccc; border-radius: 4px; font-size: 12px;">
+                <input type="text" id="metadata-search" placeholder="メタデータを検索（タグ番号・キーワード・値）..." style="width: 100%; padding: 6px; border: 1px solid #ccc; border-radius: 4px; font-size: 12px;">
             </div>
         `;
 
         const contentHtml = `
             <div id="metadata-content" style="flex: 1; overflow: auto; border: 1px solid #eee; border-radius: 4px; padding: 10px; background: #f9f9f9;">
-                <pre id="metadata-text" style="font-family: monospace; font-size: 12px; margin: 0; white-space: pre-wrap;">` + metadata + `</pre>
+                <div id="metadata-rows" style="font-family: monospace; font-size: 12px;"></div>
             </div>
+            <div id="metadata-variation" style="display: none; flex-shrink: 0; margin-top: 10px; max-height: 25vh; overflow: auto; border: 1px solid #eee; border-radius: 4px; padding: 8px; background: #f4f8ff; font-size: 12px;"></div>
         `;
 
         popup.innerHTML = headerHtml + contentHtml;
         document.body.appendChild(popup);
 
-        // 検索機能
+        const rowsBox = document.getElementById('metadata-rows');
         const searchInput = document.getElementById('metadata-search');
-        const metadataText = document.getElementById('metadata-text');
-        const originalText = metadataText.innerText;
+        let requestId = 0;
+
+        // 検索はPython側のインデックスで行い、最後の入力の結果だけを表示する
+        async function loadRows(query) {
+            const myRequest = ++requestId;
+            const box = document.createElement('div');
+            await loadMetadataRows(box, idx, sliceIdx, '', query, 0);
+            if (myRequest !== requestId) return;
+            rowsBox.replaceChildren(box);
+        }
 
+        let searchTimer = null;
         searchInput.addEventListener('input', function() {
-            const searchTerm = this.value.toLowerCase();
-            if (searchTerm === '') {
-                metadataText.innerText = originalText;
-                return;
-            }
-            // 改行コードを正規化してsplit
-            const lines = originalText.replace(/\r\n|\r/g, '\n').split('\n');
-            const filteredLines = lines.filter(line =>
-                line.toLowerCase().includes(searchTerm)
-            );
-            metadataText.innerText = filteredLines.join('\n');
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadRows(searchInput.value.trim()), 200);
         });
+        document.getElementById('metadata-varying').addEventListener('click', () => showVaryingTags(idx));
 
+        await loadRows('');
     } catch (error) {
         alert('メタデータの取得に失敗しました: ' + error);
     }
 }
 
+// 1ページ分の行をcontainerに追加する（続きがあれば「さらに表示」ボタンを付ける）
+async function loadMetadataRows(container, seriesIdx, sliceIdx, path, query, offset) {
+    const page = await window.pywebview.api.get_metadata_rows(seriesIdx, sliceIdx, path, query, offset, METADATA_PAGE_SIZE);
+    if (!page.success) {
+        const error = document.createElement('div');
+        error.textContent = page.error;
+        container.appendChild(error);
+        return;
+    }
+    if (page.total === 0) {
+        const empty = document.createElement('div');
+        empty.textContent = query ? '該当する項目がありません' : '項目がありません';
+        empty.style.color = '#888';
+        container.appendChild(empty);
+        return;
+    }
+    // 検索結果は全階層を含むので展開はしない
+    page.rows.forEach(row => container.appendChild(createMetadataRow(seriesIdx, sliceIdx, row, query === '')));
+    const next = offset + page.rows.length;
+    if (next < page.total) {
+        const more = document.createElement('button');
+        more.textContent = 'さらに表示 (' + next + '/' + page.total + ')';
+        more.style.cssText = 'margin: 6px 0; background: #e3f2fd; border: 1px solid #90caf9; border-radius: 4px; padding: 2px 8px; cursor: pointer; font-size: 12px;';
+        more.addEventListener('click', function() {
+            more.remove();
+            loadMetadataRows(container, seriesIdx, sliceIdx, path, query, next);
+        });
+        container.appendChild(more);
+    }
+}
+
+function createMetadataRow(seriesIdx, sliceIdx, row, expandable) {
+    const wrapper = document.createElement('div');
+    const line = document.createElement('div');
+    line.style.cssText = 'white-space: pre-wrap; padding: 1px 0 1px ' + (row.depth * 16) + 'px;';
+    const toggle = document.createElement('span');
+    toggle.style.cssText = 'display: inline-block; width: 14px; cursor: pointer; color: #1976d2;';
+    toggle.textContent = expandable && row.children ? '▶' : '';
+    line.appendChild(toggle);
+    const text = document.createElement('span');
+    text.textContent = row.tag ? row.tag + ' ' + row.name + '  ' + row.vr + ': ' + row.value : row.name;
+    line.appendChild(text);
+    // 最上位の要素はスライス間で値を比較できる
+    if (row.tag && !row.children && row.depth === 0) {
+        const compare = document.createElement('button');
+        compare.title = 'スライス間で比較';
+        compare.innerHTML = '<i class="fa-solid fa-layer-group"></i>';
+        compare.style.cssText = 'background: none; border: none; color: #1976d2; cursor: pointer; padding: 0 4px;';
+        compare.addEventListener('click', () => showMetadataVariation(seriesIdx, row.tag));
+        line.appendChild(compare);
+    }
+    wrapper.appendChild(line);
+
+    // シーケンス・アイテムは開いたときに初めて中身を取得する
+    if (expandable && row.children) {
+        const children = document.createElement('div');
+        children.style.display = 'none';
+        let loaded = false;
+        toggle.addEventListener('click', async function() {
+            if (!loaded) {
+                loaded = true;
+                await loadMetadataRows(children, seriesIdx, sliceIdx, row.path, '', 0);
+            }
+            const open = children.style.display === 'none';
+            children.style.display = open ? 'block' : 'none';
+            toggle.textContent = open ? '▼' : '▶';
+        });
+        wrapper.appendChild(children);
+    }
+    return wrapper;
+}
+
+// スライス番号の配列を "1-20, 25" のような範囲表記にする（1始まり）
+function formatSliceRanges(slices) {
+    const parts = [];
+    let start = null;
+    let prev = null;
+    slices.forEach(function(s) {
+        if (start !== null && s === prev + 1) {
+            prev = s;
+            return;
+        }
+        if (start !== null) parts.push(start === prev ? String(start + 1) : (start + 1) + '-' + (prev + 1));
+        start = s;
+        prev = s;
+    });
+    if (start !== null) parts.push(start === prev ? String(start + 1) : (start + 1) + '-' + (prev + 1));
+    return parts.join(', ');
+}
+
+// 指定タグの値ごとに該当スライスを表示（例: KVPが異なるスライス）
+async function showMetadataVariation(seriesIdx, tag) {
+    const box = document.getElementById('metadata-variation');
+    if (!box) return;
+    box.style.display = 'block';
+    box.textContent = '比較中...';
+    const result = await window.pywebview.api.get_metadata_variation(seriesIdx, tag);
+    box.replaceChildren();
+    if (!result.success) {
+        box.textContent = result.error;
+        return;
+    }
+    const title = document.createElement('div');
+    title.style.fontWeight = 'bold';
+    title.textContent = result.tag + ' ' + result.keyword + ': ' + (result.differs ? result.groups.length + '種類の値' : '全スライスで同じ値');
+    box.appendChild(title);
+    result.groups.forEach(function(group) {
+        const line = document.createElement('div');
+        line.textContent = (group.value === null ? '（なし）' : group.value) + ' → スライス ' + formatSliceRanges(group.slices);
+        box.appendChild(line);
+    });
+}
+
+// スライス間で値が異なるタグの一覧（クリックで値ごとのスライスを表示）
+async function showVaryingTags(seriesIdx) {
+    const box = document.getElementById('metadata-variation');
+    if (!box) return;
+    box.style.display = 'block';
+    box.textContent = '比較中...';
+    const result = await window.pywebview.api.get_varying_tags(seriesIdx);
+    box.replaceChildren();
+    if (!result.success) {
+        box.textContent = result.error;
+        return;
+    }
+    if (result.tags.length === 0) {
+        box.textContent = '全スライスで値の異なるタグはありません';
+        return;
+    }
+    result.tags.forEach(function(item) {
+        const line = document.createElement('div');
+        line.style.cssText = 'cursor: pointer; color: #1976d2;';
+        line.textContent = item.tag + ' ' + item.keyword + ' (' + item.count + '種類)';
+        line.addEventListener('click', () => showMetadataVariation(seriesIdx, item.tag));
+        box.appendChild(line);
+    });
+}
+
 // 座標入力からROI更新
 function updateROIFromInput(idx) {
     const xInput = document.getElementById('roi-x-' + idx);
     const yInput = document.getElementById('roi-y-' + idx);
     const x = parseInt(xInput.value);
     const y = parseInt(yInput.value);
-    const img = imgs[idx];
 
     if (isNaN(x) || isNaN(y)) return;
-    if (x < 0 || y < 0 || x + roiW > img.naturalWidth || y + roiH > img.naturalHeight) {
+    if (x < 0 || y < 0 || x + roiW > seriesImageSizes[idx][0] || y + roiH > seriesImageSizes[idx][1]) {
         alert('ROIが画像範囲外です');
         return;
     }
@@ -737,61 +1048,324 @@ function updateROIFromInput(idx) {
     }
 }
 
-function updateAllStats() {
-    for (let i = 0; i < seriesCount; i++) updateStats(i);
+// ROI Zプロファイル（ROIの全スライスの平均・標準偏差をPython側で一度に計算してグラフにする）
+const ZPROFILE_COLORS = ['#1976d2', '#e53935', '#43a047', '#fb8c00', '#8e24aa', '#00897b', '#6d4c41', '#546e7a'];
+let zprofiles = [];
+
+function zprofileItems() {
+    const items = [];
+    for (let i = 0; i < seriesCount; i++) {
+        if (roiCoords[i]) items.push([i, roiCoords[i].x, roiCoords[i].y, roiW, roiH]);
+    }
+    return items;
+}
+
+document.getElementById('zprofile-btn').addEventListener('click', async function() {
+    const items = zprofileItems();
+    if (items.length === 0) {
+        alert('ROIを設定してください');
+        return;
+    }
+    const profiles = await Promise.all(items.map(item => window.pywebview.api.get_roi_zprofile(...item, ...roiShapeArgs())));
+    const failed = profiles.find(profile => !profile.success);
+    if (failed) {
+        alert(failed.error);
+        return;
+    }
+    zprofiles = profiles;
+    drawZProfile();
+});
+
+document.getElementById('zprofile-export-btn').addEventListener('click', async function() {
+    const items = zprofileItems();
+    if (items.length === 0) {
+        alert('ROIを設定してください');
+        return;
+    }
+    const result = await window.pywebview.api.export_roi_zprofile_to_excel(items.map(item => item.concat(roiShapeArgs())));
+    if (result.success) {
+        alert('ZプロファイルがExcelファイルとして保存されました:\n' + result.filePath);
+    } else {
+        alert('Excelファイルの保存に失敗しました:\n' + result.message);
+    }
+});
+
+// 直方体ROI（矩形 × スライス範囲）の統計。範囲は1始まりのスライス番号で、空欄なら先頭・末尾
+document.getElementById('cuboid-btn').addEventListener('click', async function() {
+    const items = zprofileItems();
+    if (items.length === 0) {
+        alert('ROIを設定してください');
+        return;
+    }
+    const startValue = document.getElementById('cuboid-start').value;
+    const endValue = document.getElementById('cuboid-end').value;
+    const start = startValue === '' ? 0 : parseInt(startValue) - 1;
+    const end = endValue === '' ? Number.MAX_SAFE_INTEGER : parseInt(endValue) - 1;
+    const results = await Promise.all(items.map(item => window.pywebview.api.get_cuboid_roi_stats(...item, start, end, ...roiShapeArgs())));
+    const failed = results.find(result => !result.success);
+    if (failed) {
+        alert(failed.error);
+        return;
+    }
+    const levels = Object.keys(results[0].percentiles);
+    let html = '<tr><th>Folder</th><th>スライス</th><th>画素数</th><th>平均</th><th>SD</th><th>最小</th><th>最大</th>';
+    levels.forEach(function(q) { html += '<th>P' + q + '</th>'; });
+    html += '</tr>';
+    results.forEach(function(result) {
+        html += '<tr><td>' + result.folder + '</td><td>' + (result.slices[0] + 1) + '-' + (result.slices[1] + 1) +
+            '</td><td>' + result.count + '</td>';
+        [result.mean, result.std, result.min, result.max].concat(levels.map(q => result.percentiles[q])).forEach(function(value) {
+            html += '<td>' + value.toFixed(2) + '</td>';
+        });
+        html += '</tr>';
+    });
+    document.getElementById('cuboid-table').innerHTML = html;
+});
+
+function drawZProfile() {
+    const canvas = document.getElementById('zprofile-canvas');
+    const ctx = canvas.getContext('2d');
+    canvas.width = canvas.clientWidth;
+    const width = canvas.width, height = canvas.height;
+    const pad = {left: 52, right: 10, top: 8, bottom: 20};
+    ctx.clearRect(0, 0, width, height);
+    const legend = document.getElementById('zprofile-legend');
+    legend.innerHTML = '';
+    if (zprofiles.length === 0) return;
+
+    // 縦軸は平均±標準偏差の範囲、横軸はスライス番号
+    let lo = Infinity, hi = -Infinity, maxSlices = 1;
+    zprofiles.forEach(function(profile) {
+        profile.mean.forEach(function(mean, k) {
+            lo = Math.min(lo, mean - profile.std[k]);
+            hi = Math.max(hi, mean + profile.std[k]);
+        });
+        maxSlices = Math.max(maxSlices, profile.mean.length);
+    });
+    if (hi - lo < 1e-6) { lo -= 1; hi += 1; }
+    const px = k => pad.left + (maxSlices > 1 ? k / (maxSlices - 1) : 0.5) * (width - pad.left - pad.right);
+    const py = v => pad.top + (hi - v) / (hi - lo) * (height - pad.top - pad.bottom);
+
+    ctx.strokeStyle = '#bbb';
+    ctx.lineWidth = 1;
+    ctx.beginPath();
+    ctx.moveTo(pad.left, pad.top);
+    ctx.lineTo(pad.left, height - pad.bottom);
+    ctx.lineTo(width - pad.right, height - pad.bottom);
+    ctx.stroke();
+    ctx.fillStyle = '#666';
+    ctx.font = '10px sans-serif';
+    ctx.textAlign = 'right';
+    ctx.fillText(hi.toFixed(1), pad.left - 4, pad.top + 8);
+    ctx.fillText(lo.toFixed(1), pad.left - 4, height - pad.bottom);
+    ctx.fillText(String(maxSlices), width - pad.right, height - 6);
+    ctx.textAlign = 'left';
+    ctx.fillText('1', pad.left, height - 6);
+
+    zprofiles.forEach(function(profile) {
+        const color = ZPROFILE_COLORS[profile.series % ZPROFILE_COLORS.length];
+        const n = profile.mean.length;
+        // ±標準偏差の帯
+        ctx.globalAlpha = 0.15;
+        ctx.fillStyle = color;
+        ctx.beginPath();
+        for (let k = 0; k < n; k++) ctx.lineTo(px(k), py(profile.mean[k] + profile.std[k]));
+        for (let k = n - 1; k >= 0; k--) ctx.lineTo(px(k), py(profile.mean[k] - profile.std[k]));
+        ctx.closePath();
+        ctx.fill();
+        // 平均
+        ctx.globalAlpha = 1.0;
+        ctx.strokeStyle = color;
+        ctx.lineWidth = 1.5;
+        ctx.beginPath();
+        for (let k = 0; k < n; k++) ctx.lineTo(px(k), py(profile.mean[k]));
+        ctx.stroke();
+        // 表示中のスライス
+        const current = currentSlices[profile.series];
+        if (current < n) {
+            ctx.beginPath();
+            ctx.arc(px(current), py(profile.mean[current]), 3, 0, 2 * Math.PI);
+            ctx.fill();
+        }
+        const rect = profile.rect;
+        legend.innerHTML += '<div><span style="background: ' + color + ';"></span>' + profile.folder +
+            ' (' + rect[0] + ',' + rect[1] + ') ' + rect[2] + 'x' + rect[3] + '</div>';
+    });
+}
+window.addEventListener('resize', drawZProfile);
+
+// 全シリーズのROI統計を1回の呼び出しでまとめて取得する
+async function updateAllStats() {
+    await updateSeriesStats([...Array(seriesCount).keys()]);
+}
+
+// フレーム要求の通し番号（古い要求の応答で新しいフレームを上書きしない）
+const frameRequestIds = Array(seriesCount).fill(0);
+// シリーズごとのフォルダ切替回数（フレームサーバのURLに含め、切替後に同じURLの画像が使い回されないようにする）
+const folderEpochs = Array(seriesCount).fill(0);
+
+// 現在のウィンドウ指定をフレームサーバのwindowパラメータにする
+function currentWindowParam() {
+    const preset = windowPresetSelect.value;
+    if (preset === 'manual') return windowCenterInput.value + ',' + windowWidthInput.value;
+    if (preset !== 'auto') return preset;
+    return matchContrastEnabled ? 'match' : 'auto';
+}
+
+function frameUrl(i, idx, quality) {
+    return frameServerBase + '/frame/' + i + '/' + idx
+        + '?window=' + encodeURIComponent(currentWindowParam())
+        + '&q=' + quality + '&f=' + folderEpochs[i] + '&t=' + frameServerToken;
+}
+
+// 要素ごとの最後の読み込み {url, promise, loaded}（loadedは完了前null、成功true、失敗・打ち切りfalse）
+const imageLoads = new WeakMap();
+
+// 画像の読み込み完了（失敗・打ち切りを含む）を待つ。
+// 同じURLの読み込みが進行中ならそのPromiseを共有し、成功済みならその結果を返す。失敗していれば読み直す
+function loadImage(img, url) {
+    const last = imageLoads.get(img);
+    if (last && last.url === url && img.src === url && last.loaded !== false) return last.promise;
+    const load = {url: url, loaded: null};
+    load.promise = new Promise(function(resolve) {
+        function done(e) {
+            img.removeEventListener('load', done);
+            img.removeEventListener('error', done);
+            load.loaded = e.type === 'load';
+            resolve(load.loaded);
+        }
+        img.addEventListener('load', done);
+        img.addEventListener('error', done);
+        img.src = url;
+    });
+    imageLoads.set(img, load);
+    return load.promise;
+}
+
+// シリーズiのフレームを要求して表示する（quality: 'interactive'=ドラッグ中の高速エンコード, 'final'=可逆）
+// フレームサーバがあればURLを指定し、画像はブラウザがバイナリのまま取得する
+// 新しい要求で置き換えられた場合（Python側で打ち切られた場合を含む）はfalseを返す
+async function requestFrame(i, idx, quality) {
+    const requestId = ++frameRequestIds[i];
+    if (frameServerBase) {
+        const loaded = await loadImage(imgs[i], frameUrl(i, idx, quality));
+        return loaded && requestId === frameRequestIds[i];
+    }
+    const frame = await window.pywebview.api.get_single_slice(i, idx, quality);
+    if (requestId !== frameRequestIds[i] || !frame) return false;
+    imgs[i].src = frame;
+    return true;
+}
+
+async function requestAllFrames(idx, quality) {
+    const requestIds = [];
+    for (let i = 0; i < seriesCount; i++) requestIds.push(++frameRequestIds[i]);
+    if (frameServerBase) {
+        await Promise.all(imgs.map((img, i) => loadImage(img, frameUrl(i, idx, quality))));
+        return;
+    }
+    const frames = await window.pywebview.api.get_slice(idx, quality);
+    for (let i = 0; i < seriesCount; i++) {
+        if (requestIds[i] === frameRequestIds[i] && frames[i]) imgs[i].src = frames[i];
+    }
+}
+
+function syncCanvas(i) {
+    const img = imgs[i];
+    const canvas = canvases[i];
+    canvas.width = img.width;
+    canvas.height = img.height;
+    canvas.style.left = img.offsetLeft + 'px';
+    canvas.style.top = img.offsetTop + 'px';
+    drawROI(i);
+}
+
+// スライダー操作の要求はシリーズごとに処理中1件までとし、処理中に来た要求は最新の1件だけを残す
+// （ドラッグ中に途中のスライスの要求が溜まらず、最後は必ず離した位置のフレームで終わる）
+const pendingFrames = Array(seriesCount).fill(null);
+const framesInFlight = Array(seriesCount).fill(false);
+
+function scheduleFrame(i, idx, quality) {
+    pendingFrames[i] = {idx: idx, quality: quality};
+    if (!framesInFlight[i]) drainFrames(i);
+}
+
+async function drainFrames(i) {
+    framesInFlight[i] = true;
+    try {
+        while (pendingFrames[i]) {
+            const request = pendingFrames[i];
+            pendingFrames[i] = null;
+            const filename = await window.pywebview.api.get_filename(i, request.idx);
+            if (pendingFrames[i]) continue;
+            filenames[i].textContent = filename;
+            if (!await requestFrame(i, request.idx, request.quality) || pendingFrames[i]) continue;
+            syncCanvas(i);
+            await updateStats(i);
+        }
+    } finally {
+        framesInFlight[i] = false;
+    }
+}
+
+// 全体スライダーも同様に、全シリーズ分の要求を処理中1件までにまとめる
+let pendingGlobalFrame = null;
+let globalFrameInFlight = false;
+
+function scheduleAllFrames(idx, quality) {
+    pendingGlobalFrame = {idx: idx, quality: quality};
+    if (!globalFrameInFlight) drainAllFrames();
+}
+
+async function drainAllFrames() {
+    globalFrameInFlight = true;
+    try {
+        while (pendingGlobalFrame) {
+            const request = pendingGlobalFrame;
+            pendingGlobalFrame = null;
+            const names = await Promise.all(imgs.map((img, i) => window.pywebview.api.get_filename(i, request.idx)));
+            if (pendingGlobalFrame) continue;
+            names.forEach((name, i) => { filenames[i].textContent = name; });
+            await requestAllFrames(request.idx, request.quality);
+            if (pendingGlobalFrame) continue;
+            for (let i = 0; i < seriesCount; i++) syncCanvas(i);
+            await updateAllStats();
+        }
+    } finally {
+        globalFrameInFlight = false;
+    }
 }
 
 // スライダーで画像切り替え
 for (let i = 0; i < seriesCount; i++) {
-    sliders[i].addEventListener('input', async function() {
+    sliders[i].addEventListener('input', function() {
         const idx = sliders[i].value;
         currentSlices[i] = parseInt(idx);
         labels[i].textContent = 'Slice: ' + (parseInt(idx) + 1) + '/' + (parseInt(sliders[i].max) + 1);
-        const filename = await window.pywebview.api.get_filename(i, idx);
-        filenames[i].textContent = filename;
-        const b64 = await window.pywebview.api.get_single_slice(i, idx);
-        imgs[i].src = 'data:image/png;base64,' + b64;
-
-        setTimeout(() => {
-            const img = imgs[i];
-            const canvas = canvases[i];
-            canvas.width = img.width;
-            canvas.height = img.height;
-            canvas.style.left = img.offsetLeft + 'px';
-            canvas.style.top = img.offsetTop + 'px';
-            drawROI(i);
-            updateStats(i);
-        }, 50);
+        scheduleFrame(i, idx, 'interactive');
+    });
+    // ドラッグを離したら可逆エンコードのフレームで描き直す
+    sliders[i].addEventListener('change', function() {
+        scheduleFrame(i, sliders[i].value, 'final');
     });
 }
 
 // グローバルスライダー
 const globalSlider = document.getElementById('global-slider');
 const globalLabel = document.getElementById('global-slice-label');
-globalSlider.addEventListener('input', async function() {
+globalSlider.addEventListener('input', function() {
     const idx = globalSlider.value;
     globalLabel.textContent = 'Slice: ' + (parseInt(idx) + 1) + '/' + (parseInt(globalSlider.max) + 1);
     for (let i = 0; i < seriesCount; i++) {
         currentSlices[i] = parseInt(idx);
         sliders[i].value = idx;
         labels[i].textContent = 'Slice: ' + (parseInt(idx) + 1) + '/' + (parseInt(sliders[i].max) + 1);
-        const filename = await window.pywebview.api.get_filename(i, idx);
-        filenames[i].textContent = filename;
-        const img = imgs[i];
-        const canvas = canvases[i];
-        img.onload = function() {
-            canvas.width = img.width;
-            canvas.height = img.height;
-            canvas.style.left = img.offsetLeft + 'px';
-            canvas.style.top = img.offsetTop + 'px';
-            drawROI(i);
-            updateStats(i);
-        };
-    }
-    const b64list = await window.pywebview.api.get_slice(idx);
-    for (let i = 0; i < seriesCount; i++) {
-        imgs[i].src = 'data:image/png;base64,' + b64list[i];
     }
+    scheduleAllFrames(idx, 'interactive');
+});
+// ドラッグを離したら可逆エンコードのフレームで描き直す
+globalSlider.addEventListener('change', function() {
+    scheduleAllFrames(globalSlider.value, 'final');
 });
 
 // キーボードショートカット
@@ -805,24 +1379,11 @@ window.addEventListener('keydown', function(e) {
 });
 
 // redrawAllImages: 諧調揃えON/OFFやフォルダ切替時に全画像を再描画
-function redrawAllImages() {
-    for (let i = 0; i < seriesCount; i++) {
-        (async function(idx) {
-            const sliceIdx = currentSlices[idx];
-            const b64 = await window.pywebview.api.get_single_slice(idx, sliceIdx);
-            imgs[idx].src = 'data:image/png;base64,' + b64;
-            setTimeout(() => {
-                const img = imgs[idx];
-                const canvas = canvases[idx];
-                canvas.width = img.width;
-                canvas.height = img.height;
-                canvas.style.left = img.offsetLeft + 'px';
-                canvas.style.top = img.offsetTop + 'px';
-                drawROI(idx);
-                updateStats(idx);
-            }, 50);
-        })(i);
-    }
+async function redrawAllImages() {
+    await Promise.all(imgs.map(async function(img, i) {
+        if (await requestFrame(i, currentSlices[i], 'final')) syncCanvas(i);
+    }));
+    updateAllStats();
 }
 
 // 初期履歴テーブル表示
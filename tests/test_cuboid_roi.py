@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from core.data_manager import DataManager
+from core.roi_engine import CuboidAccumulator, RoiMaskCache, DEFAULT_CUBOID_PERCENTILES, chunk_ranges
+from core.series_volume import SeriesVolume
+
+
+class _Api(DataManager):
+    # 直方体ROIの集計に必要な属性だけを持つDataManager
+    def __init__(self, series, cuboid_chunk_bytes):
+        self.original_images_list = [series]
+        self.active_subfolders = ['series0']
+        self._roi_masks = RoiMaskCache()
+        self.cuboid_chunk_bytes = cuboid_chunk_bytes
+
+
+def _series(rng, slices=12, height=40, width=36):
+    volume = rng.integers(-1024, 3071, size=(slices, height, width), endpoint=True).astype(np.int16)
+    # 後半のスライスだけslope/interceptを変え、組ごとの度数の合成も通す
+    slopes = [1.0] * (slices // 2) + [0.37] * (slices - slices // 2)
+    intercepts = [-1024.0] * (slices // 2) + [-1023.5] * (slices - slices // 2)
+    return SeriesVolume(volume, slopes, intercepts, [f'{i}.dcm' for i in range(slices)])
+
+
+def _numpy_stats(series, x0, y0, x1, y1, z0, z1, mask=None):
+    hu = np.stack([series[z][y0:y1, x0:x1].astype(np.float64) * series.slopes[z] + series.intercepts[z]
+                   for z in range(z0, z1)])
+    values = hu if mask is None else hu[:, mask]
+    return values.ravel()
+
+
+def _check(result, values, percentiles=DEFAULT_CUBOID_PERCENTILES):
+    assert result['success']
+    assert result['count'] == values.size
+    for key, expected in (('mean', values.mean()), ('std', values.std()), ('min', values.min()), ('max', values.max())):
+        assert result[key] == pytest.approx(expected, abs=1e-6)
+    expected = np.percentile(values, percentiles)
+    actual = [result['percentiles'][f'{q:g}'] for q in percentiles]
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-6)
+
+
+# 1スライス未満 / ROIの3スライス分 / 全範囲を1回で読む上限
+@pytest.mark.parametrize('chunk_bytes', [1, 3 * 20 * 17 * 2, 64 * 1024 * 1024])
+def test_cuboid_rect_matches_numpy(chunk_bytes):
+    series = _series(np.random.default_rng(0))
+    api = _Api(series, chunk_bytes)
+    result = api.get_cuboid_roi_stats(0, 3, 5, 20, 17, 2, 10)
+    _check(result, _numpy_stats(series, 3, 5, 23, 22, 2, 11))
+    assert result['chunks'] == len(chunk_ranges(2, 11, 20 * 17 * 2, chunk_bytes))
+
+
+def test_cuboid_chunk_smaller_than_one_slice_reads_slice_by_slice():
+    series = _series(np.random.default_rng(1))
+    slice_bytes = series.shape[0] * series.shape[1] * series.dtype.itemsize
+    api = _Api(series, slice_bytes // 3)
+    # 画像の端からはみ出す矩形は画像内に収めて集計する
+    result = api.get_cuboid_roi_stats(0, -4, 30, 50, 50, 0, len(series) - 1)
+    assert result['chunks'] == len(series)
+    assert result['rect'] == [0, 30, series.shape[1], series.shape[0] - 30]
+    _check(result, _numpy_stats(series, 0, 30, series.shape[1], series.shape[0], 0, len(series)))
+
+
+@pytest.mark.parametrize('shape', ['circle', 'ellipse'])
+def test_cuboid_masked_shape_matches_numpy(shape):
+    series = _series(np.random.default_rng(2))
+    api = _Api(series, 1)
+    result = api.get_cuboid_roi_stats(0, 4, 6, 25, 19, 1, 8, shape=shape)
+    mask = api._roi_masks.get(shape, 25, 19)
+    _check(result, _numpy_stats(series, 4, 6, 29, 25, 1, 9, mask))
+
+
+def test_cuboid_empty_rect_is_an_error():
+    api = _Api(_series(np.random.default_rng(3)), 1)
+    assert not api.get_cuboid_roi_stats(0, 100, 100, 5, 5, 0, 3)['success']
+
+
+def test_accumulator_float_data_matches_numpy():
+    rng = np.random.default_rng(4)
+    stack = rng.normal(0.0, 100.0, size=(6, 10, 10)).astype(np.float32)
+    accumulator = CuboidAccumulator()
+    for z in range(len(stack)):
+        accumulator.add(stack[z:z + 1], [2.0], [-5.0])
+    values = stack.astype(np.float64).ravel() * 2.0 - 5.0
+    stats = accumulator.result()
+    assert stats['count'] == values.size
+    assert stats['mean'] == pytest.approx(values.mean(), abs=1e-6)
+    assert stats['std'] == pytest.approx(values.std(), abs=1e-6)
+    np.testing.assert_allclose(stats['percentiles'], np.percentile(values, DEFAULT_CUBOID_PERCENTILES), atol=1e-6)
+
+
+def test_accumulator_switches_to_bounded_bins_for_many_float_values():
+    rng = np.random.default_rng(5)
+    # 後のチャンクほど値の範囲が上下に広がり、ビンの範囲を両側へ広げる必要がある
+    chunks = [rng.normal(0.0, 10.0 * (z + 1), size=(1, 30, 30)).astype(np.float32) for z in range(8)]
+    accumulator = CuboidAccumulator(max_values=500, bins=256)
+    for chunk in chunks:
+        accumulator.add(chunk, [0.37], [-1023.5])
+        assert accumulator._size <= 500
+    assert not accumulator.exact
+    assert accumulator._bins.shape == (256,)
+    values = np.concatenate([c.astype(np.float64).ravel() for c in chunks]) * 0.37 - 1023.5
+    stats = accumulator.result()
+    assert not stats['exact']
+    assert stats['count'] == values.size
+    # 画素数・平均・標準偏差・min・maxは厳密、パーセンタイルはビン幅以内
+    assert stats['mean'] == pytest.approx(values.mean(), abs=1e-6)
+    assert stats['std'] == pytest.approx(values.std(), abs=1e-6)
+    assert stats['min'] == pytest.approx(values.min(), abs=1e-9)
+    assert stats['max'] == pytest.approx(values.max(), abs=1e-9)
+    expected = np.percentile(values, DEFAULT_CUBOID_PERCENTILES)
+    assert np.all(np.abs(stats['percentiles'] - expected) <= accumulator._width)
+
+
+def test_accumulator_switches_to_bins_for_many_calibration_groups():
+    rng = np.random.default_rng(6)
+    stack = rng.integers(0, 4000, size=(12, 20, 20)).astype(np.int16)
+    slopes = np.ones(12)
+    intercepts = -1024.0 + np.arange(12) * 0.25
+    accumulator = CuboidAccumulator(max_values=2000, bins=1024)
+    for z in range(0, 12, 3):
+        accumulator.add(stack[z:z + 3], slopes[z:z + 3], intercepts[z:z + 3])
+    assert not accumulator.exact
+    values = (stack.astype(np.float64) + intercepts[:, None, None]).ravel()
+    stats = accumulator.result([0, 50, 100])
+    assert stats['mean'] == pytest.approx(values.mean(), abs=1e-6)
+    assert stats['std'] == pytest.approx(values.std(), abs=1e-6)
+    np.testing.assert_allclose(stats['percentiles'][[0, 2]], [values.min(), values.max()])
+    assert abs(stats['percentiles'][1] - np.median(values)) <= accumulator._width
+
+
+def test_cuboid_reports_whether_percentiles_are_exact():
+    api = _Api(_series(np.random.default_rng(7)), 1)
+    assert api.get_cuboid_roi_stats(0, 0, 0, 10, 10, 0, 3)['percentiles_exact']
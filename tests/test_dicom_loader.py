@@ -0,0 +1,34 @@
+from core import dicom_loader
+from core.dicom_loader import DicomLoader, build_slice_table
+
+
+def _header(path, position):
+    return {'path': path, 'position': position, 'instance': None}
+
+
+def _fake_reader(headers):
+    # パスごとのヘッダ（Noneなら読み込み失敗）を返す
+    return lambda path: headers[path]
+
+
+def test_failed_headers_are_returned(monkeypatch):
+    headers = {'a.dcm': _header('a.dcm', 2.0), 'b.dcm': None, 'c.dcm': _header('c.dcm', 1.0)}
+    monkeypatch.setattr(dicom_loader, 'read_slice_header', _fake_reader(headers))
+    for workers in (1, 4):
+        table, failed = build_slice_table(['a.dcm', 'b.dcm', 'c.dcm'], workers)
+        assert [h['path'] for h in table] == ['c.dcm', 'a.dcm']
+        assert failed == ['b.dcm']
+
+
+def test_no_failures():
+    table, failed = build_slice_table([])
+    assert table == [] and failed == []
+
+
+def test_loader_records_unreadable_files():
+    loader = DicomLoader()
+    loader._record_unreadable('/data/s1', ['/data/s1/b.dcm'])
+    assert loader.unreadable_files == {'/data/s1': ['/data/s1/b.dcm']}
+    # 再読み込みで読めるようになったフォルダは一覧から消す
+    loader._record_unreadable('/data/s1', [])
+    assert loader.unreadable_files == {}
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from core.frame_cache import FrameCache
+from core.series_volume import SeriesVolume
+from core.web_api import DicomWebApi
+
+
+def _series(offset):
+    volume = (np.arange(3 * 8 * 8, dtype=np.int16).reshape(3, 8, 8) * 7 + offset) % 997
+    series = SeriesVolume(volume, [1.0] * 3, [-500.0] * 3, [f'{i}.dcm' for i in range(3)])
+    series.compute_stats()
+    return series
+
+
+@pytest.fixture
+def api():
+    api = DicomWebApi([], defer_series=True, render_workers=1, prefetch_frames=0)
+    series_list = [_series(0), _series(100)]
+    api._set_series(series_list, [s.file_names for s in series_list])
+    api.all_subfolders = [['/a/1', '/a/2'], ['/b/1']]
+    api.active_subfolders = ['/a/1', '/b/1']
+    api.file_path_index = [{}, {}]
+    return api
+
+
+def test_lru_eviction_and_budget():
+    cache = FrameCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    cache.get('a')
+    cache.put('c', b'1234')
+    assert cache.current_bytes == 8
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    # 上限より大きいフレームは保持しない
+    cache.put('d', b'x' * 11)
+    assert 'd' not in cache
+
+
+def test_repeated_frame_is_served_from_cache(api):
+    first, _ = api.get_frame_bytes(0, 1)
+    second, _ = api.get_frame_bytes(0, 1)
+    assert second is first
+    assert api._frame_cache.stats()['hits'] == 1
+
+
+def test_switch_folder_invalidates_only_that_series(api, monkeypatch):
+    old0, _ = api.get_frame_bytes(0, 1)
+    old1, _ = api.get_frame_bytes(1, 1)
+    monkeypatch.setattr(api, 'load_single_folder', lambda folder: _series(300))
+    assert api.switch_folder(0, 1)['success']
+    assert api._frame_cache.stats()['invalidations'] == 1
+    new0, _ = api.get_frame_bytes(0, 1)
+    assert new0 != old0
+    assert api.get_frame_bytes(1, 1)[0] is old1
+
+
+def test_match_toggle_drops_match_frames(api):
+    auto, _ = api.get_frame_bytes(0, 0)
+    api.set_match_contrast_enabled(True)
+    api.get_frame_bytes(0, 0)
+    api.get_frame_bytes(1, 0)
+    assert api._frame_cache.stats()['entries'] == 3
+    api.set_match_contrast_enabled(False)
+    # 諧調揃えで描画した2枚だけを破棄し、自動ウィンドウのフレームは残す
+    assert api._frame_cache.stats()['entries'] == 1
+    assert api.get_frame_bytes(0, 0)[0] is auto
+    # 同じ状態への切替では破棄しない
+    api.set_match_contrast_enabled(False)
+    assert api._frame_cache.stats()['invalidations'] == 2
@@ -0,0 +1,51 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image, features
+from core.frame_encoder import make_encoder, JpegEncoder, PngEncoder, RawEncoder, WebpEncoder
+
+# WebPはPillowのビルドによっては使えない
+needs_webp = pytest.mark.skipif(not features.check('webp'), reason='このPillowはWebPに対応していない')
+
+
+def _frame():
+    return (np.arange(24 * 32, dtype=np.uint32).reshape(24, 32) * 37 % 256).astype(np.uint8)
+
+
+def _decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert('L'))
+
+
+@pytest.mark.parametrize('spec', ['png', 'png:0', 'png:9', pytest.param('webp', marks=needs_webp),
+                                  pytest.param('webp:4', marks=needs_webp), 'raw'])
+def test_lossless_round_trip(spec):
+    encoder = make_encoder(spec)
+    np.testing.assert_array_equal(_decode(encoder.encode(_frame())), _frame())
+
+
+def test_jpeg_round_trip_is_close():
+    decoded = _decode(make_encoder('jpeg:95').encode(_frame()))
+    assert decoded.shape == _frame().shape
+    assert np.abs(decoded.astype(int) - _frame()).mean() < 8
+
+
+def test_data_url_mime():
+    assert make_encoder('raw').data_url(_frame()).startswith('data:image/bmp;base64,')
+
+
+@pytest.mark.parametrize('spec, cls, key', [
+    ('png:1', PngEncoder, 'png:1'),
+    ('PNG', PngEncoder, 'png:6'),
+    ('jpg:80', JpegEncoder, 'jpeg:80'),
+    pytest.param('webp', WebpEncoder, 'webp:0', marks=needs_webp),
+    ('raw', RawEncoder, 'raw'),
+])
+def test_spec_parsing(spec, cls, key):
+    encoder = make_encoder(spec)
+    assert isinstance(encoder, cls)
+    assert encoder.spec == key
+
+
+def test_unknown_encoder():
+    with pytest.raises(ValueError):
+        make_encoder('gif')
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from core.series_volume import SeriesVolume
+from core.web_api import DicomWebApi
+
+
+@pytest.fixture
+def api():
+    api = DicomWebApi([], defer_series=True, render_workers=1, prefetch_frames=0)
+    volume = np.arange(4 * 8 * 8, dtype=np.int16).reshape(4, 8, 8)
+    series_list = [SeriesVolume(volume + offset, [1.0] * 4, [0.0] * 4, [f'{i}.dcm' for i in range(4)]) for offset in (0, 50)]
+    for series in series_list:
+        series.compute_stats()
+    api._set_series(series_list, [series.file_names for series in series_list])
+    api.all_subfolders = [['/a'], ['/b']]
+    api.active_subfolders = ['/a', '/b']
+    return api
+
+
+def test_superseded_request_returns_nothing(api):
+    old = api.begin_frame_request(0, 1)
+    api.begin_frame_request(0, 2)
+    assert api.get_frame_bytes(0, 1, generation=old) == (None, None)
+    assert api.dropped_frame_requests == 1
+    # 打ち切った描画はキャッシュせず、描画中の数も戻る
+    assert api._frame_cache.stats()['entries'] == 0
+    assert api._foreground_renders == 0
+
+
+def test_latest_request_is_rendered(api):
+    api.begin_frame_request(0, 1)
+    latest = api.begin_frame_request(0, 2)
+    data, encoder = api.get_frame_bytes(0, 2, generation=latest)
+    assert data and encoder is not None
+    assert api.dropped_frame_requests == 0
+
+
+def test_generations_are_per_series(api):
+    first = api.begin_frame_request(0, 1)
+    second = api.begin_frame_request(1, 1)
+    # 別シリーズの要求では打ち切られない
+    assert api.get_frame_bytes(0, 1, generation=first)[0] is not None
+    assert api.get_frame_bytes(1, 1, generation=second)[0] is not None
+
+
+def test_request_without_generation_is_never_dropped(api):
+    api.begin_frame_request(0, 3)
+    assert api.get_frame_url(0, 1).startswith('data:image/')
+    assert api.get_single_slice(0, 2).startswith('data:image/')
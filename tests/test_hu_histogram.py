@@ -0,0 +1,35 @@
+import numpy as np
+from core.data_manager import DataManager
+from core.series_volume import SeriesVolume
+
+
+class _Api(DataManager):
+    def __init__(self, series):
+        self.original_images_list = [series]
+
+
+def _api():
+    volume = np.arange(2 * 6 * 5, dtype=np.int16).reshape(2, 6, 5)
+    return _Api(SeriesVolume(volume, [1.0, 2.0], [0.0, -10.0], ['0.dcm', '1.dcm'])), volume
+
+
+def test_whole_slice_by_default():
+    api, volume = _api()
+    result = api.get_hu_histogram(0, 1)
+    np.testing.assert_array_equal(result['hu'], np.sort(volume[1].ravel()) * 2.0 - 10.0)
+    assert result['counts'] == [1] * volume[1].size
+
+
+def test_negative_origin_is_clipped_not_wrapped():
+    api, volume = _api()
+    # 左上にはみ出したROIは画像内の2x2だけを数える（反対側の端の画素を含めない）
+    result = api.get_hu_histogram(0, 0, -2, -2, 4, 4)
+    np.testing.assert_array_equal(result['hu'], np.sort(volume[0, :2, :2].ravel()))
+    assert sum(result['counts']) == 4
+
+
+def test_zero_area_roi_is_empty():
+    api, _ = _api()
+    assert api.get_hu_histogram(0, 0, 10, 0, 3, 3) == {'hu': [], 'counts': []}
+    assert api.get_hu_histogram(0, 0, 1, 1, 0, 5) == {'hu': [], 'counts': []}
+    assert api.get_hu_histogram(0, 0, -8, 2, 4, 4) == {'hu': [], 'counts': []}
@@ -0,0 +1,47 @@
+import numpy as np
+from core.lazy_series import LazySeries, SliceCache
+
+
+def _slice(value):
+    return np.full((4, 4), value, dtype=np.int16)  # 32バイト
+
+
+def test_evicts_oldest_within_budget():
+    cache = SliceCache(max_bytes=3 * 32)
+    for i in range(3):
+        cache.put(i, _slice(i))
+    # 参照した0は最近使ったものとして残り、最も古い1が追い出される
+    assert cache.get(0) is not None
+    cache.put(3, _slice(3))
+    assert cache.current_bytes <= cache.max_bytes
+    assert cache.get(1) is None
+    assert [cache.get(k)[0, 0] for k in (0, 2, 3)] == [0, 2, 3]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_replacing_key_does_not_double_count():
+    cache = SliceCache(max_bytes=10 * 32)
+    cache.put('a', _slice(1))
+    cache.put('a', _slice(2))
+    assert cache.current_bytes == 32
+    assert cache.get('a')[0, 0] == 2
+
+
+def test_keeps_latest_slice_over_budget():
+    cache = SliceCache(max_bytes=16)
+    cache.put('a', _slice(1))
+    cache.put('b', _slice(2))
+    assert cache.stats()['entries'] == 1
+    assert cache.get('b') is not None
+
+
+def test_lazy_series_decodes_once(monkeypatch):
+    table = [{'path': f'{i}.dcm', 'rows': 4, 'columns': 4, 'slope': 1.0, 'intercept': -1024.0} for i in range(3)]
+    series = LazySeries(table, SliceCache())
+    decoded = []
+    monkeypatch.setattr(series, '_decode', lambda path: decoded.append(path) or _slice(len(decoded)))
+    first = series[1]
+    assert series[-2] is first
+    assert decoded == ['1.dcm']
+    # デコードしたスライスの統計表だけが埋まる
+    assert series.stats.valid.tolist() == [False, True, False]
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from core import parallel_decoder
+from core.parallel_decoder import ParallelDecoder, LayoutMismatch, decode_into
+from core.progressive_loader import ProgressiveSeries
+
+
+class _Dataset:
+    def __init__(self, arr):
+        self.pixel_array = arr
+        self.RescaleSlope = 1.0
+        self.RescaleIntercept = -1024.0
+
+
+def _header(path):
+    return {'path': path, 'rows': 4, 'columns': 3, 'bits_allocated': 16, 'bits_stored': 16,
+            'pixel_representation': 0, 'samples_per_pixel': 1}
+
+
+@pytest.fixture
+def files(monkeypatch):
+    # ヘッダはすべてuint16 (4, 3) だが、b.dcmだけ実際の画素はint16の負値
+    arrays = {
+        'a.dcm': np.full((4, 3), 40000, dtype=np.uint16),
+        'b.dcm': np.full((4, 3), -5, dtype=np.int16),
+        'c.dcm': np.full((4, 3), 7, dtype=np.uint16),
+    }
+    monkeypatch.setattr(parallel_decoder.pydicom, 'dcmread', lambda path, force=True: _Dataset(arrays[path]))
+    return arrays
+
+
+def test_decode_into_rejects_dtype_and_shape(files):
+    with pytest.raises(LayoutMismatch):
+        decode_into('b.dcm', np.empty((4, 3), dtype=np.uint16))
+    with pytest.raises(LayoutMismatch):
+        decode_into('a.dcm', np.empty((3, 4), dtype=np.uint16))
+    out = np.empty((4, 3), dtype=np.int16)
+    # 期待する型を指定すれば格納先の型が違っても書き込める（int16で保持するuint16）
+    assert decode_into('c.dcm', out, np.uint16) == (1.0, -1024.0)
+    assert (out == 7).all()
+
+
+def test_mismatch_falls_back_to_slice_list(files):
+    table = [_header(p) for p in ('a.dcm', 'b.dcm', 'c.dcm')]
+    decoded = ParallelDecoder(1).decode(table)
+    # 負値がuint16に折り返されず、スライスごとに元の型のまま返る
+    assert decoded['volume'] is None
+    for arr, path in zip(decoded['slices'], ('a.dcm', 'b.dcm', 'c.dcm')):
+        assert arr.dtype == files[path].dtype
+        np.testing.assert_array_equal(arr, files[path])
+
+
+def test_matching_series_stays_one_volume(files):
+    table = [_header(p) for p in ('a.dcm', 'c.dcm')]
+    decoded = ParallelDecoder(1).decode(table)
+    assert decoded['volume'].shape == (2, 4, 3)
+    assert decoded['volume'].dtype == np.uint16
+
+
+def test_progressive_marks_mismatched_slice_failed(files):
+    table = [dict(_header(p), bits_stored=12) for p in ('c.dcm', 'b.dcm', 'c.dcm')]
+    series = ProgressiveSeries.from_table(table, '.', [])
+    assert series.volume.dtype == np.int16
+    assert (series[0] == 7).all()
+    assert (series[1] == 0).all()
+    assert series.failed == 1
+    # バックグラウンドのデコード結果も同じく型を確かめる
+    series.store_slice(2, files['b.dcm'])
+    assert (series.volume[2] == 0).all()
+    assert series.failed == 2
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from core.calibration import apply_window
+from core.render_engine import WindowRenderer, WINDOW_PRESETS, window_from_center_width
+
+
+def _float_window(raw, slope, intercept, base, width):
+    # 旧実装: CT値のfloat配列に対して引き算・割り算・clip・掛け算・astype
+    hu = raw.astype(np.float64) * slope + intercept
+    return (np.clip((hu - base) / width, 0, 1) * 255.0).astype(np.uint8)
+
+
+def _frames():
+    rng = np.random.default_rng(0)
+    # 全パターンの格納値を含める（LUTの添字の再解釈で符号を取り違えないか確認する）
+    int16 = np.concatenate([np.arange(-32768, 32768, dtype=np.int16),
+                            rng.integers(-1024, 3072, size=4096).astype(np.int16)]).reshape(-1, 64)
+    uint16 = np.arange(65536, dtype=np.uint32).astype(np.uint16).reshape(-1, 256)
+    uint8 = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    return [int16, uint16, uint8]
+
+
+@pytest.mark.parametrize('slope, intercept', [(1.0, 0.0), (1.0, -1024.0), (0.37, -1023.5), (-2.0, 100.0)])
+@pytest.mark.parametrize('preset', list(WINDOW_PRESETS))
+def test_lut_render_matches_float_path(preset, slope, intercept):
+    _, center, width = WINDOW_PRESETS[preset]
+    base, width = window_from_center_width(center, width)
+    renderer = WindowRenderer()
+    for raw in _frames():
+        expected = _float_window(raw, slope, intercept, base, width)
+        np.testing.assert_array_equal(renderer.render(raw, slope, intercept, base, width), expected)
+        np.testing.assert_array_equal(apply_window(raw, slope, intercept, base, width), expected)
+
+
+def test_lut_render_on_non_contiguous_view():
+    raw = np.arange(-500, 500, dtype=np.int16).reshape(20, 50)[:, ::3]
+    renderer = WindowRenderer()
+    np.testing.assert_array_equal(renderer.render(raw, 0.5, -10.0, -200.0, 300.0),
+                                  _float_window(raw, 0.5, -10.0, -200.0, 300.0))
+
+
+def test_float_data_uses_float_path():
+    raw = np.linspace(-1000.0, 1000.0, 400, dtype=np.float32).reshape(20, 20)
+    renderer = WindowRenderer()
+    np.testing.assert_array_equal(renderer.render(raw, 1.5, 3.0, -400.0, 1500.0),
+                                  _float_window(raw, 1.5, 3.0, -400.0, 1500.0))
+    assert renderer.stats()['entries'] == 0
+
+
+def test_lut_is_cached_per_window():
+    raw = np.zeros((4, 4), dtype=np.int16)
+    renderer = WindowRenderer(max_entries=2)
+    renderer.render(raw, 1.0, 0.0, 0.0, 100.0)
+    renderer.render(raw, 1.0, 0.0, 0.0, 100.0)
+    renderer.render(raw, 1.0, 0.0, 10.0, 100.0)
+    renderer.render(raw, 1.0, 0.0, 20.0, 100.0)
+    assert renderer.stats() == {'entries': 2, 'max_entries': 2, 'hits': 1, 'misses': 3}
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from core.series_volume import SeriesVolume
+from core.web_api import DicomWebApi
+
+ROIS = [[2, 3, 5, 4], [0, 0, 16, 12], [-3, -2, 6, 5], [12, 9, 10, 10], [4, 4, 1, 1], [20, 20, 3, 3]]
+POLYGON = [[0, 0], [6, 1], [3, 3], [6, 6], [0, 5]]
+
+
+@pytest.fixture
+def api():
+    api = DicomWebApi([], defer_series=True, render_workers=1, prefetch_frames=0)
+    rng = np.random.default_rng(3)
+    series_list = [
+        SeriesVolume(rng.integers(-1024, 3000, (4, 12, 16)).astype(np.int16),
+                     [1.0, 1.0, 0.5, 2.0], [-1024.0, 0.0, -10.0, 3.5], [f'{i}.dcm' for i in range(4)]),
+        SeriesVolume(rng.integers(0, 4096, (3, 12, 16)).astype(np.int16),
+                     [1.0] * 3, [-1024.0] * 3, [f'{i}.dcm' for i in range(3)]),
+    ]
+    api._set_series(series_list, [s.file_names for s in series_list])
+    api.active_subfolders = ['/a', '/b']
+    return api
+
+
+def _assert_rows_match(api, batch, shape='rect', points=None):
+    for i in range(len(batch['mean'])):
+        single = api.get_roi_stats(batch['series'][i], batch['slice'][i], batch['x'][i], batch['y'][i],
+                                   batch['w'][i], batch['h'][i], shape, points)
+        assert batch['mean'][i] == pytest.approx(single['mean'], rel=1e-9, abs=1e-6)
+        assert batch['std'][i] == pytest.approx(single['std'], rel=1e-9, abs=1e-6)
+
+
+def test_batch_rect_matches_single(api):
+    items = [[s, z] + roi for s, n in ((0, 4), (1, 3)) for z in range(n) for roi in ROIS]
+    batch = api.get_roi_stats_batch(items)
+    assert batch['series'] == [item[0] for item in items]
+    _assert_rows_match(api, batch)
+    # 画像外のROIは画素数0
+    assert batch['count'][len(ROIS) - 1] == 0
+
+
+def test_batch_rows_keep_item_order(api):
+    items = [[1, 2] + ROIS[0], [0, 0] + ROIS[1], [1, 2] + ROIS[2], [0, 3] + ROIS[0]]
+    batch = api.get_roi_stats_batch(items)
+    assert [batch['slice'][i] for i in range(4)] == [2, 0, 2, 3]
+    _assert_rows_match(api, batch)
+
+
+def test_batch_grid_covers_every_combination(api):
+    batch = api.get_roi_stats_batch({'series': [0, 1], 'slices': [0, 2], 'rois': ROIS[:3]})
+    assert len(batch['mean']) == 2 * 2 * 3
+    _assert_rows_match(api, batch)
+
+
+@pytest.mark.parametrize('shape, points', [('circle', None), ('ellipse', None), ('polygon', POLYGON)])
+def test_batch_masked_shapes_match_single(api, shape, points):
+    items = [[0, z] + roi for z in range(4) for roi in ROIS[:4]]
+    batch = api.get_roi_stats_batch(items, shape, points)
+    _assert_rows_match(api, batch, shape, points)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from core.calibration import calibrated_mean_std
+from core.roi_engine import IntegralImageCache, INTEGRAL_BUILD_AREA_FACTOR, clip_rect
+
+# 割り切れない値のslope/interceptで校正の掛け方の誤りも検出する
+SLOPE = 0.37
+INTERCEPT = -1023.5
+
+
+def _expected(raw, x, y, w, h, slope=SLOPE, intercept=INTERCEPT):
+    # 画像外にはみ出した部分は除いて直接集計する
+    x0, y0, x1, y1 = clip_rect(raw.shape, x, y, w, h)
+    return calibrated_mean_std(raw[y0:y1, x0:x1], slope, intercept)
+
+
+def _random_rects(rng, shape, count):
+    # 画像の端からはみ出すもの・負の座標・1画素のものを含む
+    height, width = shape
+    rects = [[0, 0, width, height], [width - 1, height - 1, 1, 1], [-5, -7, 12, 9], [width - 3, 2, 10, 4]]
+    for _ in range(count):
+        x, y = int(rng.integers(-8, width)), int(rng.integers(-8, height))
+        w, h = int(rng.integers(1, width + 8)), int(rng.integers(1, height + 8))
+        rects.append([x, y, w, h])
+    return rects
+
+
+def _built_integral(raw):
+    cache = IntegralImageCache(build_after=2)
+    # 1回目は直接集計、2回目の問い合わせで積分画像を作る
+    assert cache.lookup('slice', lambda: raw) is None
+    integral = cache.lookup('slice', lambda: raw)
+    assert integral is not None
+    assert cache.stats()['builds'] == 1
+    return integral
+
+
+@pytest.mark.parametrize('dtype', [np.int16, np.uint16, np.uint8])
+def test_integral_matches_direct_mean_std(dtype):
+    rng = np.random.default_rng(0)
+    info = np.iinfo(dtype)
+    raw = rng.integers(info.min, info.max, size=(61, 47), endpoint=True).astype(dtype)
+    integral = _built_integral(raw)
+    assert integral.exact
+    for x, y, w, h in _random_rects(rng, raw.shape, 300):
+        actual = integral.calibrated_mean_std(x, y, w, h, SLOPE, INTERCEPT)
+        np.testing.assert_allclose(actual, _expected(raw, x, y, w, h), rtol=0, atol=1e-6)
+
+
+def test_integral_float_data_matches_direct_mean_std():
+    rng = np.random.default_rng(1)
+    raw = rng.normal(40.0, 300.0, size=(53, 64)).astype(np.float32)
+    integral = _built_integral(raw)
+    assert not integral.exact
+    for x, y, w, h in _random_rects(rng, raw.shape, 200):
+        actual = integral.calibrated_mean_std(x, y, w, h, SLOPE, INTERCEPT)
+        np.testing.assert_allclose(actual, _expected(raw, x, y, w, h), rtol=1e-9, atol=1e-6)
+
+
+def test_integral_batch_matches_single_lookup():
+    rng = np.random.default_rng(2)
+    raw = rng.integers(-1024, 3071, size=(40, 50), endpoint=True).astype(np.int16)
+    integral = _built_integral(raw)
+    rects = _random_rects(rng, raw.shape, 100)
+    means, stds, counts = integral.calibrated_mean_std_batch(rects, -2.5, 17.25)
+    for (x, y, w, h), mean, std, count in zip(rects, means, stds, counts):
+        x0, y0, x1, y1 = clip_rect(raw.shape, x, y, w, h)
+        assert count == (x1 - x0) * (y1 - y0)
+        np.testing.assert_allclose((mean, std), _expected(raw, x, y, w, h, -2.5, 17.25), rtol=0, atol=1e-6)
+
+
+def test_rect_outside_image_is_empty():
+    raw = np.arange(100, dtype=np.int16).reshape(10, 10)
+    integral = _built_integral(raw)
+    assert integral.calibrated_mean_std(20, 3, 5, 5, SLOPE, INTERCEPT) == (0.0, 0.0)
+    assert integral.calibrated_mean_std(-9, -9, 4, 4, SLOPE, INTERCEPT) == (0.0, 0.0)
+
+
+def test_lookup_builds_on_first_query_when_area_justifies_it():
+    raw = np.zeros((16, 16), dtype=np.int16)
+    cache = IntegralImageCache(build_after=2)
+    assert cache.lookup('a', lambda: raw, area_ratio=INTEGRAL_BUILD_AREA_FACTOR - 1) is None
+    assert cache.lookup('b', lambda: raw, area_ratio=INTEGRAL_BUILD_AREA_FACTOR) is not None
+    # 作った積分画像は次の問い合わせでキャッシュから返す
+    assert cache.lookup('b', lambda: pytest.fail('再作成された')) is not None
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,97 @@
+import math
+import numpy as np
+import pytest
+from core.roi_engine import RoiMaskCache, clip_rect, crop_mask, masked_values, rasterize_roi_mask
+
+
+def _pixel_centres_inside(mask, x, y, shape):
+    # マスクの各画素を画像座標に置き、画像内に入る画素の (行, 列) を返す
+    rows, cols = np.nonzero(mask)
+    rows, cols = rows + y, cols + x
+    inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+    return rows[inside], cols[inside]
+
+
+@pytest.mark.parametrize('size', [21, 100, 301])
+def test_circle_pixel_count_matches_area(size):
+    mask = rasterize_roi_mask('circle', size, size)
+    r = size / 2.0
+    # 境界の画素による誤差は周長程度に収まる
+    assert abs(int(mask.sum()) - math.pi * r * r) <= 2 * math.pi * r * 0.5
+
+
+def test_circle_uses_shorter_side_and_is_centred():
+    mask = rasterize_roi_mask('circle', 120, 60)
+    assert mask.shape == (60, 120)
+    cols = np.flatnonzero(mask.any(axis=0))
+    # 直径は短辺の60画素で、外接矩形の中央に置かれる
+    assert cols[0] == 30 and cols[-1] == 89
+    assert mask.any(axis=1).all()
+
+
+@pytest.mark.parametrize('w, h', [(180, 90), (33, 71), (250, 40)])
+def test_ellipse_pixel_count_matches_area(w, h):
+    mask = rasterize_roi_mask('ellipse', w, h)
+    rx, ry = w / 2.0, h / 2.0
+    perimeter = math.pi * (3 * (rx + ry) - math.sqrt((3 * rx + ry) * (rx + 3 * ry)))
+    assert abs(int(mask.sum()) - math.pi * rx * ry) <= perimeter * 0.5
+    # 外接矩形の上下左右の辺に接する
+    assert mask.any(axis=0).all() and mask.any(axis=1).all()
+
+
+def test_degenerate_circle_is_empty():
+    assert not rasterize_roi_mask('circle', 0, 10).any()
+    assert not rasterize_roi_mask('ellipse', 10, 0).any()
+
+
+def test_concave_polygon():
+    # L字形（右下の6x6が欠けている）
+    points = [[0, 0], [10, 0], [10, 4], [4, 4], [4, 10], [0, 10]]
+    mask = rasterize_roi_mask('polygon', 10, 10, points)
+    expected = np.zeros((10, 10), dtype=bool)
+    expected[:4, :] = True
+    expected[:, :4] = True
+    np.testing.assert_array_equal(mask, expected)
+    assert int(mask.sum()) == 64
+
+
+def test_concave_polygon_with_notch_between_edges():
+    # 上辺中央に切り込みのあるV字形。切り込みの内側の画素は含まない
+    points = [[0, 0], [4, 0], [5, 5], [6, 0], [10, 0], [10, 10], [0, 10]]
+    mask = rasterize_roi_mask('polygon', 10, 10, points)
+    assert not mask[0, 4:6].any()
+    assert mask[0, :4].all() and mask[0, 6:].all()
+    assert mask[6:, :].all()
+
+
+def test_polygon_needs_three_vertices():
+    with pytest.raises(ValueError):
+        rasterize_roi_mask('polygon', 10, 10, [[0, 0], [5, 5]])
+    with pytest.raises(ValueError):
+        rasterize_roi_mask('star', 10, 10)
+
+
+@pytest.mark.parametrize('x, y', [(-6, -4), (14, 15), (-3, 12), (30, 30)])
+def test_roi_partially_outside_image(x, y):
+    arr = np.arange(20 * 24, dtype=np.int16).reshape(20, 24)
+    mask = rasterize_roi_mask('circle', 13, 13)
+    rows, cols = _pixel_centres_inside(mask, x, y, arr.shape)
+    # crop_maskは画像内に収めた矩形と同じ大きさで、画像内に残る画素だけを選ぶ
+    x0, y0, x1, y1 = clip_rect(arr.shape, x, y, 13, 13)
+    cropped = crop_mask(mask, x, y, x0, y0, x1, y1)
+    assert cropped.shape == (y1 - y0, x1 - x0)
+    assert int(cropped.sum()) == len(rows)
+    np.testing.assert_array_equal(np.sort(masked_values(arr, x, y, mask)), np.sort(arr[rows, cols]))
+
+
+def test_mask_cache_reuses_read_only_masks():
+    cache = RoiMaskCache(max_entries=2)
+    first = cache.get('ellipse', 30, 20)
+    assert cache.get('ellipse', 30, 20) is first
+    assert not first.flags.writeable
+    polygon = [[0, 0], [8, 0], [0, 8]]
+    assert cache.get('polygon', 8, 8, polygon) is cache.get('polygon', 8, 8, np.array(polygon))
+    cache.get('circle', 5, 5)
+    # 上限を超えると最も古いマスクを捨てる
+    assert cache.get('ellipse', 30, 20) is not first
+    assert cache.stats()['hits'] == 2
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from core.series_volume import SeriesVolume
+from core.web_api import DicomWebApi
+
+POLYGON = [[0, 0], [6, 1], [3, 3], [6, 6], [0, 5]]
+
+
+@pytest.fixture
+def api():
+    api = DicomWebApi([], defer_series=True, render_workers=1, prefetch_frames=0)
+    rng = np.random.default_rng(3)
+    series_list = [
+        SeriesVolume(rng.integers(-1024, 3000, (4, 12, 16)).astype(np.int16),
+                     [1.0, 1.0, 0.5, 2.0], [-1024.0, 0.0, -10.0, 3.5], [f'{i}.dcm' for i in range(4)]),
+        SeriesVolume(rng.integers(0, 4096, (3, 12, 16)).astype(np.int16),
+                     [1.0] * 3, [-1024.0] * 3, [f'{i}.dcm' for i in range(3)]),
+    ]
+    api._set_series(series_list, [s.file_names for s in series_list])
+    api.active_subfolders = ['/a', '/b']
+    return api
+
+
+@pytest.mark.parametrize('shape, points', [('rect', None), ('ellipse', None), ('polygon', POLYGON)])
+@pytest.mark.parametrize('roi', [[2, 3, 7, 6], [-2, -1, 8, 7]])
+def test_zprofile_matches_single_per_slice(api, shape, points, roi):
+    profile = api.get_roi_zprofile(0, *roi, shape=shape, points=points)
+    assert profile['success']
+    assert profile['slice'] == [0, 1, 2, 3]
+    for z in range(4):
+        single = api.get_roi_stats(0, z, *roi, shape, points)
+        assert profile['mean'][z] == pytest.approx(single['mean'], rel=1e-9, abs=1e-6)
+        assert profile['std'][z] == pytest.approx(single['std'], rel=1e-9, abs=1e-6)
+
+
+def test_zprofile_min_max_are_calibrated(api):
+    series = api.original_images_list[0]
+    profile = api.get_roi_zprofile(0, 2, 3, 7, 6)
+    for z in range(4):
+        hu = series[z][3:9, 2:9] * series.slopes[z] + series.intercepts[z]
+        assert profile['min'][z] == pytest.approx(hu.min())
+        assert profile['max'][z] == pytest.approx(hu.max())
+
+
+def test_zprofile_of_mixed_size_series(api):
+    slices = [np.zeros((12, 16), dtype=np.int16), np.zeros((10, 16), dtype=np.int16)]
+    api.original_images_list[1] = SeriesVolume(slices, [1.0] * 2, [0.0] * 2, ['0.dcm', '1.dcm'])
+    # サイズの揃わないシリーズは、矩形が小さいスライスからはみ出すとまとめられない
+    assert api.get_roi_zprofile(1, 0, 0, 4, 4)['success']
+    assert api.get_roi_zprofile(1, 0, 8, 4, 4)['success'] is False
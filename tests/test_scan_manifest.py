@@ -0,0 +1,67 @@
+import os
+import time
+from core.scan_manifest import ScanManifest
+
+
+def _age(path, seconds=60):
+    # 直近に更新されたディレクトリは再走査されるので、更新時刻を過去にずらす
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def _parent(tmp_path):
+    parent = tmp_path / 'parent'
+    for name in ('s1', 's2'):
+        (parent / name).mkdir(parents=True)
+        (parent / name / '0.dcm').write_bytes(b'x')
+        _age(parent / name)
+    (parent / 'notes').mkdir()
+    _age(parent / 'notes')
+    _age(parent)
+    return parent
+
+
+def test_unchanged_dirs_are_reused(tmp_path):
+    parent = _parent(tmp_path)
+    manifest = ScanManifest(None)
+    first = manifest.dicom_subfolders(str(parent))
+    assert sorted(os.path.basename(p) for p in first) == ['s1', 's2']
+    scanned = manifest.scanned
+    assert manifest.dicom_subfolders(str(parent)) == first
+    assert manifest.scanned == scanned
+
+
+def test_changed_dir_is_rescanned(tmp_path):
+    parent = _parent(tmp_path)
+    manifest = ScanManifest(None)
+    manifest.dicom_files(str(parent / 's1'))
+    (parent / 's1' / '1.dcm').write_bytes(b'y')
+    _age(parent / 's1', 30)
+    files = manifest.dicom_files(str(parent / 's1'))
+    assert sorted(os.path.basename(f) for f in files) == ['0.dcm', '1.dcm']
+    assert manifest.scanned == 2
+
+
+def test_recent_dir_is_not_trusted(tmp_path):
+    folder = tmp_path / 'fresh'
+    folder.mkdir()
+    manifest = ScanManifest(None)
+    manifest.dicom_files(str(folder))
+    manifest.dicom_files(str(folder))
+    assert manifest.scanned == 2
+
+
+def test_persists_between_runs(tmp_path):
+    parent = _parent(tmp_path)
+    path = str(tmp_path / 'manifest.json')
+    manifest = ScanManifest(path)
+    manifest.dicom_subfolders(str(parent))
+    manifest.save()
+    reopened = ScanManifest(path)
+    reopened.dicom_subfolders(str(parent))
+    assert reopened.scanned == 0
+    assert reopened.reused > 0
+
+
+def test_missing_dir_returns_no_files(tmp_path):
+    assert ScanManifest(None).dicom_files(str(tmp_path / 'missing')) == []
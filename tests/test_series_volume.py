@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from core.series_volume import SeriesVolume, fits_int16, to_storage_dtype
+
+
+@pytest.mark.parametrize('dtype, bits_stored, expected', [
+    (np.uint16, 12, True),
+    (np.uint16, 15, True),
+    (np.uint16, 16, False),
+    (np.int16, 16, True),
+    (np.int32, 16, True),
+    (np.int32, 17, False),
+    (np.uint16, 0, False),
+    (np.float32, 12, False),
+])
+def test_fits_int16_boundaries(dtype, bits_stored, expected):
+    assert fits_int16(dtype, bits_stored) is expected
+
+
+def test_uint16_within_int16_is_narrowed_by_values():
+    volume = np.array([[[0, 32767]]], dtype=np.uint16)
+    stored = to_storage_dtype(volume)
+    assert stored.dtype == np.int16
+    np.testing.assert_array_equal(stored, volume)
+
+
+def test_uint16_above_int16_is_kept():
+    volume = np.array([[[0, 32768]]], dtype=np.uint16)
+    assert to_storage_dtype(volume).dtype == np.uint16
+
+
+def test_int32_range_boundaries():
+    assert to_storage_dtype(np.array([-32768, 32767], dtype=np.int32)).dtype == np.int16
+    assert to_storage_dtype(np.array([-32769, 0], dtype=np.int32)).dtype == np.int32
+
+
+def test_bits_stored_skips_the_scan():
+    # BitsStoredで収まると分かる場合はmin/maxを見ずに変換する
+    volume = np.array([0, 4095], dtype=np.uint16)
+    assert to_storage_dtype(volume, 12).dtype == np.int16
+
+
+def test_other_dtypes_are_unchanged():
+    for volume in (np.zeros(3, dtype=np.uint8), np.zeros(3, dtype=np.float32), np.zeros(0, dtype=np.uint16)):
+        assert to_storage_dtype(volume) is volume
+    slices = [np.zeros((2, 2), dtype=np.uint16)]
+    assert to_storage_dtype(slices) is slices
+
+
+def test_slices_are_views_of_one_volume():
+    volume = np.arange(3 * 2 * 2, dtype=np.int16).reshape(3, 2, 2)
+    series = SeriesVolume(volume, [1.0] * 3, [0.0, -1024.0, 5.0], ['a', 'b', 'c'])
+    assert np.shares_memory(series[1], volume)
+    assert series.nbytes == volume.nbytes
+    assert series.calibration(1) == (1.0, -1024.0)
+    assert np.shares_memory(series.roi_stack(0, 0, 2, 1, 1, 3), volume)
@@ -0,0 +1,60 @@
+import numpy as np
+from core.calibration import calibrated_range
+from core.image_processor import ImageProcessor
+from core.series_volume import SeriesVolume
+from core.slice_stats import SliceStats
+
+
+class _Api(ImageProcessor):
+    def __init__(self, series_list):
+        self.original_images_list = series_list
+
+
+def _old_min_ct_window(series_list):
+    # 旧実装: 全シリーズの全スライスを順に走査し、幅が小さいものが見つかったときだけ更新する
+    min_base = min_range = None
+    for series in series_list:
+        for i, arr in enumerate(series):
+            lo, hi = calibrated_range(arr, *series.calibration(i))
+            if min_range is None or hi - lo < min_range:
+                min_base, min_range = lo, hi - lo
+    return min_base, min_range
+
+
+def _series(widths, slope=1.0, intercept=0.0):
+    # スライスiはiからi+widthまでの値を持つ（同じ幅のスライスは基準minだけが異なる）
+    volume = np.zeros((len(widths), 2, 2), dtype=np.int16)
+    for i, width in enumerate(widths):
+        volume[i] = [[i, i + width], [i, i]]
+    return SeriesVolume(volume, [slope] * len(widths), [intercept] * len(widths), [f'{i}.dcm' for i in range(len(widths))])
+
+
+def test_matches_old_scan_with_ties():
+    series_list = [_series([5, 3, 3, 4]), _series([3, 3], slope=1.0, intercept=-10.0), _series([7])]
+    for series in series_list:
+        series.compute_stats()
+    assert _Api(series_list).get_min_ct_window() == _old_min_ct_window(series_list)
+
+
+def test_out_of_order_fill_prefers_lower_index():
+    series = _series([4, 2, 2, 2])
+    # 段階的読み込みのように後ろのスライスから埋まっても、同じ幅なら番号の小さいスライスを選ぶ
+    for idx in (3, 2, 1, 0):
+        series.stats.update(idx, series[idx], *series.calibration(idx))
+    assert series.stats.window() == (2.0, 1, 1.0)
+    assert _Api([series]).get_min_ct_window() == _old_min_ct_window([series])
+
+
+def test_no_rows_yet():
+    series = _series([3, 4])
+    assert series.stats.window() is None
+    assert _Api([series]).get_min_ct_window()[0] is None
+
+
+def test_round_trip_through_dict():
+    series = _series([5, 1, 2])
+    series.stats.update(2, series[2], 1.0, 0.0)
+    restored = SliceStats.from_dict(series.stats.to_dict(), 3)
+    assert restored.valid.tolist() == [False, False, True]
+    assert restored.window() == series.stats.window()
+    assert SliceStats.from_dict(series.stats.to_dict(), 4) is None
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+from core.volume_cache import VolumeCache
+
+
+def _folder(tmp_path, count=3):
+    folder = tmp_path / 'series'
+    folder.mkdir()
+    files = []
+    for i in range(count):
+        path = folder / f'{i}.dcm'
+        path.write_bytes(b'x' * (i + 1))
+        files.append(str(path))
+    return str(folder), files
+
+
+def _store(cache, folder, files):
+    volume = np.arange(len(files) * 6, dtype=np.int16).reshape(len(files), 2, 3)
+    cache.store(folder, files, volume, [os.path.basename(f) for f in files], [1.0] * len(files), [-1024.0] * len(files))
+    return volume
+
+
+def test_round_trip_is_memmapped(tmp_path):
+    folder, files = _folder(tmp_path)
+    cache = VolumeCache(str(tmp_path / 'cache'))
+    volume = _store(cache, folder, files)
+    cached = cache.load(folder, files)
+    assert isinstance(cached['volume'], np.memmap)
+    np.testing.assert_array_equal(cached['volume'], volume)
+    assert cached['file_names'] == ['0.dcm', '1.dcm', '2.dcm']
+    assert cached['intercepts'] == [-1024.0] * 3
+
+
+def test_miss_after_size_change(tmp_path):
+    folder, files = _folder(tmp_path)
+    cache = VolumeCache(str(tmp_path / 'cache'))
+    _store(cache, folder, files)
+    with open(files[1], 'ab') as fp:
+        fp.write(b'y')
+    assert cache.load(folder, files) is None
+
+
+def test_miss_after_mtime_change(tmp_path):
+    folder, files = _folder(tmp_path)
+    cache = VolumeCache(str(tmp_path / 'cache'))
+    _store(cache, folder, files)
+    st = os.stat(files[0])
+    os.utime(files[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert cache.load(folder, files) is None
+
+
+def test_store_replaces_stale_entry_of_same_folder(tmp_path):
+    folder, files = _folder(tmp_path)
+    cache = VolumeCache(str(tmp_path / 'cache'))
+    _store(cache, folder, files)
+    with open(files[0], 'ab') as fp:
+        fp.write(b'y')
+    _store(cache, folder, files)
+    assert cache.stats()['entries'] == 1
+    assert cache.load(folder, files) is not None
+
+
+def test_rejects_relative_dir():
+    with pytest.raises(ValueError):
+        VolumeCache('relative/cache')
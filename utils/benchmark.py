@@ -0,0 +1,406 @@
+"""CT-Analyzerの性能計測スクリプト
+
+使い方:
+    python -m utils.benchmark load <dicom_folder> [--repeat 3]
+    python -m utils.benchmark decode <dicom_folder> [--workers 1 4 8]
+    python -m utils.benchmark memory <dicom_folder1> [<dicom_folder2> ...]
+    python -m utils.benchmark scan <parent_folder> [--repeat 3]
+    python -m utils.benchmark render [--folder <dicom_folder>] [--size 512] [--repeat 50]
+    python -m utils.benchmark encode [--folder <dicom_folder>] [--encoders png:1 png:6 webp jpeg:90 raw]
+    python -m utils.benchmark slice <dicom_folder1> [<dicom_folder2> ...] [--workers 1 4]
+    python -m utils.benchmark prefetch <dicom_folder> [--interval-ms 30] [--frames 0 8]
+    python -m utils.benchmark preview [--folder <dicom_folder>] [--size 1024] [--encoder jpeg:90]
+    python -m utils.benchmark roi [--folder <dicom_folder>] [--sizes 3 50 200]
+    python -m utils.benchmark cuboid [--slices 100] [--size 512] [--chunk-mb 4 64]
+    python -m utils.benchmark mask [--folder <dicom_folder>] [--shapes circle ellipse polygon] [--sizes 10 50 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.dicom_loader import DicomLoader, build_slice_table
+from core.parallel_decoder import ParallelDecoder, DEFAULT_DECODE_WORKERS
+from core.scan_manifest import ScanManifest
+from core.render_engine import DEFAULT_RENDER_WORKERS
+
+
+def _time_call(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times), result
+
+
+def bench_load(args):
+    """load_single_folderの読み込み時間（旧: 2回読み込み / 新: ヘッダのみパス+1回デコード）"""
+    loader = DicomLoader()
+    results = {}
+    for mode, enabled in (('legacy', False), ('single_pass', True)):
+        loader.header_sort_enabled = enabled
+        best, mean, series = _time_call(lambda: loader.load_single_folder(args.folder), args.repeat)
+        results[mode] = best
+        print(f"[load] {mode:12s} slices={len(series):5d} best={best * 1000:9.1f} ms mean={mean * 1000:9.1f} ms")
+    if results['single_pass'] > 0:
+        print(f"[load] speedup x{results['legacy'] / results['single_pass']:.2f}")
+
+
+def bench_decode(args):
+    """ピクセルデコードのワーカー数ごとの処理時間"""
+    import glob
+    table, _ = build_slice_table(glob.glob(os.path.join(args.folder, '*.dcm')))
+    for workers in args.workers:
+        decoder = ParallelDecoder(workers)
+        best, mean, _ = _time_call(lambda: decoder.decode(table), args.repeat)
+        print(f"[decode] workers={workers:3d} slices={len(table):5d} best={best * 1000:9.1f} ms mean={mean * 1000:9.1f} ms")
+
+
+def bench_memory(args):
+    """シリーズ保持に使うメモリ量（旧: float32+uint8のスライスリスト / 現: 生の格納値ボリューム）"""
+    from core.web_api import DicomWebApi
+    api = DicomWebApi(args.folders)
+    report = api.get_memory_report()
+    for row in report['series']:
+        print(f"[memory] series{row['series'] + 1} slices={row['slices']:5d} shape={row['shape']} "
+              f"before={row['legacy_bytes'] / 1024 ** 2:9.1f} MB after={row['stored_bytes'] / 1024 ** 2:9.1f} MB"
+              f"{' (memmap)' if row['memmap'] else ''}")
+    print(f"[memory] total before={report['legacy_bytes'] / 1024 ** 2:9.1f} MB "
+          f"after={report['stored_bytes'] / 1024 ** 2:9.1f} MB")
+
+
+def bench_scan(args):
+    """フォルダ分類（folder1/folder2）の走査時間（旧: listdir+glob / 新: マニフェストの初回・2回目）"""
+    import glob
+    import tempfile
+
+    def legacy_scan():
+        subfolders = []
+        for item in os.listdir(args.folder):
+            item_path = os.path.join(args.folder, item)
+            if os.path.isdir(item_path) and glob.glob(os.path.join(item_path, '*.dcm')):
+                subfolders.append(item_path)
+        return subfolders
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest_path = os.path.join(tmp, 'scan_manifest.json')
+
+        def manifest_scan():
+            manifest = ScanManifest(manifest_path)
+            subfolders = manifest.dicom_subfolders(args.folder)
+            manifest.save()
+            return subfolders
+
+        best, mean, subfolders = _time_call(legacy_scan, args.repeat)
+        print(f"[scan] {'legacy':12s} subfolders={len(subfolders):5d} best={best * 1000:9.1f} ms mean={mean * 1000:9.1f} ms")
+        best, mean, subfolders = _time_call(manifest_scan, 1)
+        print(f"[scan] {'manifest_cold':12s} subfolders={len(subfolders):5d} best={best * 1000:9.1f} ms")
+        best, mean, subfolders = _time_call(manifest_scan, args.repeat)
+        print(f"[scan] {'manifest_warm':12s} subfolders={len(subfolders):5d} best={best * 1000:9.1f} ms mean={mean * 1000:9.1f} ms")
+
+
+def bench_render(args):
+    """表示用uint8への変換時間（旧: float演算 / LUTを毎回作成 / ウィンドウごとにLUTをキャッシュ）。結果の一致は tests/test_render_engine.py で確認する"""
+    import numpy as np
+    from core.calibration import apply_window
+    from core.render_engine import WindowRenderer, WINDOW_PRESETS, window_from_center_width
+
+    if args.folder:
+        from core.lazy_series import LazySeries, SliceCache
+        table, _ = build_slice_table(ScanManifest(None).dicom_files(args.folder))
+        series = LazySeries(table, SliceCache())
+        raw = series[len(series) // 2]
+        slope, intercept = series.calibration(len(series) // 2)
+    else:
+        rng = np.random.default_rng(0)
+        raw = rng.integers(-1024, 3072, size=(args.size, args.size)).astype(np.int16)
+        slope, intercept = 1.0, 0.0
+
+    def legacy(base, width):
+        # 旧実装: CT値のfloat配列に対して引き算・割り算・clip・掛け算・astype
+        hu = raw.astype(np.float32) * slope + intercept
+        return (np.clip((hu - base) / width, 0, 1) * 255).astype(np.uint8)
+
+    renderer = WindowRenderer()
+    print(f"[render] frame={raw.shape} dtype={raw.dtype}")
+    for name, (_, center, width) in WINDOW_PRESETS.items():
+        base, width = window_from_center_width(center, width)
+        t_legacy, _, out_legacy = _time_call(lambda: legacy(base, width), args.repeat)
+        t_lut, _, _ = _time_call(lambda: apply_window(raw, slope, intercept, base, width), args.repeat)
+        t_cached, _, out_cached = _time_call(lambda: renderer.render(raw, slope, intercept, base, width), args.repeat)
+        diff = int(np.abs(out_legacy.astype(np.int16) - out_cached).max())
+        print(f"[render] {name:12s} float={t_legacy * 1000:7.2f} ms lut={t_lut * 1000:7.2f} ms "
+              f"cached_lut={t_cached * 1000:7.2f} ms speedup x{t_legacy / t_cached:.1f} max_diff={diff}")
+    print(f"[render] lut_cache {renderer.stats()}")
+
+
+def _raw_frame(args):
+    """計測用の (生の格納値, slope, intercept)（フォルダ指定時は中央スライス、省略時は合成画像）"""
+    import numpy as np
+    if args.folder:
+        from core.lazy_series import LazySeries, SliceCache
+        table, _ = build_slice_table(ScanManifest(None).dicom_files(args.folder))
+        series = LazySeries(table, SliceCache())
+        idx = len(series) // 2
+        raw = series[idx]
+        slope, intercept = series.calibration(idx)
+    else:
+        # 円形の被写体 + ノイズ（実画像に近い圧縮率になるように）
+        rng = np.random.default_rng(0)
+        yy, xx = np.mgrid[:args.size, :args.size]
+        r = np.hypot(yy - args.size / 2, xx - args.size / 2)
+        raw = np.where(r < args.size * 0.4, 40, -1000) + rng.normal(0, 20, r.shape)
+        raw = raw.astype(np.int16)
+        slope, intercept = 1.0, 0.0
+    return raw, slope, intercept
+
+
+def _display_frame(args):
+    """エンコード計測用の表示用uint8フレーム"""
+    from core.calibration import apply_window, calibrated_range
+    raw, slope, intercept = _raw_frame(args)
+    lo, hi = calibrated_range(raw, slope, intercept)
+    return apply_window(raw, slope, intercept, lo, hi - lo + 1e-8)
+
+
+def bench_encode(args):
+    """フレームエンコーダごとの1フレームあたりのバイト数と処理時間"""
+    from core.frame_encoder import make_encoder
+    frame = _display_frame(args)
+    print(f"[encode] frame={frame.shape} raw={frame.nbytes} bytes")
+    for spec in args.encoders:
+        try:
+            encoder = make_encoder(spec)
+        except ValueError as e:
+            print(f"[encode] {spec:10s} skip: {e}")
+            continue
+        best, mean, data = _time_call(lambda: encoder.encode(frame), args.repeat)
+        b64_best, _, url = _time_call(lambda: encoder.data_url(frame), args.repeat)
+        print(f"[encode] {encoder.spec:10s} bytes={len(data):8d} ({len(data) / frame.nbytes * 100:5.1f}%) "
+              f"encode={best * 1000:7.2f} ms data_url={b64_best * 1000:7.2f} ms url_bytes={len(url)}")
+
+
+def bench_slice(args):
+    """全体スライダー1回分（get_slice）の時間。全シリーズを順番に描画する場合と並列に描画する場合を比べる"""
+    import contextlib
+    import io
+    from core.web_api import DicomWebApi
+    for workers in args.workers:
+        # フレームキャッシュを無効にして毎回描画・エンコードさせる
+        api = DicomWebApi(args.folders, render_workers=workers, frame_cache_mb=0)
+        slices = range(min(len(series) for series in api.original_images_list))
+        with contextlib.redirect_stdout(io.StringIO()):
+            best, mean, _ = _time_call(lambda: [api.get_slice(idx) for idx in slices], args.repeat)
+        print(f"[slice] series={api.series_count} workers={workers} "
+              f"per_step={best / len(slices) * 1000:.2f} ms (mean {mean / len(slices) * 1000:.2f} ms)")
+
+
+def bench_prefetch(args):
+    """一定間隔でスライスを順に表示したときの1フレームの待ち時間とキャッシュヒット率（先読みの有無）"""
+    import contextlib
+    import io
+    from core.web_api import DicomWebApi
+    for frames in args.frames:
+        with contextlib.redirect_stdout(io.StringIO()):
+            api = DicomWebApi([args.folder], prefetch_frames=frames)
+            num_slices = len(api.original_images_list[0])
+            waits = []
+            for idx in list(range(num_slices)) + list(range(num_slices - 1, -1, -1)):
+                start = time.perf_counter()
+                api.get_single_slice(0, idx, 'interactive')
+                waits.append(time.perf_counter() - start)
+                time.sleep(args.interval_ms / 1000.0)
+            # 逆方向の往復で2周目はキャッシュに載るので、1周目（順方向）だけを集計する
+            waits = waits[:num_slices]
+        stats = api.get_frame_cache_stats()
+        print(f"[prefetch] frames={frames} slices={num_slices} mean_wait={sum(waits) / len(waits) * 1000:.2f} ms "
+              f"max_wait={max(waits) * 1000:.2f} ms hits={stats['hits']} misses={stats['misses']} "
+              f"prefetched={api.get_prefetch_stats()['prefetched']}")
+
+
+def bench_preview(args):
+    """ドラッグ中の1フレームの処理時間とバイト数（元の解像度 / 1/2 / 1/4のブロック平均プレビュー）"""
+    from core.calibration import calibrated_range
+    from core.frame_encoder import make_encoder
+    from core.preview_pyramid import PreviewPyramid
+    from core.render_engine import WindowRenderer
+    raw, slope, intercept = _raw_frame(args)
+    lo, hi = calibrated_range(raw, slope, intercept)
+    encoder = make_encoder(args.encoder)
+    renderer = WindowRenderer()
+    print(f"[preview] frame={raw.shape} encoder={encoder.spec}")
+    for factor in (1, 2, 4):
+        def frame():
+            # 毎回キャッシュを空にして縮小から計測する
+            level = PreviewPyramid().level('bench', factor, lambda: raw)
+            return encoder.encode(renderer.render(level, slope, intercept, lo, hi - lo + 1e-8))
+        best, mean, data = _time_call(frame, args.repeat)
+        print(f"[preview] 1/{factor} bytes={len(data):8d} frame={best * 1000:7.2f} ms (mean {mean * 1000:.2f} ms)")
+
+
+def bench_roi(args):
+    """ROIの平均・標準偏差（直接集計 / 積分画像）の時間（結果の一致は tests/test_roi_engine.py で確認する）"""
+    from core.calibration import calibrated_mean_std
+    from core.roi_engine import IntegralImage
+    raw, slope, intercept = _raw_frame(args)
+    height, width = raw.shape
+    build, _, integral = _time_call(lambda: IntegralImage(raw), args.repeat)
+    print(f"[roi] frame={raw.shape} dtype={raw.dtype} build={build * 1000:.2f} ms exact={integral.exact}")
+    for size in args.sizes:
+        size = min(size, width, height)
+        x, y = (width - size) // 2, (height - size) // 2
+        direct, _, expected = _time_call(
+            lambda: calibrated_mean_std(raw[y:y + size, x:x + size], slope, intercept), args.repeat)
+        lookup, _, actual = _time_call(
+            lambda: integral.calibrated_mean_std(x, y, size, size, slope, intercept), args.repeat)
+        print(f"[roi] {size:4d}x{size:<4d} direct={direct * 1e6:8.1f} us integral={lookup * 1e6:6.1f} us "
+              f"mean={actual[0]:.6f} std={actual[1]:.6f}")
+
+
+def bench_cuboid(args):
+    """直方体ROIの統計（チャンク分割の集計）の時間とピークメモリ（結果の一致は tests/test_cuboid_roi.py で確認する）"""
+    import tracemalloc
+    import numpy as np
+    from core.roi_engine import chunk_ranges, CuboidAccumulator
+    rng = np.random.default_rng(0)
+    volume = rng.normal(1000, 200, (args.slices, args.size, args.size)).clip(0, 4095).astype(np.int16)
+    slopes = np.ones(args.slices)
+    intercepts = np.full(args.slices, -1024.0)
+    # 途中のスライスだけ別のslope/interceptにして、組ごとの度数の合成も計測に含める
+    slopes[args.slices // 2:] = 0.5
+    print(f"[cuboid] volume={volume.shape} dtype={volume.dtype} {volume.nbytes / 1024 ** 2:.1f} MB")
+    slice_bytes = args.size * args.size * volume.itemsize
+    for chunk_mb in args.chunk_mb:
+        def run():
+            accumulator = CuboidAccumulator()
+            for start, stop in chunk_ranges(0, args.slices, slice_bytes, chunk_mb * 1024 * 1024):
+                accumulator.add(volume[start:stop], slopes[start:stop], intercepts[start:stop])
+            return accumulator.result()
+        tracemalloc.start()
+        elapsed, _, _ = _time_call(run, 1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        chunks = len(chunk_ranges(0, args.slices, slice_bytes, chunk_mb * 1024 * 1024))
+        print(f"[cuboid] chunk={chunk_mb:5.1f} MB chunks={chunks:4d} time={elapsed * 1000:8.1f} ms "
+              f"peak={peak / 1024 ** 2:7.1f} MB")
+
+
+def bench_mask(args):
+    """円・楕円・多角形ROIの統計（外接矩形を切り出してマスク / スライス全体のマスク）の時間（マスクの正しさは tests/test_roi_masks.py で確認する）"""
+    import numpy as np
+    from core.calibration import calibrated_mean_std
+    from core.roi_engine import RoiMaskCache, masked_values
+    raw, slope, intercept = _raw_frame(args)
+    height, width = raw.shape
+    masks = RoiMaskCache()
+    for shape in args.shapes:
+        for size in args.sizes:
+            size = min(size, width, height)
+            x, y = (width - size) // 2, (height - size) // 2
+            # 多角形は外接矩形に内接するひし形
+            points = [[size / 2, 0], [size, size / 2], [size / 2, size], [0, size / 2]] if shape == 'polygon' else None
+            start = time.perf_counter()
+            mask = masks.get(shape, size, size, points)
+            rasterize = time.perf_counter() - start
+            lookup, _, _ = _time_call(lambda: masks.get(shape, size, size, points), args.repeat)
+            cropped, _, _ = _time_call(
+                lambda: calibrated_mean_std(masked_values(raw, x, y, masks.get(shape, size, size, points)), slope, intercept),
+                args.repeat)
+
+            def full_slice():
+                full = np.zeros(raw.shape, dtype=bool)
+                full[y:y + size, x:x + size] = mask
+                return calibrated_mean_std(raw[full], slope, intercept)
+            full, _, _ = _time_call(full_slice, args.repeat)
+            print(f"[mask] {shape:8s} {size:4d}px pixels={int(mask.sum()):6d} rasterize={rasterize * 1e6:8.1f} us "
+                  f"cached={lookup * 1e6:5.1f} us cropped={cropped * 1e6:8.1f} us full_slice={full * 1e6:8.1f} us")
+    print(f"[mask] cache: {masks.stats()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='CT-Analyzer benchmark')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_load = sub.add_parser('load', help='フォルダ読み込み時間を計測')
+    p_load.add_argument('folder', help='DICOMフォルダ')
+    p_load.add_argument('--repeat', type=int, default=3)
+    p_load.set_defaults(func=bench_load)
+
+    p_decode = sub.add_parser('decode', help='並列ピクセルデコード時間を計測')
+    p_decode.add_argument('folder', help='DICOMフォルダ')
+    p_decode.add_argument('--workers', type=int, nargs='+', default=sorted({1, DEFAULT_DECODE_WORKERS}))
+    p_decode.add_argument('--repeat', type=int, default=3)
+    p_decode.set_defaults(func=bench_decode)
+
+    p_memory = sub.add_parser('memory', help='シリーズ保持のメモリ使用量を表示')
+    p_memory.add_argument('folders', nargs='+', help='DICOMフォルダ')
+    p_memory.set_defaults(func=bench_memory)
+
+    p_scan = sub.add_parser('scan', help='親フォルダの走査時間を計測（マニフェスト有無）')
+    p_scan.add_argument('folder', help='DICOMフォルダを含む親フォルダ')
+    p_scan.add_argument('--repeat', type=int, default=3)
+    p_scan.set_defaults(func=bench_scan)
+
+    p_render = sub.add_parser('render', help='ウィンドウ変換（LUT）の処理時間を計測')
+    p_render.add_argument('--folder', help='DICOMフォルダ（省略時は乱数の合成画像）')
+    p_render.add_argument('--size', type=int, default=512)
+    p_render.add_argument('--repeat', type=int, default=50)
+    p_render.set_defaults(func=bench_render)
+
+    p_encode = sub.add_parser('encode', help='フレームエンコーダのサイズと処理時間を計測')
+    p_encode.add_argument('--folder', help='DICOMフォルダ（省略時は合成画像）')
+    p_encode.add_argument('--size', type=int, default=512)
+    p_encode.add_argument('--encoders', nargs='+', default=['png:6', 'png:1', 'png:0', 'webp', 'jpeg:90', 'jpeg:75', 'raw'])
+    p_encode.add_argument('--repeat', type=int, default=10)
+    p_encode.set_defaults(func=bench_encode)
+
+    p_slice = sub.add_parser('slice', help='全体スライダー1回分のフレーム描画時間を計測（並列数ごと）')
+    p_slice.add_argument('folders', nargs='+', help='DICOMフォルダ（同じフォルダを複数指定してもよい）')
+    p_slice.add_argument('--workers', type=int, nargs='+', default=sorted({1, DEFAULT_RENDER_WORKERS}))
+    p_slice.add_argument('--repeat', type=int, default=3)
+    p_slice.set_defaults(func=bench_slice)
+
+    p_prefetch = sub.add_parser('prefetch', help='スクロール時の先読みの効果を計測')
+    p_prefetch.add_argument('folder', help='DICOMフォルダ')
+    p_prefetch.add_argument('--interval-ms', type=float, default=30.0, help='スライダー要求の間隔（ミリ秒）')
+    p_prefetch.add_argument('--frames', type=int, nargs='+', default=[0, 8], help='先読みフレーム数')
+    p_prefetch.set_defaults(func=bench_prefetch)
+
+    p_preview = sub.add_parser('preview', help='ドラッグ中の縮小プレビューの処理時間とサイズを計測')
+    p_preview.add_argument('--folder', help='DICOMフォルダ（省略時は合成画像）')
+    p_preview.add_argument('--size', type=int, default=1024)
+    p_preview.add_argument('--encoder', default='jpeg:90')
+    p_preview.add_argument('--repeat', type=int, default=10)
+    p_preview.set_defaults(func=bench_preview)
+
+    p_roi = sub.add_parser('roi', help='ROI統計（直接集計 / 積分画像）の時間を計測')
+    p_roi.add_argument('--folder', help='DICOMフォルダ（省略時は合成画像）')
+    p_roi.add_argument('--size', type=int, default=512)
+    p_roi.add_argument('--sizes', type=int, nargs='+', default=[3, 50, 200, 512])
+    p_roi.add_argument('--repeat', type=int, default=20)
+    p_roi.set_defaults(func=bench_roi)
+
+    p_cuboid = sub.add_parser('cuboid', help='直方体ROIの統計（チャンク分割）の時間とピークメモリを計測')
+    p_cuboid.add_argument('--slices', type=int, default=100)
+    p_cuboid.add_argument('--size', type=int, default=512)
+    p_cuboid.add_argument('--chunk-mb', type=float, nargs='+', default=[4, 16, 64])
+    p_cuboid.set_defaults(func=bench_cuboid)
+
+    p_mask = sub.add_parser('mask', help='円・楕円・多角形ROIの統計（マスク）の時間を計測')
+    p_mask.add_argument('--folder', help='DICOMフォルダ（省略時は合成画像）')
+    p_mask.add_argument('--size', type=int, default=512)
+    p_mask.add_argument('--shapes', nargs='+', default=['circle', 'ellipse', 'polygon'])
+    p_mask.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200])
+    p_mask.add_argument('--repeat', type=int, default=20)
+    p_mask.set_defaults(func=bench_mask)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()